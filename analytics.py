@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+import time
+from collections import Counter, defaultdict
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from archive import SegmentArchiveReader
+from convert import iter_json_array, room_from_filename
+from storage import connect_comment_db
+from text_index import to_bigram_text
+
+
+class CommentColumns(NamedTuple):
+    """一批弹幕的列数据
+
+    ts 为本地时间的毫秒数（datetime64 按 UTC 解释的本地时间，便于直接按分钟分桶并显示），
+    room 为 ``平台/直播间ID``。
+    """
+    ts: np.ndarray  # int64
+    room: np.ndarray  # str
+    user: np.ndarray  # str
+    type: np.ndarray  # str
+    content: np.ndarray  # str
+
+
+def _local_offset_ms(ts_ms: int) -> int:
+    """Unix 毫秒时间戳对应的本地时区偏移（毫秒）"""
+    return time.localtime(ts_ms / 1000).tm_gmtoff * 1000
+
+
+def _local_offsets_ms(ts: np.ndarray) -> np.ndarray:
+    """逐条计算本地时区偏移（毫秒）：时区切换（夏令时）都在整分钟，每个不同的分钟只查询一次"""
+    minutes, inverse = np.unique(ts // 60000, return_inverse=True)
+    offsets = np.array([_local_offset_ms(minute * 60000) for minute in minutes.tolist()], dtype=np.int64)
+    return offsets[inverse]
+
+
+def _text_array(values: List[Optional[str]]) -> np.ndarray:
+    """字符串列，缺失值（None）记为空字符串，避免生成无法排序的 object 数组"""
+    return np.array([value or "" for value in values], dtype=str)
+
+
+def _columns_from_iso(timestamps: List[str], rooms: List[str], users: List[str], types: List[str],
+                      contents: List[str]) -> CommentColumns:
+    """由 ISO 时间字符串构建列（numpy 批量解析时间）"""
+    ts = np.array(timestamps, dtype="datetime64[ms]").astype(np.int64)
+    return CommentColumns(ts, np.array(rooms), _text_array(users), np.array(types), _text_array(contents))
+
+
+def _columns_from_epoch(ts_ms: List[int], rooms: List[str], users: List[str], types: List[str],
+                        contents: List[str]) -> CommentColumns:
+    """由 Unix 毫秒时间戳构建列，逐条转换为本地时间（跨夏令时切换的块不会整体偏移）"""
+    ts = np.array(ts_ms, dtype=np.int64)
+    if len(ts):
+        ts += _local_offsets_ms(ts)
+    return CommentColumns(ts, np.array(rooms), _text_array(users), np.array(types), _text_array(contents))
+
+
+def _columns_from_dicts(items: List[Dict], default_room: str = "/") -> CommentColumns:
+    """由 JSON 结构的弹幕构建列"""
+    return _columns_from_iso(
+        [item.get("timestamp") or "NaT" for item in items],
+        [f"{item['platform']}/{item['room_id']}" if item.get("platform") else default_room for item in items],
+        [item.get("user", "") for item in items],
+        [item.get("type", "chat") for item in items],
+        [item.get("content", "") for item in items]
+    )
+
+
+def _parse_jsonl_lines(lines: List[bytes], encoding: str) -> Tuple[List[Dict], int]:
+    """解析一块 JSONL 行，返回 (弹幕, 跳过的行数)
+
+    先把整块拼成一个数组一次解析；失败时逐行解析，跳过无法解码或不完整的行（如异常退出时残留的半行）。
+    """
+    try:
+        items = json.loads("[" + b",".join(lines).decode(encoding) + "]")
+        if len(items) == len(lines) and all(isinstance(item, dict) for item in items):
+            return items, 0
+    except ValueError:  # 包括 UnicodeDecodeError 和 JSONDecodeError
+        pass
+
+    items = []
+    for line in lines:
+        try:
+            item = json.loads(line.decode(encoding))
+        except ValueError:
+            continue
+        if isinstance(item, dict):
+            items.append(item)
+    return items, len(lines) - len(items)
+
+
+def _iter_jsonl_chunks(path: Path, chunk_size: int, encoding: str,
+                       skipped: Optional[Counter] = None) -> Iterator[CommentColumns]:
+    """按块读取 JSONL：每块的行拼成一个数组后一次解析，避免逐行调用 json.loads
+
+    跳过的行数按文件累加到 ``skipped`` 中。
+    """
+    with open(path, "rb") as f:
+        while True:
+            lines = [line for line in islice(f, chunk_size) if line.strip()]
+            if not lines:
+                break
+            items, bad_lines = _parse_jsonl_lines(lines, encoding)
+            if bad_lines and skipped is not None:
+                skipped[str(path)] += bad_lines
+            if items:
+                yield _columns_from_dicts(items)
+
+
+def _iter_json_array_chunks(path: Path, chunk_size: int, encoding: str) -> Iterator[CommentColumns]:
+    """按块读取旧版 JSON 数组（流式解析），旧数据缺少平台和直播间ID时从文件名解析"""
+    platform, room_id = room_from_filename(path)
+    with open(path, "r", encoding=encoding) as f:
+        items = iter_json_array(f)
+        while True:
+            chunk = list(islice(items, chunk_size))
+            if not chunk:
+                break
+            yield _columns_from_dicts(chunk, f"{platform}/{room_id}")
+
+
+def _iter_sqlite_chunks(path: Path, chunk_size: int) -> Iterator[CommentColumns]:
+    conn = connect_comment_db(str(path), readonly=True)
+    try:
+        cursor = conn.execute("SELECT ts, platform || '/' || room_id, user, type, content FROM comments ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield _columns_from_epoch(*(list(column) for column in zip(*rows)))
+    finally:
+        conn.close()
+
+
+def _iter_segment_chunks(path: Path, chunk_size: int) -> Iterator[CommentColumns]:
+    columns = ([], [], [], [], [])
+    for record in SegmentArchiveReader(str(path)).read():
+        columns[0].append(record.ts_ms)
+        columns[1].append(f"{record.platform}/{record.room_id}")
+        columns[2].append(record.user)
+        columns[3].append(record.type)
+        columns[4].append(record.content)
+        if len(columns[0]) >= chunk_size:
+            yield _columns_from_epoch(*columns)
+            columns = ([], [], [], [], [])
+    if columns[0]:
+        yield _columns_from_epoch(*columns)
+
+
+def iter_comment_chunks(path: str, chunk_size: int = 100000, encoding: str = "utf-8",
+                        skipped: Optional[Counter] = None) -> Iterator[CommentColumns]:
+    """按块读取弹幕文件的列数据，支持 jsonl、旧版 json 数组、sqlite 和 segments 归档目录
+
+    jsonl 中无法解码或不完整的行被跳过，按文件计入 ``skipped``。
+    """
+    path = Path(path)
+    if path.is_dir():
+        yield from _iter_segment_chunks(path, chunk_size)
+    elif path.suffix == ".sqlite":
+        yield from _iter_sqlite_chunks(path, chunk_size)
+    elif path.suffix == ".json":
+        yield from _iter_json_array_chunks(path, chunk_size, encoding)
+    else:
+        yield from _iter_jsonl_chunks(path, chunk_size, encoding, skipped)
+
+
+def _merge_counts(counter: Counter, keys: np.ndarray, counts: np.ndarray):
+    counter.update(dict(zip(keys.tolist(), counts.tolist())))
+
+
+class CommentStats:
+    """按直播间统计弹幕
+
+    每块数据先用 numpy 向量化分组计数（np.unique），再合并到按直播间的计数器中。
+    内存只与直播间数、不同用户数和分钟数有关，与弹幕总数无关，可以流式处理超过内存的文件。
+    """
+
+    def __init__(self, keywords: Optional[List[str]] = None, count_words: bool = False):
+        self.keywords = keywords or []
+        self.count_words = count_words or bool(self.keywords)  # 关键词统计需要处理弹幕内容，只在需要时进行
+        self.comments = Counter()  # 直播间 -> 弹幕数
+        self.types: Dict[str, Counter] = defaultdict(Counter)  # 直播间 -> 类型 -> 条数
+        self.users: Dict[str, Counter] = defaultdict(Counter)  # 直播间 -> 用户 -> 条数
+        self.minutes: Dict[str, Counter] = defaultdict(Counter)  # 直播间 -> 分钟 -> 条数
+        self.words: Dict[str, Counter] = defaultdict(Counter)  # 直播间 -> 关键词 -> 包含该词的弹幕数
+        self.skipped_lines = Counter()  # 文件 -> 无法解析而跳过的行数
+
+    def add(self, chunk: CommentColumns):
+        """统计一块数据"""
+        rooms, room_codes = np.unique(chunk.room, return_inverse=True)
+        room_counts = np.bincount(room_codes, minlength=len(rooms))
+        minutes = chunk.ts // 60000
+
+        for index, room in enumerate(rooms.tolist()):
+            mask = room_codes == index
+            self.comments[room] += int(room_counts[index])
+            _merge_counts(self.types[room], *np.unique(chunk.type[mask], return_counts=True))
+            _merge_counts(self.users[room], *np.unique(chunk.user[mask], return_counts=True))
+            _merge_counts(self.minutes[room], *np.unique(minutes[mask], return_counts=True))
+
+            if not self.count_words:
+                continue
+            chat_mask = mask & (chunk.type == "chat")
+            contents = chunk.content[chat_mask]
+            if self.keywords:
+                for keyword in self.keywords:
+                    self.words[room][keyword] += int(np.count_nonzero(np.char.find(contents, keyword) >= 0))
+            elif len(contents):
+                # 未指定关键词时统计高频词（中文按二元组，英文按单词）
+                tokens = np.array(" ".join(to_bigram_text(content) for content in contents.tolist()).lower().split())
+                if len(tokens):
+                    _merge_counts(self.words[room], *np.unique(tokens, return_counts=True))
+
+    def summary_rows(self) -> List[Dict]:
+        rows = []
+        for room in sorted(self.comments):
+            per_minute = self.minutes[room]
+            rows.append({
+                "room": room,
+                "comments": self.comments[room],
+                "unique_users": len(self.users[room]),
+                "minutes": len(per_minute),
+                "avg_per_minute": round(self.comments[room] / max(1, len(per_minute)), 1),
+                "peak_per_minute": max(per_minute.values(), default=0),
+                **{f"type_{name}": count for name, count in sorted(self.types[room].items())}
+            })
+        return rows
+
+    def top_user_rows(self, top: int) -> List[Dict]:
+        return [
+            {"room": room, "rank": rank, "user": user, "comments": count}
+            for room in sorted(self.users)
+            for rank, (user, count) in enumerate(self.users[room].most_common(top), 1)
+        ]
+
+    def per_minute_rows(self) -> List[Dict]:
+        return [
+            {"room": room, "minute": str(np.datetime64(minute, "m")).replace("T", " "), "comments": count}
+            for room in sorted(self.minutes)
+            for minute, count in sorted(self.minutes[room].items())
+        ]
+
+    def keyword_rows(self, top: int) -> List[Dict]:
+        rows = []
+        for room in sorted(self.words):
+            words = self.words[room]
+            items = [(keyword, words[keyword]) for keyword in self.keywords] if self.keywords else words.most_common(top)
+            rows.extend({"room": room, "keyword": keyword, "comments": count} for keyword, count in items)
+        return rows
+
+
+def analyze(paths: List[str], keywords: Optional[List[str]] = None, chunk_size: int = 100000,
+            count_words: bool = False) -> CommentStats:
+    """流式统计一个或多个弹幕文件，``count_words`` 为 True 时未指定关键词也统计高频词"""
+    stats = CommentStats(keywords, count_words=count_words)
+    for path in paths:
+        for chunk in iter_comment_chunks(path, chunk_size, skipped=stats.skipped_lines):
+            stats.add(chunk)
+    return stats
+
+
+def naive_load(path: str) -> List[Dict]:
+    """基准对照：逐行加载为字典列表"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def naive_analyze(comments: List[Dict], top: int) -> Dict:
+    """基准对照：逐条遍历字典统计"""
+    rooms = defaultdict(lambda: {"comments": 0, "users": defaultdict(int), "minutes": defaultdict(int)})
+    for comment in comments:
+        room = rooms[f"{comment['platform']}/{comment['room_id']}"]
+        room["comments"] += 1
+        room["users"][comment["user"]] += 1
+        room["minutes"][comment["timestamp"][:16]] += 1
+
+    return {
+        name: {
+            "comments": room["comments"],
+            "unique_users": len(room["users"]),
+            "peak_per_minute": max(room["minutes"].values()),
+            "top_users": sorted(room["users"].items(), key=lambda item: -item[1])[:top]
+        }
+        for name, room in rooms.items()
+    }
+
+
+def benchmark(path: str, top: int, chunk_size: int):
+    """对比 numpy 分块统计与逐条字典循环的耗时（仅支持 jsonl 文件），分别统计加载和计算"""
+    started = time.perf_counter()
+    comments = naive_load(path)
+    naive_load_elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    naive = naive_analyze(comments, top)
+    naive_elapsed = time.perf_counter() - started
+    del comments
+
+    stats = CommentStats()
+    load_elapsed = 0.0
+    numpy_elapsed = 0.0
+    started = time.perf_counter()
+    for chunk in iter_comment_chunks(path, chunk_size):
+        loaded = time.perf_counter()
+        load_elapsed += loaded - started
+        stats.add(chunk)
+        started = time.perf_counter()
+        numpy_elapsed += started - loaded
+    computed = time.perf_counter()
+    stats.summary_rows()
+    stats.top_user_rows(top)
+    numpy_elapsed += time.perf_counter() - computed
+
+    total = sum(room["comments"] for room in naive.values())
+    consistent = all(
+        stats.comments[room] == result["comments"]
+        and len(stats.users[room]) == result["unique_users"]
+        and max(stats.minutes[room].values()) == result["peak_per_minute"]
+        for room, result in naive.items()
+    )
+    print(f"弹幕数: {total}")
+    print_table([
+        {"方式": "逐条字典循环", "加载(秒)": f"{naive_load_elapsed:.2f}", "统计(秒)": f"{naive_elapsed:.3f}",
+         "统计速度(条/秒)": f"{total / naive_elapsed:,.0f}"},
+        {"方式": "numpy分块", "加载(秒)": f"{load_elapsed:.2f}", "统计(秒)": f"{numpy_elapsed:.3f}",
+         "统计速度(条/秒)": f"{total / numpy_elapsed:,.0f}"},
+    ])
+    print(f"统计加速 {naive_elapsed / numpy_elapsed:.1f} 倍，总耗时加速 "
+          f"{(naive_load_elapsed + naive_elapsed) / (load_elapsed + numpy_elapsed):.1f} 倍，结果一致: {consistent}")
+
+
+def print_table(rows: List[Dict]):
+    """以对齐的表格输出"""
+    if not rows:
+        print("（无数据）")
+        return
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    widths = {
+        column: max(_display_width(str(column)), *(_display_width(str(row.get(column, ""))) for row in rows))
+        for column in columns
+    }
+    print("  ".join(_pad(column, widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(_pad(str(row.get(column, "")), widths[column]) for column in columns))
+
+
+def _display_width(text: str) -> int:
+    """终端显示宽度（中文字符占两列）"""
+    return sum(2 if ord(char) > 0x2E80 else 1 for char in text)
+
+
+def _pad(text: str, width: int) -> str:
+    return text + " " * (width - _display_width(text))
+
+
+def write_csv(rows: List[Dict], output: str):
+    """写出 CSV（带 BOM，便于 Excel 打开中文）"""
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    with open(output, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="弹幕统计分析工具（numpy 分块向量化统计）")
+    parser.add_argument("inputs", nargs="+", help="弹幕文件：jsonl、旧版 json、sqlite 或 segments 归档目录")
+    parser.add_argument("--report", choices=("summary", "top_users", "per_minute", "keywords"), default="summary",
+                        help="统计报表：汇总、发言最多的用户、每分钟弹幕数、关键词")
+    parser.add_argument("--top", type=int, default=10, help="每个直播间输出的前N名")
+    parser.add_argument("--keywords", nargs="+", help="统计包含这些关键词的弹幕数（默认统计高频词）")
+    parser.add_argument("--chunk_size", type=int, default=100000, help="每块读取的弹幕条数")
+    parser.add_argument("--csv", help="输出为 CSV 文件")
+    parser.add_argument("--benchmark", action="store_true", help="与逐条字典循环对比耗时（仅 jsonl）")
+
+    args = parser.parse_args()
+
+    if args.benchmark:
+        for path in args.inputs:
+            benchmark(path, args.top, args.chunk_size)
+        return
+
+    started = time.perf_counter()
+    try:
+        stats = analyze(args.inputs, args.keywords, args.chunk_size, count_words=args.report == "keywords")
+    except (OSError, ValueError, sqlite3.Error) as e:
+        logger.error(f"统计失败: {e}")
+        sys.exit(1)
+    for path, count in stats.skipped_lines.items():
+        logger.warning(f"跳过 {count} 行无法解析的记录: {path}")
+
+    if args.report == "summary":
+        rows = stats.summary_rows()
+    elif args.report == "top_users":
+        rows = stats.top_user_rows(args.top)
+    elif args.report == "per_minute":
+        rows = stats.per_minute_rows()
+    else:
+        rows = stats.keyword_rows(args.top)
+
+    if args.csv:
+        write_csv(rows, args.csv)
+        logger.info(f"已写出 {len(rows)} 行到 {args.csv}")
+    else:
+        print_table(rows)
+    logger.info(f"统计完成，耗时 {time.perf_counter() - started:.2f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import Config
+from models import CommentRecord
+from utils import parse_time_ms
+
+
+class SegmentArchiveWriter:
+    """分段压缩归档写入器
+
+    输出路径是一个目录，弹幕按时间戳写入每 ``segment_seconds`` 秒一个的分段文件
+    ``{分段起始时间}.seg``。分段由若干独立压缩的块组成，每块是若干行 JSONL
+    （gzip 格式下每块是一个 gzip 成员，整个分段可直接用 zcat 查看）。
+    每写完一块，在旁路索引 ``{分段起始时间}.idx`` 中追加一行：块的字节偏移、长度、条数和时间范围，
+    读取时只需解压与时间窗口重叠的块。
+
+    块在内存中攒满 ``block_records`` 条或最早一条超过 ``block_seconds`` 秒后写出。没有新弹幕时由
+    持久化线程根据 ``block_deadline`` 定时调用 ``flush`` 写出到期的块；``flush``、``fsync`` 和关闭时
+    都会先写出尚未写出的块。异常退出时最多丢失一个未写出的块，残缺的块在重新打开时截掉。
+    """
+
+    COMPRESSIONS = ("zlib", "gzip")
+    MANIFEST = "archive.json"
+
+    def __init__(self, output_dir: str, encoding: str = "utf-8", segment_seconds: int = None,
+                 compression: str = None, block_records: int = None, block_seconds: float = None):
+        save_config = Config.get_save_config()
+        self.output_file = output_dir
+        self.encoding = encoding
+        self.segment_seconds = segment_seconds or save_config["segment_seconds"]
+        self.compression = compression or save_config["segment_compression"]
+        self.block_records = block_records or save_config["segment_block_records"]
+        self.block_seconds = save_config["segment_block_seconds"] if block_seconds is None else block_seconds
+        if self.compression not in self.COMPRESSIONS:
+            raise ValueError(f"不支持的压缩格式: {self.compression}")
+
+        self.persisted_count = 0  # 已写入分段文件的弹幕条数（水位线）
+        self.bytes_written = 0  # 已写入的压缩数据字节数
+
+        self._segment: Optional[int] = None  # 当前分段的起始时间（秒）
+        self._data = None
+        self._index = None
+        self._pending: List[CommentRecord] = []
+        self._pending_since = 0.0
+
+    def _write_manifest(self):
+        """写入归档参数，供读取方解析分段"""
+        directory = Path(self.output_file)
+        directory.mkdir(parents=True, exist_ok=True)
+        manifest = {
+            "segment_seconds": self.segment_seconds,
+            "compression": self.compression,
+            "encoding": self.encoding
+        }
+        tmp_path = directory / f"{self.MANIFEST}.tmp"
+        tmp_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, directory / self.MANIFEST)
+
+    def _open_segment(self, segment: int):
+        """打开（必要时恢复）分段文件及其索引"""
+        self._close_segment()
+        if self._segment is None:
+            self._write_manifest()
+
+        name = datetime.fromtimestamp(segment).strftime("%Y%m%d_%H%M%S")
+        data_path = Path(self.output_file) / f"{name}.seg"
+        index_path = Path(self.output_file) / f"{name}.idx"
+        _recover_segment(data_path, index_path)
+
+        self._segment = segment
+        self._data = open(data_path, "ab")
+        self._index = open(index_path, "ab")
+
+    def _close_segment(self):
+        for f in (self._data, self._index):
+            if f is not None:
+                f.close()
+        self._data = None
+        self._index = None
+
+    def write(self, records: List[CommentRecord]) -> int:
+        """写入一批弹幕（按时间戳分配到分段，攒满一块后压缩写出），返回接收条数"""
+        if not records:
+            return 0
+
+        for record in records:
+            segment = record.ts_ms // 1000 // self.segment_seconds * self.segment_seconds
+            if self._segment is None or segment > self._segment:
+                # 进入新的分段；晚到的旧时间戳弹幕留在当前分段，索引中记录实际时间范围
+                self._write_block()
+                self._open_segment(segment)
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending.append(record)
+            if len(self._pending) >= self.block_records:
+                self._write_block()
+
+        if self._pending and time.monotonic() - self._pending_since >= self.block_seconds:
+            self._write_block()
+        return len(records)
+
+    def _write_block(self):
+        """压缩并写出当前块，然后追加索引"""
+        if not self._pending:
+            return
+
+        records, self._pending = self._pending, []
+        data = "".join(json.dumps(record.to_dict(), ensure_ascii=False) + "\n" for record in records)
+        data = data.encode(self.encoding)
+        if self.compression == "gzip":
+            block = gzip.compress(data, mtime=0)
+        else:
+            block = zlib.compress(data)
+
+        offset = self._data.tell()
+        self._data.write(block)
+        self._data.flush()
+        # 索引在块之后写入，索引中的每一项都指向完整的块
+        entry = {
+            "offset": offset,
+            "length": len(block),
+            "count": len(records),
+            "start_ms": min(record.ts_ms for record in records),
+            "end_ms": max(record.ts_ms for record in records)
+        }
+        self._index.write((json.dumps(entry) + "\n").encode("utf-8"))
+        self._index.flush()
+
+        self.persisted_count += len(records)
+        self.bytes_written += len(block)
+
+    def block_deadline(self) -> Optional[float]:
+        """尚未写出的块超过 ``block_seconds`` 的时刻（``time.monotonic``），没有未写出的块时返回 None"""
+        if not self._pending:
+            return None
+        return self._pending_since + self.block_seconds
+
+    def flush(self):
+        """立即写出尚未写出的块（不等攒满）"""
+        if self._data is not None:
+            self._write_block()
+
+    def fsync(self):
+        """写出尚未写出的块，并将块和索引同步到磁盘"""
+        self.flush()
+        for f in (self._data, self._index):
+            if f is not None:
+                os.fsync(f.fileno())
+
+    def close(self):
+        """写出剩余的块并关闭文件"""
+        if self._data is not None:
+            self._write_block()
+        self._close_segment()
+
+
+def _read_index(index_path: Path) -> List[Dict]:
+    """读取分段索引，忽略残缺的最后一行"""
+    entries = []
+    if not index_path.exists():
+        return entries
+    with open(index_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+    return entries
+
+
+def _recover_segment(data_path: Path, index_path: Path):
+    """截掉上次异常退出时写了一半的块或索引行"""
+    if not data_path.exists() and not index_path.exists():
+        return
+
+    data_size = data_path.stat().st_size if data_path.exists() else 0
+    entries = [entry for entry in _read_index(index_path) if entry["offset"] + entry["length"] <= data_size]
+    end = entries[-1]["offset"] + entries[-1]["length"] if entries else 0
+
+    if data_size != end:
+        with open(data_path, "rb+") as f:
+            f.truncate(end)
+    index_data = "".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8")
+    if not index_path.exists() or index_path.stat().st_size != len(index_data):
+        index_path.write_bytes(index_data)
+
+
+class SegmentArchiveReader:
+    """分段压缩归档读取器
+
+    根据分段文件名和索引定位与时间窗口重叠的块，只读取并解压这些块，
+    读取耗时与窗口内的数据量成正比，与归档总大小无关。
+    """
+
+    def __init__(self, archive_dir: str):
+        self.archive_dir = Path(archive_dir)
+        manifest = json.loads((self.archive_dir / SegmentArchiveWriter.MANIFEST).read_text(encoding="utf-8"))
+        self.segment_seconds = manifest["segment_seconds"]
+        self.compression = manifest["compression"]
+        self.encoding = manifest["encoding"]
+
+    def segments(self) -> List[Tuple[int, Path]]:
+        """按时间顺序返回 (分段起始时间（秒）, 分段文件路径)"""
+        segments = []
+        for path in self.archive_dir.glob("*.seg"):
+            try:
+                start = int(datetime.strptime(path.stem, "%Y%m%d_%H%M%S").timestamp())
+            except ValueError:
+                continue
+            segments.append((start, path))
+        return sorted(segments)
+
+    def _decompress(self, block: bytes) -> bytes:
+        if self.compression == "gzip":
+            return gzip.decompress(block)
+        return zlib.decompress(block)
+
+    def read(self, since_ms: int = None, until_ms: int = None) -> Iterator[CommentRecord]:
+        """按分段顺序读取时间窗口 [since_ms, until_ms) 内的弹幕"""
+        segment_ms = self.segment_seconds * 1000
+        for start, data_path in self.segments():
+            # 分段中的弹幕时间戳都早于分段结束时间；晚到的弹幕可能写入下一个分段
+            if since_ms is not None and start * 1000 + segment_ms <= since_ms:
+                continue
+            if until_ms is not None and start * 1000 >= until_ms + segment_ms:
+                break
+
+            blocks = [
+                entry for entry in _read_index(data_path.with_suffix(".idx"))
+                if (since_ms is None or entry["end_ms"] >= since_ms)
+                and (until_ms is None or entry["start_ms"] < until_ms)
+            ]
+            if not blocks:
+                continue
+
+            with open(data_path, "rb") as f:
+                for entry in blocks:
+                    f.seek(entry["offset"])
+                    data = self._decompress(f.read(entry["length"]))
+                    for line in data.decode(self.encoding).splitlines():
+                        record = CommentRecord.from_dict(json.loads(line))
+                        if since_ms is not None and record.ts_ms < since_ms:
+                            continue
+                        if until_ms is not None and record.ts_ms >= until_ms:
+                            continue
+                        yield record
+
+
+def main():
+    """主函数：按时间窗口读取归档，以 JSONL 输出到标准输出"""
+    parser = argparse.ArgumentParser(description="读取分段压缩归档中的弹幕")
+    parser.add_argument("archive_dir", help="归档目录（segments 格式的输出路径）")
+    parser.add_argument("--since", type=parse_time_ms, help="起始时间（包含），如 2024-01-01T12:00:00")
+    parser.add_argument("--until", type=parse_time_ms, help="结束时间（不包含）")
+
+    args = parser.parse_args()
+
+    reader = SegmentArchiveReader(args.archive_dir)
+    for record in reader.read(args.since, args.until):
+        sys.stdout.write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,26 @@ import asyncio
 import json
 import time
 from abc import ABC, abstractmethod
-from datetime import datetime
+from collections import deque
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Awaitable, Callable, Dict, List, Optional, Pattern
 
-from playwright.async_api import async_playwright, Browser, Page
-from loguru import logger
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+
+from config import Config
+from dedup import MessageDeduplicator
+from ingest import FrameQueue
+from log_mux import CommentLogLimiter, close_room_log, get_room_logger
+from metrics_server import register_crawler, unregister_crawler
+from models import CommentRecord
+from profiling import install_signal_profiler, new_stage_timings
+from raw_capture import RawCaptureRecorder
+from room_metrics import RoomMetrics
+from session_cache import get_storage_state_cache
+from startup import StartupTimer
+from storage import CommentPersister, create_comment_writer
+from utils import compile_url_patterns, format_output_filename
+from ws_bridge import WebSocketBridge
 
 
 class BaseCrawler(ABC):
@@ -19,14 +33,78 @@ class BaseCrawler(ABC):
     def __init__(self, room_id: str, platform: str, output_file: str = None):
         self.room_id = room_id
         self.platform = platform
-        self.output_file = output_file or f"{platform}_{room_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        self.comments = []
+        # 设置日志：写入共享的按直播间分发的日志sink，逐条弹幕日志按配置限流
+        Path("logs").mkdir(exist_ok=True)
+        self.logger = get_room_logger(self.platform, room_id)
+        self._log_comment = CommentLogLimiter(Config.get_log_config()["comment_log_rate"])
+        try:
+            self.platform_config = Config.get_platform_config(platform)
+        except ValueError:
+            self.platform_config = {}
+        self.api_pattern = self._get_chat_api_pattern()
+        save_config = Config.get_save_config()
+        self.output_file = output_file or format_output_filename(platform, room_id, save_config["file_format"])
+        # 只保留最近的弹幕，全部弹幕由写入线程持久化到磁盘
+        self.comments = deque(maxlen=save_config["recent_size"])
+        self.persister = CommentPersister(
+            create_comment_writer(
+                self.output_file, save_config["file_format"], save_config["encoding"], save_config["sqlite_fts"]
+            ),
+            flush_records=save_config["auto_save_interval"],
+            flush_interval_ms=save_config["flush_interval_ms"],
+            fsync_policy=save_config["fsync_policy"],
+            capacity=save_config["buffer_capacity"],
+            overflow_policy=save_config["buffer_overflow"],
+            log=self.logger,
+            name=f"{platform}-{room_id}-writer",
+        )
+        self.requests_saved = 0  # 拦截弹幕API时节省的重复请求数
+        self.dropped_messages = 0  # 积压时解码后才识别出并丢弃的低优先级消息数（与帧队列丢弃的帧分开统计）
+        # 热路径各阶段的耗时直方图（拦截、解码、提取、入缓冲区），由指标端点输出
+        self.stage_timings = new_stage_timings()
+        # 启动各阶段耗时（进入直播间、收到第一帧、第一条弹幕），由指标端点输出
+        self.startup = StartupTimer()
+        # 按平台共享的浏览器存储状态缓存（Cookie 和 localStorage），复用后跳过同意页和验证
+        self.storage_cache = get_storage_state_cache()
+        # HTTP轮询和WebSocket推送可能收到同一条消息，按消息ID去重
+        self.dedup = MessageDeduplicator(**Config.get_dedup_config())
+        # 实时指标（弹幕速率、独立用户数、高频用户和关键词），可在进程内通过 metrics.snapshot() 查询
+        self.metrics = RoomMetrics(**Config.get_metrics_config())
+        # WebSocket帧先进入有界队列，由固定数量的消费任务按批处理
+        ingest_config = Config.get_ingest_config()
+        self.frame_queue = FrameQueue(
+            self._process_frames,
+            maxsize=ingest_config["queue_size"],
+            workers=ingest_config["workers"],
+            batch_size=ingest_config["batch_size"],
+            policy=ingest_config["overflow_policy"],
+            is_low_priority=self._is_low_priority_frame,
+            log=self.logger,
+        )
+        # bridge 模式下由页面内脚本批量转发WebSocket帧，帧同样进入上面的队列
+        capture_config = Config.get_capture_config()
+        self.ws_bridge: Optional[WebSocketBridge] = None
+        if capture_config["mode"] == "bridge":
+            self.ws_bridge = WebSocketBridge(
+                self._receive_frame,
+                self._get_websocket_patterns(),
+                flush_ms=capture_config["bridge_flush_ms"],
+                max_batch=capture_config["bridge_max_batch"],
+            )
+        # 原始流量抓包：弹幕API响应和WebSocket帧原样写入抓包文件，修复解析问题后可用 raw_capture.py 回放补录
+        self.raw_recorder: Optional[RawCaptureRecorder] = None
+        if capture_config["raw_record"]:
+            self.raw_recorder = RawCaptureRecorder(
+                str(Path(capture_config["raw_dir"]) / format_output_filename(self.platform, room_id, "cap")),
+                self.platform,
+                room_id,
+                log=self.logger,
+            )
         self.browser: Optional[Browser] = None
+        self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
+        self.page_crashed = False
         
-        # 设置日志
-        Path("logs").mkdir(exist_ok=True)
-        logger.add(f"logs/{platform}_{room_id}.log", rotation="1 day", retention="7 days")
     
     @abstractmethod
     async def _get_live_room_url(self) -> str:
@@ -44,54 +122,98 @@ class BaseCrawler(ABC):
         pass
     
     async def start(self):
-        """启动抓取器"""
+        """启动抓取器（独占一个浏览器）"""
         try:
             async with async_playwright() as p:
                 # 启动浏览器
+                browser_config = Config.get_browser_config()
                 self.browser = await p.chromium.launch(
-                    headless=False,  # 设置为 True 可以无头模式运行
-                    args=[
-                        '--disable-blink-features=AutomationControlled',
-                        '--disable-web-security',
-                        '--disable-features=VizDisplayCompositor'
-                    ]
+                    headless=browser_config["headless"],
+                    args=browser_config["args"]
                 )
                 
-                # 创建新页面
-                self.page = await self.browser.new_page()
-                
-                # 设置用户代理
-                await self.page.set_extra_http_headers({
-                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                })
-                
-                # 访问直播间
-                await self._navigate_to_live_room()
-                
-                # 开始监听弹幕
-                await self._start_comment_monitoring()
+                await self.run_in_browser(self.browser)
                 
         except Exception as e:
-            logger.error(f"启动失败: {e}")
+            self.logger.error(f"启动失败: {e}")
             raise
     
+    async def run_in_browser(self, browser: Browser):
+        """在给定的浏览器中运行，多个直播间可以共享同一个浏览器"""
+        try:
+            # 启动后台写入线程和帧处理任务
+            self.persister.start()
+            if self.raw_recorder:
+                self.raw_recorder.start()
+            self.frame_queue.start()
+            await register_crawler(self)
+            install_signal_profiler()
+            self.startup.begin()
+            
+            # 每个直播间使用独立的浏览器上下文，有未过期的存储状态缓存时用它初始化 Cookie 和 localStorage
+            self.context = await browser.new_context(storage_state=await self._load_storage_state())
+            self.page = await self.context.new_page()
+            self.page.on("crash", self._handle_page_crash)
+            if self.ws_bridge:
+                # 注入脚本必须在访问直播间之前完成
+                await self.ws_bridge.install(self.page)
+            
+            # 设置用户代理
+            await self.page.set_extra_http_headers({
+                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+            })
+            self.startup.mark("page")
+            
+            # 先注册弹幕监听再访问直播间，页面建立的第一个连接和收到的第一帧都不会错过
+            await self._register_handlers()
+            self.startup.mark("handlers")
+            
+            # 访问直播间
+            await self._navigate_to_live_room()
+        except BaseException:
+            # 包括被取消的情况，确保停止后台线程、释放页面并保存已抓取的数据
+            await self._cleanup()
+            raise
+        
+        # 开始监听弹幕
+        await self._start_comment_monitoring()
+    
+    def _handle_page_crash(self, page):
+        """页面崩溃时停止监听，由调用方决定是否重启"""
+        self.logger.error("页面已崩溃")
+        self.page_crashed = True
+    
     async def _navigate_to_live_room(self):
         """导航到直播间"""
         try:
             live_url = await self._get_live_room_url()
-            logger.info(f"正在访问直播间: {live_url}")
+            self.logger.info(f"正在访问直播间: {live_url}")
             
             # 访问直播间
-            await self.page.goto(live_url, wait_until="networkidle")
+            # 只等待文档解析完成：直播页面的视频流和长连接使网络很难进入空闲状态
+            try:
+                await self.page.goto(live_url, wait_until="domcontentloaded")
+            except Exception:
+                # 导航出错（如重定向循环）时缓存的会话可能已失效
+                await self._update_storage_state(self.context, False, session_failed=True)
+                raise
+            self.startup.mark("domcontentloaded")
             
-            # 等待页面加载
-            await asyncio.sleep(5)
+            # 弹幕区域出现或收到第一帧弹幕即视为就绪，不再固定等待
+            await self._wait_until_ready()
             
-            # 检查是否成功进入直播间
-            await self._check_live_room_status()
+            # 检查是否成功进入直播间，成功后保存存储状态供之后启动的直播间复用；
+            # 直播已结束或就绪超时与会话无关，只有被带到验证或登录页时才删除缓存
+            session_failure = await self._detect_session_failure()
+            entered = await self._check_live_room_status()
+            await self._update_storage_state(
+                self.context,
+                entered and self.startup.ready_reason != "timeout" and session_failure is None,
+                session_failed=session_failure is not None,
+            )
             
         except Exception as e:
-            logger.error(f"导航到直播间失败: {e}")
+            self.logger.error(f"导航到直播间失败: {e}")
             raise
     
     async def _check_live_room_status(self):
@@ -100,126 +222,244 @@ class BaseCrawler(ABC):
             # 检查是否存在直播结束提示
             end_text = await self.page.query_selector('text=直播已结束')
             if end_text:
-                logger.warning("直播间已结束")
+                self.logger.warning("直播间已结束")
                 return False
             
-            logger.info("直播间加载成功")
+            # 检查是否存在弹幕区域
+            chat_selector = self._get_chat_selector()
+            if chat_selector and not await self.page.query_selector(chat_selector):
+                self.logger.warning("未找到弹幕区域，可能需要手动处理")
+            
+            self.logger.info("直播间加载成功")
             return True
             
         except Exception as e:
-            logger.error(f"检查直播间状态失败: {e}")
+            self.logger.error(f"检查直播间状态失败: {e}")
             return False
     
+    async def _detect_session_failure(self) -> Optional[str]:
+        """检查是否被带到验证或登录页，返回命中的地址关键字或选择器，未命中时返回 None"""
+        try:
+            url = self.page.url
+            for keyword in self.platform_config.get("session_failure_urls", []):
+                if keyword in url:
+                    self.logger.warning(f"被重定向到验证或登录页: {url}")
+                    return keyword
+            for selector in self.platform_config.get("session_failure_selectors", []):
+                if await self.page.query_selector(selector):
+                    self.logger.warning(f"页面出现验证或登录元素: {selector}")
+                    return selector
+        except Exception as e:
+            self.logger.error(f"检查会话状态失败: {e}")
+        return None
+    
+    async def _wait_until_ready(self):
+        """等待弹幕区域出现或收到第一帧弹幕，并记录启动耗时"""
+        timeout = Config.get_network_config()["ready_timeout"] / 1000
+        reason = await self.startup.wait_ready(self.page, self._get_chat_selector(), timeout)
+        if reason == "timeout":
+            self.logger.warning(f"{timeout:.0f} 秒内未找到弹幕区域，也没有收到弹幕，继续监听")
+        self.logger.info(f"直播间就绪（{reason}）: {self.startup.summary()}")
+    
+    async def _load_storage_state(self) -> Optional[Dict]:
+        """读取本平台的存储状态缓存，没有或已过期时返回 None（冷启动）"""
+        if self.storage_cache is None:
+            return None
+        state = await asyncio.get_running_loop().run_in_executor(None, self.storage_cache.load, self.platform)
+        self.startup.warm = state is not None
+        return state
+    
+    async def _update_storage_state(self, context: BrowserContext, entered: bool, session_failed: bool = False):
+        """成功进入直播间后保存存储状态；使用缓存时会话失效（验证页、登录页或导航出错）则删除缓存，下次冷启动
+
+        直播已结束、暂时没有弹幕等未进入直播间的情况与会话无关，保留缓存。
+        """
+        if self.storage_cache is None:
+            return
+        try:
+            if entered:
+                if await self.storage_cache.save(self.platform, context):
+                    self.logger.info("已保存浏览器存储状态")
+            elif session_failed and self.startup.warm:
+                self.storage_cache.invalidate(self.platform)
+                self.logger.warning("使用存储状态缓存时会话失效，已删除缓存")
+        except Exception as e:
+            self.logger.error(f"保存浏览器存储状态失败: {e}")
+    
+    async def _register_handlers(self):
+        """注册弹幕API拦截和WebSocket监听（必须在访问直播间之前完成）"""
+        # 只拦截弹幕API请求，其余流量（图片、脚本、视频分片等）不经过Python
+        await self.page.route(self.api_pattern, self._handle_network_request)
+        
+        # 监听页面消息（page.on 是同步方法，不能 await）；bridge 模式下帧由页面脚本转发
+        if self.ws_bridge is None:
+            self.page.on("websocket", self._handle_websocket)
+    
     async def _start_comment_monitoring(self):
         """开始监听弹幕"""
-        logger.info("开始监听弹幕...")
+        self.logger.info("开始监听弹幕...")
         
         try:
-            # 监听网络请求，获取弹幕数据
-            await self.page.route("**/*", self._handle_network_request)
-            
-            # 监听页面消息
-            await self.page.on("websocket", self._handle_websocket)
-            
-            # 持续运行
-            while True:
+            # 持续运行，直到页面崩溃
+            while not self.page_crashed:
                 await asyncio.sleep(1)
                 
-                # 定期保存数据
-                if len(self.comments) % 10 == 0 and self.comments:
-                    await self._save_comments()
-                
         except KeyboardInterrupt:
-            logger.info("收到中断信号，正在停止...")
+            self.logger.info("收到中断信号，正在停止...")
         except Exception as e:
-            logger.error(f"监听弹幕时发生错误: {e}")
+            self.logger.error(f"监听弹幕时发生错误: {e}")
         finally:
             await self._cleanup()
     
     async def _handle_network_request(self, route):
-        """处理网络请求，提取弹幕数据"""
+        """处理弹幕API请求：只请求一次，并用同一份响应完成路由"""
+        started = time.perf_counter()
         try:
-            request = route.request
+            response = await route.fetch()
+            body = await response.body()
             
-            # 检查是否是弹幕相关的API请求
-            if self._is_chat_api_request(request.url):
-                response = await route.fetch()
-                
-                if response.ok:
-                    try:
-                        data = await response.json()
-                        await self._extract_comments_from_response(data)
-                    except json.JSONDecodeError:
-                        pass
-                        
-            await route.continue_()
+            # 直接把已获取的响应交给页面，避免 continue_() 再请求一次
+            await route.fulfill(response=response, body=body)
+            self.requests_saved += 1
+            self.stage_timings["intercept"].observe(time.perf_counter() - started)
             
         except Exception as e:
-            logger.error(f"处理网络请求失败: {e}")
-            await route.continue_()
+            self.logger.error(f"处理网络请求失败: {e}")
+            try:
+                await route.continue_()
+            except Exception:
+                pass
+            return
+        
+        if response.ok:
+            self.startup.frame_received()
+            if self.raw_recorder:
+                self.raw_recorder.record_http(body)
+            await self._handle_response_body(body)
     
-    def _is_chat_api_request(self, url: str) -> bool:
-        """检查是否是聊天API请求"""
-        chat_keywords = [
+    async def _handle_response_body(self, body: bytes):
+        """解码弹幕API响应体并提取弹幕（抓包回放也从这里进入）"""
+        try:
+            started = time.perf_counter()
+            data = json.loads(body)
+            self.stage_timings["decode"].observe(time.perf_counter() - started)
+            started = time.perf_counter()
+            await self._extract_comments_from_response(data)
+            self.stage_timings["extract"].observe(time.perf_counter() - started)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            pass
+    
+    def _get_chat_api_pattern(self) -> Pattern:
+        """获取聊天API请求的URL正则（优先使用平台配置中的 api_patterns）"""
+        patterns = self.platform_config.get("api_patterns") or [
             "chat", "message", "comment", "im", "push", "fetch"
         ]
-        return any(keyword in url.lower() for keyword in chat_keywords)
+        return compile_url_patterns(patterns)
     
-    async def _handle_websocket(self, websocket):
+    def _get_chat_selector(self) -> Optional[str]:
+        """获取弹幕区域的选择器，未配置时只以收到第一帧弹幕作为就绪"""
+        return self.platform_config.get("chat_selector")
+
+    def _get_websocket_patterns(self) -> List[str]:
+        """获取弹幕WebSocket连接的URL片段，未配置时转发所有连接"""
+        return self.platform_config.get("websocket_patterns", [])
+
+    def _is_chat_api_request(self, url: str) -> bool:
+        """检查是否是聊天API请求"""
+        return bool(self.api_pattern.search(url))
+    
+    def _receive_frame(self, payload):
+        """收到一个WebSocket帧：开启抓包时先原样记录，再放入帧队列"""
+        if self.raw_recorder:
+            self.raw_recorder.record_frame(payload)
+        self.startup.frame_received()
+        self.frame_queue.put_nowait(payload)
+    
+    def _handle_websocket(self, websocket):
         """处理WebSocket连接"""
-        logger.info(f"WebSocket连接: {websocket.url}")
+        self.logger.info(f"WebSocket连接: {websocket.url}")
         
-        async def handle_message(msg):
-            try:
-                if msg.type == "text":
-                    data = json.loads(msg.text)
-                    await self._extract_comments_from_websocket(data)
-            except Exception as e:
-                logger.error(f"处理WebSocket消息失败: {e}")
+        def handle_message(payload):
+            # 只入队，不为每一帧创建任务；队列满时按溢出策略丢弃
+            self._receive_frame(payload)
         
-        websocket.on("framesent", handle_message)
-        websocket.on("framereceived", handle_message)
-    
-    async def _save_comments(self):
-        """保存弹幕数据"""
         try:
-            # 确保输出目录存在
-            output_path = Path(self.output_file)
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # 保存为JSON格式
-            with open(self.output_file, 'w', encoding='utf-8') as f:
-                json.dump(self.comments, f, ensure_ascii=False, indent=2)
-            
-            logger.info(f"已保存 {len(self.comments)} 条弹幕到 {self.output_file}")
-            
+            websocket.on("framesent", handle_message)
+            websocket.on("framereceived", handle_message)
         except Exception as e:
-            logger.error(f"保存弹幕失败: {e}")
+            self.logger.error(f"添加WebSocket事件监听器失败: {e}")
+    
+    def _is_low_priority_frame(self, frame) -> bool:
+        """队列满时是否优先丢弃该帧，默认所有帧同等对待"""
+        return False
+    
+    async def _process_frames(self, frames: List):
+        """批量处理WebSocket文本帧"""
+        decode_timings = self.stage_timings["decode"]
+        extract_timings = self.stage_timings["extract"]
+        for frame in frames:
+            if not isinstance(frame, str):
+                continue
+            started = time.perf_counter()
+            try:
+                data = json.loads(frame)
+            except json.JSONDecodeError as e:
+                self.logger.error(f"处理WebSocket消息失败: {e}")
+                continue
+            decoded = time.perf_counter()
+            decode_timings.observe(decoded - started)
+            await self._extract_comments_from_websocket(data)
+            extract_timings.observe(time.perf_counter() - decoded)
+    
+    async def _save_comments(self):
+        """保存弹幕数据（交给后台写入线程，不阻塞事件循环）"""
+        self.persister.flush()
     
     async def _cleanup(self):
-        """清理资源"""
+        """清理资源（每一步单独处理异常，前一步失败时仍会保存数据并停止后台线程）"""
+        loop = asyncio.get_running_loop()
+        if self.page:
+            await self._cleanup_step("关闭页面", self.page.close)
+        if self.context:
+            await self._cleanup_step("关闭浏览器上下文", self.context.close)
+        if self.browser:
+            await self._cleanup_step("关闭浏览器", self.browser.close)
+        
+        # 处理完队列中剩余的帧
+        await self._cleanup_step("停止帧队列", self.frame_queue.stop)
+        
+        # 最终保存（在线程池中等待写入线程退出）
+        await self._cleanup_step("保存弹幕", lambda: loop.run_in_executor(None, self.persister.close))
+        if self.raw_recorder:
+            await self._cleanup_step("关闭抓包文件", lambda: loop.run_in_executor(None, self.raw_recorder.close))
+        unregister_crawler(self)
+        self.logger.info("清理完成")
+        close_room_log(self.platform, self.room_id)
+    
+    async def _cleanup_step(self, name: str, step: Callable[[], Awaitable]):
+        """执行一个清理步骤，失败时记录日志后继续"""
         try:
-            if self.page:
-                await self.page.close()
-            if self.browser:
-                await self.browser.close()
-            
-            # 最终保存
-            await self._save_comments()
-            logger.info("清理完成")
-            
+            await step()
         except Exception as e:
-            logger.error(f"清理失败: {e}")
-    
-    def add_comment(self, user: str, content: str, comment_type: str = "chat"):
-        """添加弹幕"""
-        comment = {
-            "timestamp": datetime.now().isoformat(),
-            "user": user,
-            "content": content,
-            "type": comment_type,
-            "platform": self.platform,
-            "room_id": self.room_id
-        }
+            self.logger.error(f"{name}失败: {e}")
+    
+    def _store_comment(self, comment: CommentRecord, source: str, msg_id=None) -> bool:
+        """记录一条弹幕并提交给后台写入线程，重复消息返回 False"""
+        started = time.perf_counter()
+        if self.dedup.is_duplicate(source, msg_id, comment.user, comment.content, comment.ts_ms):
+            return False
+        
         self.comments.append(comment)
-        logger.info(f"弹幕: {user}: {content}") 
\ No newline at end of file
+        self.persister.submit(comment)
+        self.metrics.record(comment)
+        self.stage_timings["append"].observe(time.perf_counter() - started)
+        if self.metrics.total == 1:
+            self.startup.mark("first_comment")
+            self.logger.info(f"收到第一条弹幕: {self.startup.summary()}")
+        return True
+    
+    def add_comment(self, user: str, content: str, comment_type: str = "chat", msg_id=None, source: str = "api"):
+        """添加弹幕（重复消息会被丢弃）"""
+        comment = CommentRecord(user, content, comment_type, self.platform, self.room_id)
+        if self._store_comment(comment, source, msg_id):
+            self._log_comment(self.logger, user, content) 
\ No newline at end of file
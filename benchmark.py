@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import Config
+from models import CommentRecord
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource，峰值内存记为 0
+    resource = None
+
+
+# 弹幕内容使用的常见字符
+_CHARS = ("的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会家可下而过天去能对小多然于心学么之都好看起发当没成只如事把还用第样道想作种开美总从无情己面最女但现前些所同日手又行意动方期它头经长儿回位分爱老因很给名法间斯知世什两次使身者被高已亲其进此话常与活正感"
+          "主播666哈哈哈！？~👍🎉❤")
+
+# 各平台消息类型的占比（接近真实直播间：聊天为主，点赞、进场次之，礼物较少）
+DOUYIN_TYPE_MIX = (
+    ("WebcastChatMessage", 0.55),
+    ("WebcastLikeMessage", 0.18),
+    ("WebcastMemberMessage", 0.15),
+    ("WebcastGiftMessage", 0.05),
+    ("WebcastRoomUserSeqMessage", 0.07),  # 在线人数等，不生成弹幕
+)
+TAOBAO_TYPE_MIX = (
+    ("chat", 0.7),
+    ("like", 0.15),
+    ("follow", 0.1),
+    ("share", 0.05),
+)
+
+# 场景：(平台, 数据来源)。response 为 HTTP 轮询响应（一次包含多条消息），websocket 为逐条推送的消息
+SCENARIOS = {
+    "douyin_response": ("douyin", "response"),
+    "douyin_websocket": ("douyin", "websocket"),
+    "taobao_response": ("taobao", "response"),
+    "taobao_websocket": ("taobao", "websocket"),
+}
+
+# 对比上次结果时检查的指标：(指标, 数值越大越好)
+COMPARED_METRICS = (
+    ("extract_msgs_per_s", True),
+    ("total_msgs_per_s", True),
+    ("latency_p50_us", False),
+    ("latency_p99_us", False),
+    ("peak_rss_mb", False),
+    ("bytes_written", False),
+)
+
+
+def _cumulative(mix: Tuple[Tuple[str, float], ...]) -> Tuple[List[str], List[float]]:
+    """(类型, 占比) 列表转换为类型列表和累积权重"""
+    return [name for name, _ in mix], list(itertools.accumulate(weight for _, weight in mix))
+
+
+class PayloadGenerator:
+    """合成直播间消息
+
+    用户按齐夫分布发言（少数用户发言很多），消息类型按平台的占比随机生成，
+    少量消息会以相同的消息ID重复出现，模拟 HTTP 轮询和 WebSocket 推送的重叠。
+    固定随机种子时生成的序列完全相同，保证多次运行可比。
+    """
+
+    def __init__(self, seed: int = 0, users: int = 5000, duplicate_rate: float = 0.02):
+        self.random = random.Random(seed)
+        self.duplicate_rate = duplicate_rate
+        self._users = [
+            {"id": 100000000 + i, "nickname": f"用户{i}_{self.random.choice(_CHARS)}", "level": self.random.randint(1, 60)}
+            for i in range(users)
+        ]
+        # 预先计算累积权重，避免每次抽样都重新累加
+        self._user_cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, users + 1)))
+        self._douyin_types, self._douyin_cum_weights = _cumulative(DOUYIN_TYPE_MIX)
+        self._taobao_types, self._taobao_cum_weights = _cumulative(TAOBAO_TYPE_MIX)
+        self._next_id = 7000000000000000000
+        self._recent: List[Dict] = []
+
+    def _user(self) -> Dict:
+        return self.random.choices(self._users, cum_weights=self._user_cum_weights)[0]
+
+    def _text(self) -> str:
+        return "".join(self.random.choices(_CHARS, k=self.random.randint(2, 40)))
+
+    def _msg_id(self) -> int:
+        self._next_id += self.random.randint(1, 1000)
+        return self._next_id
+
+    def _maybe_duplicate(self, message: Dict) -> Dict:
+        """按重复率返回最近的一条旧消息，否则返回新消息"""
+        if self._recent and self.random.random() < self.duplicate_rate:
+            return self.random.choice(self._recent)
+        self._recent.append(message)
+        if len(self._recent) > 100:
+            del self._recent[:50]
+        return message
+
+    def douyin_message(self) -> Dict:
+        method = self.random.choices(self._douyin_types, cum_weights=self._douyin_cum_weights)[0]
+        user = self._user()
+        message = {
+            "method": method,
+            "common": {
+                "method": method,
+                "msg_id": self._msg_id(),
+                "room_id": 7300000000000000000,
+                "create_time": int(time.time() * 1000),
+                "is_show_msg": True,
+            },
+            "user": {
+                "id": user["id"],
+                "short_id": user["id"] % 100000000,
+                "nickname": user["nickname"],
+                "gender": self.random.randint(0, 2),
+                "level": user["level"],
+                "follow_info": {"following_count": self.random.randint(0, 500), "follower_count": self.random.randint(0, 10000)},
+                "pay_grade": {"level": user["level"] // 5, "name": ""},
+                "badge_image_list": [{"url_list": ["https://p3-webcast.douyinpic.com/img/webcast/badge.png~tplv-obj.image"]}],
+            },
+        }
+        if method == "WebcastChatMessage":
+            message["content"] = self._text()
+        elif method == "WebcastGiftMessage":
+            message["gift_name"] = self.random.choice(("小心心", "玫瑰", "人气票", "棒棒糖", "嘉年华"))
+            message["repeat_count"] = self.random.randint(1, 99)
+        elif method == "WebcastLikeMessage":
+            message["count"] = self.random.randint(1, 30)
+            message["total"] = self.random.randint(1000, 1000000)
+        elif method == "WebcastRoomUserSeqMessage":
+            message["total"] = self.random.randint(1000, 100000)
+        return self._maybe_duplicate(message)
+
+    def taobao_message(self) -> Dict:
+        message_type = self.random.choices(self._taobao_types, cum_weights=self._taobao_cum_weights)[0]
+        user = self._user()
+        message = {
+            "type": message_type,
+            "id": str(self._msg_id()),
+            "timestamp": int(time.time() * 1000),
+            "user": {"userId": str(user["id"]), "nickname": user["nickname"], "level": user["level"], "fansLevel": user["level"] // 10},
+            "content": self._text() if message_type == "chat" else "",
+        }
+        return self._maybe_duplicate(message)
+
+    def payloads(self, platform_name: str, source: str, messages: int, batch: int) -> Iterator[Tuple[Dict, int]]:
+        """按需生成 (载荷, 消息数)：response 每个载荷包含 ``batch`` 条消息，websocket 每个载荷一条"""
+        make = self.douyin_message if platform_name == "douyin" else self.taobao_message
+        if source == "websocket":
+            for _ in range(messages):
+                yield make(), 1
+            return
+
+        remaining = messages
+        while remaining > 0:
+            size = min(batch, remaining)
+            remaining -= size
+            batch_messages = [make() for _ in range(size)]
+            if platform_name == "douyin":
+                yield {"messages": batch_messages, "extra": {"cursor": str(self._next_id), "fetch_interval": 1000}}, size
+            else:
+                yield {"data": {"messages": batch_messages, "hasMore": True}, "ret": ["SUCCESS::调用成功"]}, size
+
+
+def _path_size(path: Path) -> int:
+    """文件（含 SQLite 的 -wal 文件）或目录的总字节数"""
+    if path.is_dir():
+        return sum(item.stat().st_size for item in path.rglob("*") if item.is_file())
+    return sum(candidate.stat().st_size for candidate in (path, path.with_name(path.name + "-wal")) if candidate.exists())
+
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def _run_scenario(name: str, messages: int, batch: int, file_format: str, seed: int, duplicate_rate: float) -> Dict:
+    # 延迟导入，只在子进程中加载抓取器
+    from douyin_crawler import DouyinCrawler
+    from log_mux import close_room_log
+    from taobao_crawler import TaobaoCrawler
+
+    platform_name, source = SCENARIOS[name]
+    crawler_class = DouyinCrawler if platform_name == "douyin" else TaobaoCrawler
+    generator = PayloadGenerator(seed, duplicate_rate=duplicate_rate)
+    room_id = f"bench_{name}"
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="skycomment_bench_"))
+    output = tmp_dir / f"{room_id}.{file_format}"
+    try:
+        crawler = crawler_class(room_id, str(output))
+        extract = (crawler._extract_comments_from_response if source == "response"
+                   else crawler._extract_comments_from_websocket)
+        crawler.persister.start()
+
+        latencies = []
+        extract_seconds = 0.0
+        wall_started = time.perf_counter()
+        for payload, count in generator.payloads(platform_name, source, messages, batch):
+            started = time.perf_counter()
+            await extract(payload)
+            elapsed = time.perf_counter() - started
+            extract_seconds += elapsed
+            # response 载荷按消息数均摊，得到单条消息的耗时
+            latencies.append(elapsed / count)
+        wall_extracted = time.perf_counter()
+
+        # 保存剩余弹幕并等待写入线程写完
+        await crawler._save_comments()
+        await asyncio.get_running_loop().run_in_executor(None, crawler.persister.close)
+        persist_seconds = time.perf_counter() - wall_extracted
+        close_room_log(platform_name, room_id)
+
+        stored = crawler.metrics.total
+        bytes_written = _path_size(output)
+        total_seconds = extract_seconds + persist_seconds
+        return {
+            "messages": messages,
+            "stored": stored,
+            "extract_seconds": round(extract_seconds, 4),
+            "persist_seconds": round(persist_seconds, 4),
+            "wall_seconds": round(time.perf_counter() - wall_started, 4),
+            "extract_msgs_per_s": round(messages / extract_seconds) if extract_seconds else 0,
+            "total_msgs_per_s": round(messages / total_seconds) if total_seconds else 0,
+            "latency_p50_us": round(_percentile(latencies, 0.5) * 1e6, 2),
+            "latency_p99_us": round(_percentile(latencies, 0.99) * 1e6, 2),
+            "flush_p99_ms": round(crawler.persister.flush_durations.quantile(0.99) * 1000, 2),
+            "flush_count": crawler.persister.flush_count,
+            "peak_rss_mb": _peak_rss_mb(),
+            "bytes_written": bytes_written,
+            "bytes_per_comment": round(bytes_written / stored, 1) if stored else 0,
+        }
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def run_scenario(name: str, messages: int, batch: int, file_format: str, seed: int, duplicate_rate: float) -> Dict:
+    """运行一个场景（在独立子进程中调用，峰值内存互不影响）"""
+    return asyncio.run(_run_scenario(name, messages, batch, file_format, seed, duplicate_rate))
+
+
+def measure_record_memory(count: int, seed: int) -> Dict:
+    """用 tracemalloc 测量内存中每条弹幕的字节数：旧版 dict（ISO 时间戳字符串）与 CommentRecord 对比
+
+    用户名和弹幕内容两种表示共用，先于测量生成，不计入；列表中每项的指针两者都计入。
+    在独立子进程中调用，避免其他场景残留的分配影响结果。
+    """
+    generator = PayloadGenerator(seed)
+    users = [generator._user()["nickname"] for _ in range(count)]
+    contents = [generator._text() for _ in range(count)]
+    base_ms = int(time.time() * 1000)
+
+    def traced(build) -> float:
+        tracemalloc.start()
+        try:
+            items = build()
+            size = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        del items
+        return round(size / count, 1)
+
+    def build_dicts() -> List[Dict]:
+        return [{
+            "timestamp": datetime.fromtimestamp((base_ms + i) / 1000).isoformat(),
+            "user": users[i],
+            "content": contents[i],
+            "type": "chat",
+            "platform": "douyin",
+            "room_id": "7300000000000000000"
+        } for i in range(count)]
+
+    def build_records() -> List[CommentRecord]:
+        return [CommentRecord(users[i], contents[i], platform="douyin", room_id="7300000000000000000", ts_ms=base_ms + i)
+                for i in range(count)]
+
+    return {
+        "comments": count,
+        "dict_bytes_per_comment": traced(build_dicts),
+        "record_bytes_per_comment": traced(build_records),
+    }
+
+
+def _git_revision() -> Tuple[str, bool]:
+    """代码所在仓库的当前提交和是否有未提交的修改，不在 git 仓库中时返回 ("", False)"""
+    repo = Path(__file__).resolve().parent
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return revision, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "", False
+
+
+def load_previous(results_path: Path, params: Dict) -> Optional[Dict]:
+    """读取参数相同的最近一次结果"""
+    if not results_path.exists():
+        return None
+    previous = None
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("params") == params:
+                previous = record
+    return previous
+
+
+def compare(current: Dict, previous: Dict, threshold: float) -> List[str]:
+    """打印与上次结果的对比，返回变差超过阈值（百分比）的指标"""
+    regressions = []
+    print(f"\n与上次结果对比（{previous['timestamp']}，提交 {previous.get('commit') or '未知'}）：")
+    print(f"{'场景':<18} {'指标':<20} {'上次':>14} {'本次':>14} {'变化':>9}")
+    for name, result in current["results"].items():
+        old = previous["results"].get(name)
+        if not old:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            before, after = old.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = " ← 变差"
+                regressions.append(f"{name}.{metric}")
+            print(f"{name:<18} {metric:<20} {before:>14} {after:>14} {change:>+8.1f}%{flag}")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict]):
+    print(f"{'场景':<18} {'消息/秒':>10} {'含写盘':>10} {'p50(us)':>9} {'p99(us)':>9} {'峰值内存MB':>11} {'写入字节':>12} {'字节/条':>8}")
+    for name, result in results.items():
+        print(f"{name:<18} {result['extract_msgs_per_s']:>10} {result['total_msgs_per_s']:>10} "
+              f"{result['latency_p50_us']:>9} {result['latency_p99_us']:>9} {result['peak_rss_mb']:>11} "
+              f"{result['bytes_written']:>12} {result['bytes_per_comment']:>8}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="弹幕提取与持久化热路径的离线基准测试（不启动浏览器）")
+    parser.add_argument("--scenario", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS), help="要运行的场景")
+    parser.add_argument("--messages", type=int, default=100000, help="每个场景的消息条数")
+    parser.add_argument("--batch", type=int, default=20, help="response 场景中每个载荷包含的消息条数")
+    parser.add_argument("--format", default=Config.get_save_config()["file_format"],
+                        choices=("jsonl", "json", "sqlite", "segments"), help="输出格式")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子（相同种子生成相同的消息序列）")
+    parser.add_argument("--duplicate_rate", type=float, default=0.02, help="重复消息的比例")
+    parser.add_argument("--repeat", type=int, default=3, help="每个场景运行次数，取吞吐量居中的一次（减少波动）")
+    parser.add_argument("--results", default="output/benchmark_results.jsonl", help="结果文件（每次运行追加一行JSON）")
+    parser.add_argument("--no_save", action="store_true", help="不保存本次结果")
+    parser.add_argument("--threshold", type=float, default=15.0, help="指标变差超过该百分比时标记为回退")
+    parser.add_argument("--check", action="store_true", help="存在回退时以非零状态码退出（用于CI）")
+    parser.add_argument("--memory_records", type=int, default=100000,
+                        help="测量每条弹幕内存占用时构造的记录数（0 表示不测量）")
+
+    args = parser.parse_args()
+    params = {
+        "messages": args.messages,
+        "batch": args.batch,
+        "format": args.format,
+        "seed": args.seed,
+        "duplicate_rate": args.duplicate_rate,
+    }
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in args.scenario:
+        runs = []
+        for _ in range(args.repeat):
+            # 每次运行使用新的子进程，峰值内存只反映本场景
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                runs.append(executor.submit(
+                    run_scenario, name, args.messages, args.batch, args.format, args.seed, args.duplicate_rate
+                ).result())
+        runs.sort(key=lambda run: run["extract_msgs_per_s"])
+        results[name] = runs[len(runs) // 2]
+
+    record_memory = None
+    if args.memory_records > 0:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            record_memory = executor.submit(measure_record_memory, args.memory_records, args.seed).result()
+
+    revision, dirty = _git_revision()
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": revision,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "machine": f"{platform.system()}-{platform.machine()}",
+        "params": params,
+        "results": results,
+    }
+    if record_memory:
+        record["record_memory"] = record_memory
+
+    print()
+    print_results(results)
+    if record_memory:
+        print(f"\n每条弹幕的内存占用（{record_memory['comments']} 条，不含用户名和内容字符串）："
+              f"dict + ISO 时间戳 {record_memory['dict_bytes_per_comment']} 字节，"
+              f"CommentRecord {record_memory['record_bytes_per_comment']} 字节")
+
+    results_path = Path(args.results)
+    previous = load_previous(results_path, params)
+    regressions = compare(record, previous, args.threshold) if previous else []
+    if not previous:
+        print("\n没有参数相同的历史结果可供对比")
+
+    if not args.no_save:
+        results_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(results_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"\n结果已追加到 {results_path}")
+
+    if regressions:
+        print(f"\n{len(regressions)} 项指标变差超过 {args.threshold}%: {', '.join(regressions)}")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -41,8 +41,15 @@ class Config:
             "webcast/im/push"
         ],
         "websocket_patterns": [
-            "wss://webcast3-ws-web-lq.douyin.com"
-        ]
+            "wss://webcast3-ws-web-lq.douyin.com",
+            "/webcast/im/push/"
+        ],
+        "chat_selector": ".webcast-chatroom___list",  # 弹幕区域，出现即视为进入直播间
+        # 跳转到这些地址或出现这些元素说明会话失效（验证或登录页），使用存储状态缓存时据此删除缓存
+        "session_failure_urls": ["passport.douyin.com", "verifycenter"],
+        "session_failure_selectors": ["#captcha_container", "#captcha-verify-image"],
+        "decode_workers": 1,  # 解码二进制推送帧的工作线程数
+        "heartbeat_interval": 10  # 免浏览器模式下推送通道的心跳间隔（秒）
     }
     
     # 淘宝配置
@@ -55,26 +62,107 @@ class Config:
         ],
         "websocket_patterns": [
             "wss://live.taobao.com"
-        ]
+        ],
+        "chat_selector": ".chat-container",  # 弹幕区域，出现即视为进入直播间
+        # 跳转到这些地址或出现这些元素说明会话失效（验证或登录页），使用存储状态缓存时据此删除缓存
+        "session_failure_urls": ["login.taobao.com", "_____tmd_____/punish"],
+        "session_failure_selectors": ["#nocaptcha", "#login-form"]
     }
     
     # 日志配置
     LOG_CONFIG = {
         "rotation": "1 day",
         "retention": "7 days",
-        "format": "{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}"
+        "format": "{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}",
+        "level": "INFO",
+        "comment_log_rate": 20  # 每个直播间每秒最多输出的弹幕日志条数，超出部分汇总为一条
     }
     
     # 数据保存配置
     SAVE_CONFIG = {
         "auto_save_interval": 10,  # 每10条弹幕自动保存一次
-        "file_format": "json",
-        "encoding": "utf-8"
+        "file_format": "json",  # json: 旧版的JSON数组（默认，追加时原地改写结尾）；jsonl: 逐行追加（推荐）；sqlite: SQLite数据库（WAL模式，可边写边查）；segments: 按时间分段的压缩归档目录
+        "encoding": "utf-8",
+        "sqlite_fts": True,  # sqlite 格式下同时维护全文索引，供 search.py 检索
+        "segment_seconds": 3600,  # segments 格式下每个分段覆盖的时长（秒）
+        "segment_compression": "zlib",  # segments 格式的块压缩方式：zlib / gzip
+        "segment_block_records": 1000,  # 每个压缩块最多包含的弹幕条数
+        "segment_block_seconds": 30,  # 压缩块在内存中最多停留的时间（秒），没有新弹幕时也按时写出；fsync 会提前写出
+        "flush_interval_ms": 1000,  # 最多缓冲1秒即写盘，与条数条件先到先触发
+        "fsync_policy": "none",  # none: 交给系统；batch: 每批fsync；close: 关闭时fsync
+        "buffer_capacity": 10000,  # 未保存弹幕的前台缓冲区容量，写满后按 buffer_overflow 处理（不阻塞事件循环）
+        "buffer_overflow": "spill",  # spill: 暂存到不设上限的溢出列表，不丢弹幕；drop: 丢弃新弹幕并计数
+        "recent_size": 1000  # 内存中保留的最近弹幕条数，供进程内读取
+    }
+    
+    # WebSocket帧处理队列配置
+    INGEST_CONFIG = {
+        "queue_size": 2000,  # 每个直播间最多缓存的待处理帧数
+        "workers": 2,  # 每个直播间的消费任务数
+        "batch_size": 50,  # 每批最多处理的帧数
+        "overflow_policy": "drop_low_priority"  # 队列满时：drop_oldest / drop_low_priority（帧来自同步回调，不能阻塞等待）
+    }
+    
+    # WebSocket帧采集配置
+    CAPTURE_CONFIG = {
+        "mode": "cdp",  # cdp: 逐帧监听Playwright的framereceived事件；bridge: 页面内缓存后批量转发
+        "bridge_flush_ms": 100,  # bridge 模式下页面内缓存帧的最长时间（毫秒）
+        "bridge_max_batch": 500,  # bridge 模式下每批最多转发的帧数，达到后立即转发
+        "raw_record": False,  # 是否把弹幕API响应和WebSocket帧原样记录到抓包文件，供 raw_capture.py 回放
+        "raw_dir": "captures",  # 抓包文件目录
+        "raw_flush_records": 500,  # 抓包记录攒满多少条写一次盘
+        "raw_compress_min": 256  # 超过该字节数的负载单独压缩
+    }
+    
+    # 消息去重配置
+    DEDUP_CONFIG = {
+        "window_seconds": 300,  # 消息ID保留5分钟，覆盖断线重连的重放（每代写满 max_keys 时提前轮换）
+        "max_keys": 100000,  # 每代最多保留的消息键数，内存上限为两倍
+        "fallback_bucket_seconds": 10  # 没有消息ID时，按 用户+内容+10秒时间段 去重
+    }
+    
+    # 直播间实时指标配置
+    METRICS_CONFIG = {
+        "top_k": 10,  # 快照中输出的高频用户和关键词个数
+        "sketch_capacity": 100,  # 高频项估计跟踪的项数，越大越准确
+        "hll_precision": 12,  # 独立用户数估计的精度（2^12 个寄存器，误差约1.6%）
+        "track_keywords": True  # 是否统计高频关键词（需要对每条弹幕分词）
+    }
+    
+    # 指标端点配置
+    METRICS_SERVER_CONFIG = {
+        "enabled": False,  # 是否在本机启动 Prometheus 指标端点（GET /metrics）
+        "host": "127.0.0.1",
+        "port": 9464
+    }
+    
+    # 在线性能分析配置：SIGUSR1 采集 cProfile，SIGUSR2 采集 tracemalloc 内存快照
+    PROFILE_CONFIG = {
+        "signals": True,  # 是否注册信号处理（Windows 没有这两个信号，自动跳过）
+        "duration": 30,  # 每次采集的时长（秒）
+        "output_dir": "logs",  # 结果文件目录
+        "top": 50,  # 文本报告中输出的条目数
+        "tracemalloc_frames": 10  # tracemalloc 记录的调用栈深度
+    }
+    
+    # 浏览器存储状态缓存：按平台保存 Cookie 和 localStorage，新的浏览器上下文直接复用，跳过同意页和验证
+    SESSION_CONFIG = {
+        "enabled": True,
+        "cache_dir": "cache/storage_state",  # 缓存目录（文件包含登录状态，权限为 600）
+        "ttl": 6 * 3600,  # 缓存有效期（秒），过期后冷启动并重新保存
+        "refresh_interval": 600  # 缓存保存后该时间（秒）内不重复保存，避免多个直播间同时启动时反复写入
+    }
+    
+    # 多直播间配置
+    MULTI_ROOM_CONFIG = {
+        "max_rooms": 20,  # 单进程（共享一个浏览器）最多同时运行的直播间数
+        "max_restarts": 3  # 页面崩溃后自动重启的次数
     }
     
     # 网络请求配置
     NETWORK_CONFIG = {
         "timeout": 30000,  # 30秒超时
+        "ready_timeout": 15000,  # 页面文档加载后等待弹幕区域或第一帧弹幕的最长时间（毫秒）
         "retry_times": 3,
         "retry_delay": 1
     }
@@ -104,6 +192,46 @@ class Config:
         """获取保存配置"""
         return cls.SAVE_CONFIG.copy()
     
+    @classmethod
+    def get_ingest_config(cls) -> Dict[str, Any]:
+        """获取WebSocket帧处理队列配置"""
+        return cls.INGEST_CONFIG.copy()
+    
+    @classmethod
+    def get_capture_config(cls) -> Dict[str, Any]:
+        """获取WebSocket帧采集配置"""
+        return cls.CAPTURE_CONFIG.copy()
+    
+    @classmethod
+    def get_dedup_config(cls) -> Dict[str, Any]:
+        """获取消息去重配置"""
+        return cls.DEDUP_CONFIG.copy()
+    
+    @classmethod
+    def get_metrics_config(cls) -> Dict[str, Any]:
+        """获取直播间实时指标配置"""
+        return cls.METRICS_CONFIG.copy()
+    
+    @classmethod
+    def get_metrics_server_config(cls) -> Dict[str, Any]:
+        """获取指标端点配置"""
+        return cls.METRICS_SERVER_CONFIG.copy()
+    
+    @classmethod
+    def get_profile_config(cls) -> Dict[str, Any]:
+        """获取在线性能分析配置"""
+        return cls.PROFILE_CONFIG.copy()
+    
+    @classmethod
+    def get_session_config(cls) -> Dict[str, Any]:
+        """获取浏览器存储状态缓存配置"""
+        return cls.SESSION_CONFIG.copy()
+    
+    @classmethod
+    def get_multi_room_config(cls) -> Dict[str, Any]:
+        """获取多直播间配置"""
+        return cls.MULTI_ROOM_CONFIG.copy()
+    
     @classmethod
     def get_network_config(cls) -> Dict[str, Any]:
         """获取网络配置"""
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from loguru import logger
+
+from config import Config
+from models import CommentRecord
+from storage import create_comment_writer
+
+
+# 分隔符：数组元素之间的空白和逗号
+_SEPARATORS = re.compile(r"[\s,]*")
+
+# 旧版输出文件名：{platform}_{room_id}_{YYYYmmdd}_{HHMMSS}.json
+_LEGACY_FILENAME = re.compile(r"^(?P<platform>[a-z]+)_(?P<room_id>.+)_\d{8}_\d{6}$")
+
+# 支持的输出格式，同时作为输出文件的扩展名（segments 输出为目录）
+OUTPUT_FORMATS = ("jsonl", "sqlite", "segments")
+
+
+def iter_json_array(f: TextIO, chunk_size: int = 1 << 20) -> Iterator[Dict]:
+    """逐个解析 JSON 数组中的元素
+
+    每次只读入 ``chunk_size`` 个字符，用 ``JSONDecoder.raw_decode`` 解析缓冲区中完整的元素，
+    内存占用只与单个元素的大小有关，与文件大小无关。
+    旧版写入中途退出的文件缺少结尾的 ``]``，此时返回所有完整的元素。
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+
+    while True:
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+        while True:
+            pos = _SEPARATORS.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("文件内容不是JSON数组")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    logger.warning(f"JSON数组不完整，已忽略末尾 {len(buffer) - pos} 个字符")
+                    return
+                # 元素被分块截断，读入更多数据后重试
+                break
+            yield item
+
+        if eof:
+            if started:
+                logger.warning("JSON数组缺少结尾的 ]")
+            return
+
+
+def room_from_filename(path: Path) -> Tuple[str, str]:
+    """从旧版文件名中解析平台和直播间ID，旧数据缺少这两个字段时使用"""
+    match = _LEGACY_FILENAME.match(path.stem)
+    if not match:
+        return "", ""
+    return match.group("platform"), match.group("room_id")
+
+
+def output_path_for(input_path: Path, output_dir: Optional[Path], file_format: str) -> Path:
+    """输出路径：与输入文件同名，扩展名为输出格式"""
+    directory = output_dir or input_path.parent
+    return directory / f"{input_path.stem}.{file_format}"
+
+
+def _remove(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+    for suffix in ("-wal", "-shm"):
+        sidecar = path.with_name(path.name + suffix)
+        if sidecar.exists():
+            sidecar.unlink()
+
+
+def convert_file(input_path: str, output_path: str, file_format: str, batch_size: int = 10000) -> int:
+    """转换一个旧版 JSON 数组文件，返回转换的弹幕条数
+
+    先写入 ``{输出路径}.part``，完成后原子重命名；中断后重新运行时，
+    已完成的文件会被跳过，未完成的文件从头转换。
+    """
+    input_path = Path(input_path)
+    output_path = Path(output_path)
+    part_path = output_path.with_name(output_path.name + ".part")
+    _remove(part_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    save_config = Config.get_save_config()
+    platform, room_id = room_from_filename(input_path)
+    writer = create_comment_writer(str(part_path), file_format, save_config["encoding"], save_config["sqlite_fts"])
+
+    total = 0
+    batch: List[CommentRecord] = []
+    try:
+        with open(input_path, "r", encoding=save_config["encoding"]) as f:
+            for item in iter_json_array(f):
+                record = CommentRecord.from_dict(item)
+                if not record.platform:
+                    record.platform = platform
+                if not record.room_id:
+                    record.room_id = room_id
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    total += writer.write(batch)
+                    batch = []
+        total += writer.write(batch)
+        writer.fsync()
+    finally:
+        writer.close()
+
+    if not part_path.exists():
+        # 空数组：只生成空的输出，标记该文件已转换
+        if file_format == "segments":
+            part_path.mkdir(parents=True)
+        else:
+            part_path.touch()
+    os.replace(part_path, output_path)
+    return total
+
+
+def _convert_job(input_path: str, output_path: str, file_format: str) -> Tuple[str, int, float]:
+    """进程池任务"""
+    started = time.perf_counter()
+    total = convert_file(input_path, output_path, file_format)
+    return input_path, total, time.perf_counter() - started
+
+
+def collect_inputs(paths: List[str]) -> List[Path]:
+    """展开输入参数：文件原样保留，目录中查找所有 .json 文件"""
+    inputs = []
+    for value in paths:
+        path = Path(value)
+        if path.is_dir():
+            inputs.extend(sorted(path.rglob("*.json")))
+        else:
+            inputs.append(path)
+    return inputs
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="将旧版JSON数组格式的弹幕文件转换为新格式（流式解析，内存占用恒定）")
+    parser.add_argument("inputs", nargs="+", help="旧版弹幕文件或包含这些文件的目录")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="jsonl", help="输出格式")
+    parser.add_argument("--output_dir", help="输出目录，默认与输入文件相同")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="并行转换的进程数")
+    parser.add_argument("--force", action="store_true", help="重新转换已存在输出的文件")
+
+    args = parser.parse_args()
+    output_dir = Path(args.output_dir) if args.output_dir else None
+
+    jobs = []
+    for input_path in collect_inputs(args.inputs):
+        output_path = output_path_for(input_path, output_dir, args.format)
+        if output_path.exists() and not args.force:
+            logger.info(f"已转换，跳过: {input_path}")
+            continue
+        if args.force:
+            _remove(output_path)
+        jobs.append((str(input_path), str(output_path)))
+
+    if not jobs:
+        logger.info("没有需要转换的文件")
+        return
+
+    logger.info(f"开始转换 {len(jobs)} 个文件，输出格式 {args.format}，进程数 {args.workers}")
+    started = time.perf_counter()
+    converted = 0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(_convert_job, input_path, output_path, args.format): input_path
+            for input_path, output_path in jobs
+        }
+        for future in as_completed(futures):
+            try:
+                input_path, total, elapsed = future.result()
+            except Exception as e:
+                failed += 1
+                logger.error(f"转换失败: {futures[future]}: {e}")
+                continue
+            converted += total
+            logger.info(f"已转换 {input_path}: {total} 条弹幕，耗时 {elapsed:.1f} 秒")
+
+    logger.info(f"转换完成: {len(jobs) - failed} 个文件，{converted} 条弹幕，失败 {failed} 个，"
+                f"总耗时 {time.perf_counter() - started:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+from collections import Counter
+from typing import Optional
+
+from models import now_ms
+
+
+class MessageDeduplicator:
+    """消息去重
+
+    同一条消息可能同时从 HTTP 轮询和 WebSocket 推送到达，断线重连后也会重放。
+    优先按平台消息ID去重，没有ID时按 用户+内容+时间段 的哈希去重。
+
+    已见过的键保存在两代轮换的集合中：当前代写满 ``max_keys`` 个或超过 ``window_seconds``
+    秒时，当前代变为上一代，旧的上一代整体丢弃，内存最多 ``2 * max_keys`` 个键，与运行时长无关。
+    每个键至少保留到下一次轮换之后：消息速率不超过 ``max_keys / window_seconds`` 时至少保留一个时间窗口；
+    速率更高时当前代提前写满，保留时间缩短为之后的 ``max_keys`` 条消息，这种提前轮换计入 ``early_rotations``。
+    """
+
+    def __init__(self, window_seconds: float = 300, max_keys: int = 100000, fallback_bucket_seconds: float = 10):
+        self.window = window_seconds
+        self.max_keys = max_keys
+        self.bucket_ms = int(fallback_bucket_seconds * 1000)
+
+        self.duplicates = Counter()  # 按来源统计丢弃的重复消息数
+        self.early_rotations = 0  # 未满一个时间窗口就因写满 max_keys 而轮换的次数
+
+        self._current = set()
+        self._previous = set()
+        self._rotated_at = time.monotonic()
+
+    def _rotate(self):
+        """当前代变为上一代"""
+        self._previous = self._current
+        self._current = set()
+        self._rotated_at = time.monotonic()
+
+    def _seen(self, key: int) -> bool:
+        return key in self._current or key in self._previous
+
+    def is_duplicate(self, source: str, msg_id=None, user: str = "", content: str = "",
+                     ts_ms: Optional[int] = None) -> bool:
+        """判断消息是否重复；不重复时记录下来。``source`` 用于统计（如 http、websocket）"""
+        if time.monotonic() - self._rotated_at >= self.window:
+            self._rotate()
+
+        if msg_id:
+            key = hash(("id", msg_id))
+            duplicate = self._seen(key)
+        else:
+            # 没有消息ID：同一用户在相邻时间段内发送的相同内容视为重复
+            bucket = (now_ms() if ts_ms is None else ts_ms) // self.bucket_ms
+            key = hash((user, content, bucket))
+            duplicate = self._seen(key) or self._seen(hash((user, content, bucket - 1)))
+
+        if duplicate:
+            self.duplicates[source] += 1
+            return True
+
+        self._current.add(key)
+        if len(self._current) >= self.max_keys:
+            self.early_rotations += 1
+            self._rotate()
+        return False
+
+    def __len__(self) -> int:
+        return len(self._current) + len(self._previous)
@@ -5,231 +5,319 @@ import asyncio
 import json
 import time
 import argparse
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
-from playwright.async_api import async_playwright, Browser, Page
-from loguru import logger
+import websockets
+from playwright.async_api import async_playwright
 
+from base_crawler import BaseCrawler
+from config import Config
+from douyin_proto import DecodedFrame, build_ack_frame, build_heartbeat_frame, decode_push
+from metrics_server import register_crawler
+from models import COMMENT_TYPE_CHAT, COMMENT_TYPE_GIFT, COMMENT_TYPE_LIKE, COMMENT_TYPE_MEMBER, CommentRecord
+from profiling import install_signal_profiler
+from utils import compile_url_patterns
 
-class DouyinCrawler:
-    """抖音直播间弹幕抓取器"""
-    
-    def __init__(self, room_id: str, output_file: str = None):
-        self.room_id = room_id
-        self.output_file = output_file or f"douyin_{room_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        self.comments = []
-        self.browser: Optional[Browser] = None
-        self.page: Optional[Page] = None
-        
-        # 设置日志
-        logger.add(f"logs/douyin_{room_id}.log", rotation="1 day", retention="7 days")
-        
-    async def start(self):
-        """启动抓取器"""
+
+# 积压时优先丢弃的消息类型
+LOW_PRIORITY_METHODS = ("WebcastLikeMessage", "WebcastMemberMessage")
+
+
+def _decode_frames(frames: List, log) -> Tuple[List[Dict], List[float]]:
+    """解码一批WebSocket帧（在工作线程中运行），同时返回每帧的解码耗时
+
+    直方图只由事件循环线程写入，工作线程只返回耗时，由调用方记录。
+    """
+    messages = []
+    durations = []
+    for frame in frames:
+        started = time.perf_counter()
         try:
-            async with async_playwright() as p:
-                # 启动浏览器
-                self.browser = await p.chromium.launch(
-                    headless=True,  # 设置为 True 可以无头模式运行
-                    args=[
-                        '--disable-blink-features=AutomationControlled',
-                        '--disable-web-security',
-                        '--disable-features=VizDisplayCompositor'
-                    ]
-                )
-                
-                # 创建新页面
-                self.page = await self.browser.new_page()
-                
-                # 设置用户代理
-                await self.page.set_extra_http_headers({
-                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                })
-                
-                # 访问直播间
-                await self._navigate_to_live_room()
-                
-                # 开始监听弹幕
-                await self._start_comment_monitoring()
-                
+            if isinstance(frame, bytes):
+                messages.extend(decode_push(frame).messages)
+            else:
+                messages.append(json.loads(frame))
         except Exception as e:
-            logger.error(f"启动失败: {e}")
-            raise
+            log.error(f"解码WebSocket帧失败: {e}")
+        durations.append(time.perf_counter() - started)
+    return messages, durations
+
+
+def _timed_decode_push(frame: bytes) -> Tuple[DecodedFrame, float]:
+    """解码一个二进制推送帧并返回耗时（在工作线程中运行）"""
+    started = time.perf_counter()
+    decoded = decode_push(frame)
+    return decoded, time.perf_counter() - started
+
+
+class DouyinCrawler(BaseCrawler):
+    """抖音直播间弹幕抓取器"""
     
-    async def _navigate_to_live_room(self):
-        """导航到直播间"""
-        try:
-            # 构建直播间URL
-            live_url = f"https://live.douyin.com/{self.room_id}"
-            logger.info(f"正在访问直播间: {live_url}")
-            
-            # 访问直播间
-            await self.page.goto(live_url, wait_until="networkidle")
-            
-            # 等待页面加载
-            await asyncio.sleep(5)
-            
-            # 检查是否成功进入直播间
-            await self._check_live_room_status()
-            
-        except Exception as e:
-            logger.error(f"导航到直播间失败: {e}")
-            raise
+    def __init__(self, room_id: str, output_file: str = None):
+        super().__init__(room_id, "douyin", output_file)
+        # 二进制推送帧的解压和解码在工作线程中进行，不占用事件循环
+        self._decode_executor = ThreadPoolExecutor(
+            max_workers=self.platform_config["decode_workers"],
+            thread_name_prefix=f"douyin-{room_id}-decode"
+        )
     
-    async def _check_live_room_status(self):
-        """检查直播间状态"""
+    async def start_direct(self, ws_url: str = None, headers: Dict[str, str] = None):
+        """免浏览器模式启动
+
+        浏览器只用于获取推送通道的连接参数（签名URL、Cookie、请求头），获取后立即关闭，
+        之后由原生 asyncio WebSocket 客户端接收推送，弹幕走同样的提取和保存流程。
+        传入 ``ws_url`` 时跳过浏览器，直接连接（可用于连接本地模拟服务器）。
+        """
         try:
-            # 检查是否存在直播结束提示
-            end_text = await self.page.query_selector('text=直播已结束')
-            if end_text:
-                logger.warning("直播间已结束")
-                return False
+            # 启动后台写入线程
+            self.persister.start()
+            if self.raw_recorder:
+                self.raw_recorder.start()
+            await register_crawler(self)
+            install_signal_profiler()
+            self.startup.begin()
             
-            # 检查是否存在弹幕区域
-            comment_area = await self.page.query_selector('.webcast-chatroom___list')
-            if not comment_area:
-                logger.warning("未找到弹幕区域，可能需要手动处理")
+            if ws_url is None:
+                ws_url, headers = await self._bootstrap_push_channel()
             
-            logger.info("直播间加载成功")
-            return True
+            await self._consume_push_channel(ws_url, headers or {})
             
-        except Exception as e:
-            logger.error(f"检查直播间状态失败: {e}")
-            return False
-    
-    async def _start_comment_monitoring(self):
-        """开始监听弹幕"""
-        logger.info("开始监听弹幕...")
-        
-        try:
-            # 监听网络请求，获取弹幕数据
-            await self.page.route("**/*", self._handle_network_request)
-            
-            # 监听页面消息
-            await self.page.on("websocket", self._handle_websocket)
-            
-            # 持续运行
-            while True:
-                await asyncio.sleep(1)
-                
-                # 定期保存数据
-                if len(self.comments) % 10 == 0 and self.comments:
-                    await self._save_comments()
-                
         except KeyboardInterrupt:
-            logger.info("收到中断信号，正在停止...")
+            self.logger.info("收到中断信号，正在停止...")
         except Exception as e:
-            logger.error(f"监听弹幕时发生错误: {e}")
+            self.logger.error(f"免浏览器模式运行失败: {e}")
+            raise
         finally:
             await self._cleanup()
     
-    async def _handle_network_request(self, route):
-        """处理网络请求，提取弹幕数据"""
-        try:
-            request = route.request
-            
-            # 检查是否是弹幕相关的API请求
-            if "webcast/im/fetch" in request.url or "webcast/im/push" in request.url:
-                response = await route.fetch()
+    async def _bootstrap_push_channel(self) -> Tuple[str, Dict[str, str]]:
+        """短暂启动浏览器，获取推送通道的签名URL和请求头"""
+        ws_pattern = compile_url_patterns(self.platform_config["websocket_patterns"])
+        network_config = Config.get_network_config()
+        live_url = await self._get_live_room_url()
+        found = asyncio.get_running_loop().create_future()
+        
+        def on_websocket(websocket):
+            if ws_pattern.search(websocket.url) and not found.done():
+                found.set_result(websocket.url)
+        
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(
+                headless=True,
+                args=Config.get_browser_config()["args"]
+            )
+            try:
+                context = await browser.new_context(
+                    user_agent=Config.USER_AGENT, storage_state=await self._load_storage_state()
+                )
+                page = await context.new_page()
+                page.on("websocket", on_websocket)
                 
-                if response and response.ok:
+                self.logger.info(f"正在获取推送通道参数: {live_url}")
+                await page.goto(live_url, wait_until="domcontentloaded")
+                ws_url = await asyncio.wait_for(found, timeout=network_config["timeout"] / 1000)
+                cookies = await context.cookies()
+                await self._update_storage_state(context, True)
+                await page.close()
+            finally:
+                await browser.close()
+        
+        headers = {
+            "User-Agent": Config.USER_AGENT,
+            "Origin": self.platform_config["base_url"],
+            "Cookie": "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies)
+        }
+        self.logger.info(f"已获取推送通道，浏览器已关闭: {ws_url}")
+        return ws_url, headers
+    
+    async def _consume_push_channel(self, ws_url: str, headers: Dict[str, str]):
+        """用原生WebSocket客户端接收推送，断线后按网络配置重连"""
+        network_config = Config.get_network_config()
+        retries = 0
+        
+        while True:
+            try:
+                async with websockets.connect(
+                    ws_url,
+                    extra_headers=headers,
+                    max_size=None,
+                    ping_interval=None,
+                    open_timeout=network_config["timeout"] / 1000
+                ) as ws:
+                    self.logger.info(f"WebSocket连接: {ws_url}")
+                    heartbeat = asyncio.create_task(self._send_heartbeats(ws))
+                    heartbeat.add_done_callback(self._on_heartbeat_done)
                     try:
-                        data = await response.json()
-                        await self._extract_comments_from_response(data)
-                    except json.JSONDecodeError:
-                        pass
-                        
-            await route.continue_()
+                        async for frame in ws:
+                            retries = 0
+                            # 直连模式不经过帧队列，同样计入接收帧数
+                            self.frame_queue.count_received()
+                            if self.raw_recorder:
+                                self.raw_recorder.record_frame(frame)
+                            self.startup.frame_received()
+                            if isinstance(frame, bytes):
+                                decoded = await self._handle_binary_frame(frame)
+                                if decoded and decoded.need_ack:
+                                    await ws.send(build_ack_frame(decoded.frame.log_id, decoded.internal_ext))
+                            else:
+                                started = time.perf_counter()
+                                try:
+                                    message = json.loads(frame)
+                                except ValueError as e:
+                                    # 单个残缺的文本帧不影响后续接收
+                                    self.logger.error(f"解析WebSocket文本帧失败: {e}")
+                                    continue
+                                self.stage_timings["decode"].observe(time.perf_counter() - started)
+                                await self._extract_messages([message])
+                    finally:
+                        heartbeat.cancel()
+                
+                self.logger.warning("推送通道已关闭")
+                
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                self.logger.warning(f"推送通道连接异常: {e}")
             
-        except Exception as e:
-            logger.error(f"处理网络请求失败: {e}")
-            await route.continue_()
+            retries += 1
+            if retries > network_config["retry_times"]:
+                self.logger.error("推送通道重连次数已用尽，停止接收")
+                return
+            await asyncio.sleep(network_config["retry_delay"] * retries)
+    
+    async def _send_heartbeats(self, ws):
+        """定时发送心跳帧，保持推送通道连接"""
+        interval = self.platform_config["heartbeat_interval"]
+        while True:
+            await asyncio.sleep(interval)
+            await ws.send(build_heartbeat_frame())
+    
+    def _on_heartbeat_done(self, task: asyncio.Task):
+        """取回心跳任务的异常（连接断开时发送失败），由接收循环负责重连"""
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.warning(f"推送通道心跳发送失败: {task.exception()}")
+    
+    async def _get_live_room_url(self) -> str:
+        """获取直播间URL"""
+        return f"{self.platform_config['base_url']}/{self.room_id}"
     
     def _handle_websocket(self, websocket):
         """处理WebSocket连接（同步函数）"""
-        logger.info(f"WebSocket连接: {websocket.url}")
+        self.logger.info(f"WebSocket连接: {websocket.url}")
 
-        def handle_message(msg):
-            try:
-                if msg.type == "text":
-                    data = json.loads(msg.text)
-                    # 用异步任务调度
-                    asyncio.create_task(self._extract_comments_from_websocket(data))
-            except Exception as e:
-                logger.error(f"处理WebSocket消息失败: {e}")
+        def handle_message(payload):
+            # 只入队，不为每一帧创建任务；队列满时按溢出策略丢弃
+            self._receive_frame(payload)
+
+        def handle_sent(payload):
+            # 页面自己发出的二进制帧只有心跳和ACK，不需要解码
+            if not isinstance(payload, bytes):
+                handle_message(payload)
 
         try:
-            websocket.on("framesent", handle_message)
+            websocket.on("framesent", handle_sent)
             websocket.on("framereceived", handle_message)
         except Exception as e:
-            logger.error(f"添加WebSocket事件监听器失败: {e}")
+            self.logger.error(f"添加WebSocket事件监听器失败: {e}")
+    
+    def _is_low_priority_frame(self, frame) -> bool:
+        """点赞、进场等文本帧优先丢弃；二进制帧解压前无法判断类型"""
+        return isinstance(frame, str) and any(method in frame for method in LOW_PRIORITY_METHODS)
+    
+    async def _process_frames(self, frames: List):
+        """批量处理WebSocket帧：整批在工作线程中解压、解码，再逐条提取弹幕"""
+        loop = asyncio.get_running_loop()
+        messages, durations = await loop.run_in_executor(self._decode_executor, _decode_frames, frames, self.logger)
+        decode_timings = self.stage_timings["decode"]
+        for duration in durations:
+            decode_timings.observe(duration)
+        
+        if self.frame_queue.policy == "drop_low_priority" and self.frame_queue.overloaded:
+            # 积压时丢弃解码后才能识别的低优先级消息
+            kept = [message for message in messages if message.get("method") not in LOW_PRIORITY_METHODS]
+            self.dropped_messages += len(messages) - len(kept)
+            messages = kept
+        
+        await self._extract_messages(messages)
+    
+    async def _handle_binary_frame(self, frame: bytes) -> Optional[DecodedFrame]:
+        """在工作线程中解码二进制推送帧，再交给弹幕提取"""
+        try:
+            loop = asyncio.get_running_loop()
+            decoded, duration = await loop.run_in_executor(self._decode_executor, _timed_decode_push, frame)
+        except Exception as e:
+            self.logger.error(f"解码WebSocket二进制帧失败: {e}")
+            return None
+        
+        self.stage_timings["decode"].observe(duration)
+        await self._extract_messages(decoded.messages)
+        return decoded
+    
+    async def _extract_messages(self, messages: List[Dict]):
+        """逐条提取已解码的消息，并记录每条的提取耗时"""
+        extract_timings = self.stage_timings["extract"]
+        for message in messages:
+            started = time.perf_counter()
+            await self._extract_comments_from_websocket(message)
+            extract_timings.observe(time.perf_counter() - started)
+    
+    def _get_msg_id(self, message: Dict):
+        """获取抖音消息ID（protobuf 解码结果和 JSON 消息的位置不同）"""
+        return message.get("msg_id") or message.get("common", {}).get("msg_id")
+    
+    def _build_comment(self, message: Dict) -> Optional[CommentRecord]:
+        """将一条抖音消息转换为弹幕记录，不需要的消息类型返回 None"""
+        method = message.get("method")
+        if method == "WebcastChatMessage":
+            comment_type = COMMENT_TYPE_CHAT
+            content = message.get("content", "")
+        elif method == "WebcastGiftMessage":
+            comment_type = COMMENT_TYPE_GIFT
+            count = message.get("repeat_count") or message.get("combo_count") or 1
+            content = f"送出 {message.get('gift_name', '礼物')} x{count}"
+        elif method == "WebcastLikeMessage":
+            comment_type = COMMENT_TYPE_LIKE
+            content = f"点赞 x{message.get('count', 1)}"
+        elif method == "WebcastMemberMessage":
+            comment_type = COMMENT_TYPE_MEMBER
+            content = "进入直播间"
+        else:
+            return None
+        
+        return CommentRecord(
+            message.get("user", {}).get("nickname", "未知用户"),
+            content,
+            comment_type,
+            self.platform,
+            self.room_id
+        )
     
     async def _extract_comments_from_response(self, data: Dict):
         """从API响应中提取弹幕"""
         try:
             if "messages" in data:
                 for message in data["messages"]:
-                    if message.get("method") == "WebcastChatMessage":
-                        comment = {
-                            "timestamp": datetime.now().isoformat(),
-                            "user": message.get("user", {}).get("nickname", "未知用户"),
-                            "content": message.get("content", ""),
-                            "type": "chat"
-                        }
-                        self.comments.append(comment)
-                        logger.info(f"弹幕: {comment['user']}: {comment['content']}")
+                    comment = self._build_comment(message)
+                    if comment and self._store_comment(comment, "http", self._get_msg_id(message)):
+                        self._log_comment(self.logger, comment.user, comment.content)
                         
         except Exception as e:
-            logger.error(f"提取弹幕失败: {e}")
+            self.logger.error(f"提取弹幕失败: {e}")
     
     async def _extract_comments_from_websocket(self, data: Dict):
-        """从WebSocket消息中提取弹幕"""
+        """从WebSocket消息中提取弹幕（聊天、礼物、点赞、进场）"""
         try:
-            if "method" in data and data["method"] == "WebcastChatMessage":
-                comment = {
-                    "timestamp": datetime.now().isoformat(),
-                    "user": data.get("user", {}).get("nickname", "未知用户"),
-                    "content": data.get("content", ""),
-                    "type": "chat"
-                }
-                self.comments.append(comment)
-                logger.info(f"弹幕: {comment['user']}: {comment['content']}")
+            comment = self._build_comment(data)
+            if comment and self._store_comment(comment, "websocket", self._get_msg_id(data)):
+                self._log_comment(self.logger, comment.user, comment.content)
                 
         except Exception as e:
-            logger.error(f"从WebSocket提取弹幕失败: {e}")
-    
-    async def _save_comments(self):
-        """保存弹幕数据"""
-        try:
-            # 确保输出目录存在
-            output_path = Path(self.output_file)
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # 保存为JSON格式
-            with open(self.output_file, 'w', encoding='utf-8') as f:
-                json.dump(self.comments, f, ensure_ascii=False, indent=2)
-            
-            logger.info(f"已保存 {len(self.comments)} 条弹幕到 {self.output_file}")
-            
-        except Exception as e:
-            logger.error(f"保存弹幕失败: {e}")
+            self.logger.error(f"从WebSocket提取弹幕失败: {e}")
     
     async def _cleanup(self):
-        """清理资源"""
-        try:
-            if self.page:
-                await self.page.close()
-            if self.browser:
-                await self.browser.close()
-            
-            # 最终保存
-            await self._save_comments()
-            logger.info("清理完成")
-            
-        except Exception as e:
-            logger.error(f"清理失败: {e}")
+        """清理资源（额外关闭解码线程池）"""
+        await super()._cleanup()
+        self._decode_executor.shutdown(wait=False)
 
 
 async def main():
@@ -237,6 +325,8 @@ async def main():
     parser = argparse.ArgumentParser(description="抖音直播间弹幕抓取工具")
     parser.add_argument("--room_id", required=True, help="直播间ID")
     parser.add_argument("--output", help="输出文件路径")
+    parser.add_argument("--direct", action="store_true", help="免浏览器模式：只用浏览器获取连接参数，之后直接连接推送通道")
+    parser.add_argument("--ws_url", help="直接连接指定的推送通道地址（跳过浏览器，用于本地测试）")
     
     args = parser.parse_args()
     
@@ -245,7 +335,10 @@ async def main():
     
     # 创建抓取器并启动
     crawler = DouyinCrawler(args.room_id, args.output)
-    await crawler.start()
+    if args.direct or args.ws_url:
+        await crawler.start_direct(args.ws_url)
+    else:
+        await crawler.start()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""抖音 webcast 推送帧解码
+
+推送通道的二进制帧结构为 ``PushFrame`` -> (gzip) ``Response`` -> ``Message`` 列表，
+各层均为 protobuf 编码。这里只实现 protobuf 线格式的最小解析，并且只解码
+聊天、礼物、点赞、进场四类消息中抓取弹幕需要的字段，其余字段和消息直接跳过。
+
+解码结果与 JSON 消息结构一致（``method``、``user.nickname``、``content`` 等），
+可以直接交给 ``_extract_comments_from_websocket`` 处理。
+"""
+
+import gzip
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+
+# protobuf 线格式类型
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_BYTES = 2
+WIRE_FIXED32 = 5
+
+
+class PushFrame(NamedTuple):
+    """推送帧（只保留需要的字段）"""
+    seq_id: int
+    log_id: int
+    payload_encoding: str
+    payload_type: str
+    payload: bytes
+
+
+class PushResponse(NamedTuple):
+    """推送帧负载中的消息列表"""
+    messages: List[Tuple[str, bytes, int]]  # (method, payload, msg_id)
+    internal_ext: str
+    need_ack: bool
+
+
+class DecodedFrame(NamedTuple):
+    """推送帧的解码结果"""
+    frame: PushFrame
+    need_ack: bool
+    internal_ext: str
+    messages: List[Dict]
+
+
+def _encode_varint(value: int) -> bytes:
+    """编码一个非负 varint"""
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _encode_field(field_number: int, value) -> bytes:
+    """编码一个 varint 或长度分隔字段"""
+    if isinstance(value, int):
+        return _encode_varint(field_number << 3 | WIRE_VARINT) + _encode_varint(value)
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return _encode_varint(field_number << 3 | WIRE_BYTES) + _encode_varint(len(value)) + value
+
+
+def encode_push_frame(payload_type: str, payload: bytes = b"", log_id: int = 0,
+                      payload_encoding: str = "pb") -> bytes:
+    """编码客户端发送的推送帧（心跳、ACK）"""
+    data = b""
+    if log_id:
+        data += _encode_field(2, log_id)
+    data += _encode_field(6, payload_encoding)
+    data += _encode_field(7, payload_type)
+    if payload:
+        data += _encode_field(8, payload)
+    return data
+
+
+def build_heartbeat_frame() -> bytes:
+    """心跳帧"""
+    return encode_push_frame("hb")
+
+
+def build_ack_frame(log_id: int, internal_ext: str) -> bytes:
+    """ACK 帧（服务端要求确认时发送）"""
+    return encode_push_frame("ack", internal_ext.encode("utf-8"), log_id)
+
+
+def _encode_user(user: Dict) -> bytes:
+    return _encode_field(1, user.get("id", 0)) + _encode_field(3, user.get("nickname", ""))
+
+
+def encode_message(message: Dict) -> bytes:
+    """把与解码结果结构相同的消息编码为 Message（本地模拟推送服务器使用，与 decode_message 互逆）"""
+    method = message["method"]
+    user = _encode_user(message.get("user", {}))
+    if method == "WebcastChatMessage":
+        payload = _encode_field(2, user) + _encode_field(3, message.get("content", ""))
+    elif method == "WebcastGiftMessage":
+        payload = (_encode_field(2, message.get("gift_id", 0)) + _encode_field(5, message.get("repeat_count", 1))
+                   + _encode_field(7, user) + _encode_field(15, _encode_field(16, message.get("gift_name", ""))))
+    elif method == "WebcastLikeMessage":
+        payload = _encode_field(2, message.get("count", 1)) + _encode_field(3, message.get("total", 0)) + _encode_field(5, user)
+    elif method == "WebcastMemberMessage":
+        payload = _encode_field(2, user) + _encode_field(3, message.get("member_count", 0))
+    else:
+        payload = b""
+    return _encode_field(1, method) + _encode_field(2, payload) + _encode_field(3, message.get("msg_id", 0))
+
+
+def build_push_frame(messages: List[Dict], log_id: int = 0, need_ack: bool = False, internal_ext: str = "") -> bytes:
+    """编码服务端下发的消息推送帧（gzip 压缩的 Response），本地模拟推送服务器使用"""
+    response = b"".join(_encode_field(1, encode_message(message)) for message in messages)
+    if internal_ext:
+        response += _encode_field(5, internal_ext)
+    if need_ack:
+        response += _encode_field(9, 1)
+    return encode_push_frame("msg", gzip.compress(response, 1), log_id, payload_encoding="gzip")
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    """读取一个 varint，返回 (值, 新位置)"""
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 64:
+            raise ValueError("varint过长")
+
+
+def iter_fields(buf: bytes) -> Iterator[Tuple[int, int, object]]:
+    """逐个遍历 protobuf 字段，返回 (字段号, 线格式类型, 值)
+
+    varint 字段的值为 int，长度分隔字段的值为 bytes，定长字段的值为原始 bytes。
+    """
+    pos = 0
+    end = len(buf)
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        field_number = key >> 3
+        wire_type = key & 0x07
+
+        if wire_type == WIRE_VARINT:
+            value, pos = _read_varint(buf, pos)
+        elif wire_type == WIRE_BYTES:
+            length, pos = _read_varint(buf, pos)
+            value = buf[pos:pos + length]
+            if len(value) != length:
+                raise ValueError("字段长度超出数据范围")
+            pos += length
+        elif wire_type == WIRE_FIXED64:
+            value = buf[pos:pos + 8]
+            pos += 8
+        elif wire_type == WIRE_FIXED32:
+            value = buf[pos:pos + 4]
+            pos += 4
+        else:
+            raise ValueError(f"不支持的protobuf线格式类型: {wire_type}")
+
+        yield field_number, wire_type, value
+
+
+def parse_push_frame(data: bytes) -> PushFrame:
+    """解析推送帧"""
+    seq_id = log_id = 0
+    payload_encoding = payload_type = ""
+    payload = b""
+
+    for field_number, _, value in iter_fields(data):
+        if field_number == 1:
+            seq_id = value
+        elif field_number == 2:
+            log_id = value
+        elif field_number == 6:
+            payload_encoding = value.decode("utf-8", "replace")
+        elif field_number == 7:
+            payload_type = value.decode("utf-8", "replace")
+        elif field_number == 8:
+            payload = value
+
+    return PushFrame(seq_id, log_id, payload_encoding, payload_type, payload)
+
+
+def parse_response(payload: bytes) -> PushResponse:
+    """解析推送帧负载（已解压）中的消息列表"""
+    messages = []
+    internal_ext = ""
+    need_ack = False
+
+    for field_number, _, value in iter_fields(payload):
+        if field_number == 1:
+            method = ""
+            message_payload = b""
+            msg_id = 0
+            for sub_number, _, sub_value in iter_fields(value):
+                if sub_number == 1:
+                    method = sub_value.decode("utf-8", "replace")
+                elif sub_number == 2:
+                    message_payload = sub_value
+                elif sub_number == 3:
+                    msg_id = sub_value
+            messages.append((method, message_payload, msg_id))
+        elif field_number == 5:
+            internal_ext = value.decode("utf-8", "replace")
+        elif field_number == 9:
+            need_ack = bool(value)
+
+    return PushResponse(messages, internal_ext, need_ack)
+
+
+def _decode_user(buf: bytes) -> Dict:
+    """解码 User，只取 id 和昵称"""
+    user = {"id": 0, "nickname": "未知用户"}
+    for field_number, _, value in iter_fields(buf):
+        if field_number == 1:
+            user["id"] = value
+        elif field_number == 3:
+            user["nickname"] = value.decode("utf-8", "replace")
+    return user
+
+
+def _decode_chat(buf: bytes, message: Dict):
+    """ChatMessage: user=2, content=3"""
+    for field_number, _, value in iter_fields(buf):
+        if field_number == 2:
+            message["user"] = _decode_user(value)
+        elif field_number == 3:
+            message["content"] = value.decode("utf-8", "replace")
+
+
+def _decode_gift(buf: bytes, message: Dict):
+    """GiftMessage: giftId=2, repeatCount=5, comboCount=6, user=7, gift=15(name=16)"""
+    for field_number, _, value in iter_fields(buf):
+        if field_number == 2:
+            message["gift_id"] = value
+        elif field_number == 5:
+            message["repeat_count"] = value
+        elif field_number == 6:
+            message["combo_count"] = value
+        elif field_number == 7:
+            message["user"] = _decode_user(value)
+        elif field_number == 15:
+            for sub_number, _, sub_value in iter_fields(value):
+                if sub_number == 16:
+                    message["gift_name"] = sub_value.decode("utf-8", "replace")
+
+
+def _decode_like(buf: bytes, message: Dict):
+    """LikeMessage: count=2, total=3, user=5"""
+    for field_number, _, value in iter_fields(buf):
+        if field_number == 2:
+            message["count"] = value
+        elif field_number == 3:
+            message["total"] = value
+        elif field_number == 5:
+            message["user"] = _decode_user(value)
+
+
+def _decode_member(buf: bytes, message: Dict):
+    """MemberMessage: user=2, memberCount=3"""
+    for field_number, _, value in iter_fields(buf):
+        if field_number == 2:
+            message["user"] = _decode_user(value)
+        elif field_number == 3:
+            message["member_count"] = value
+
+
+# 需要解码的消息类型，其余类型不解析负载
+MESSAGE_DECODERS = {
+    "WebcastChatMessage": _decode_chat,
+    "WebcastGiftMessage": _decode_gift,
+    "WebcastLikeMessage": _decode_like,
+    "WebcastMemberMessage": _decode_member,
+}
+
+
+def decode_message(method: str, payload: bytes, msg_id: int = 0) -> Optional[Dict]:
+    """解码单条消息，不需要的消息类型返回 None"""
+    decoder = MESSAGE_DECODERS.get(method)
+    if decoder is None:
+        return None
+
+    message = {"method": method, "msg_id": msg_id}
+    decoder(payload, message)
+    return message
+
+
+def decode_push(data: bytes) -> DecodedFrame:
+    """解码一个推送帧（解压和解析均为 CPU 密集操作，应在工作线程中调用）"""
+    frame = parse_push_frame(data)
+    if frame.payload_type and frame.payload_type != "msg":
+        # 心跳等非消息帧
+        return DecodedFrame(frame, False, "", [])
+
+    payload = frame.payload
+    if frame.payload_encoding == "gzip":
+        payload = gzip.decompress(payload)
+
+    response = parse_response(payload)
+    messages = []
+    for method, message_payload, msg_id in response.messages:
+        message = decode_message(method, message_payload, msg_id)
+        if message is not None:
+            messages.append(message)
+    return DecodedFrame(frame, response.need_ack, response.internal_ext, messages)
+
+
+def decode_frame_messages(data: bytes) -> List[Dict]:
+    """解码一个推送帧中需要的全部消息"""
+    return decode_push(data).messages
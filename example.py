@@ -6,15 +6,19 @@ import argparse
 from pathlib import Path
 
 from douyin_crawler import DouyinCrawler
+from multi_room import run_rooms
 from taobao_crawler import TaobaoCrawler
 
 
-async def run_douyin_crawler(room_id: str, output_file: str = None):
+async def run_douyin_crawler(room_id: str, output_file: str = None, direct: bool = False):
     """运行抖音弹幕抓取器"""
     print(f"开始抓取抖音直播间 {room_id} 的弹幕...")
     
     crawler = DouyinCrawler(room_id, output_file)
-    await crawler.start()
+    if direct:
+        await crawler.start_direct()
+    else:
+        await crawler.start()
 
 
 async def run_taobao_crawler(room_id: str, output_file: str = None):
@@ -29,8 +33,9 @@ async def main():
     """主函数"""
     parser = argparse.ArgumentParser(description="直播间弹幕抓取示例")
     parser.add_argument("--platform", choices=["douyin", "taobao"], required=True, help="平台选择")
-    parser.add_argument("--room_id", required=True, help="直播间ID")
-    parser.add_argument("--output", help="输出文件路径")
+    parser.add_argument("--room_id", nargs="+", required=True, help="直播间ID，指定多个时共享一个浏览器同时抓取")
+    parser.add_argument("--output", help="输出文件路径（指定多个直播间时为输出目录）")
+    parser.add_argument("--direct", action="store_true", help="免浏览器模式（仅抖音）")
     
     args = parser.parse_args()
     
@@ -38,10 +43,13 @@ async def main():
     Path("logs").mkdir(exist_ok=True)
     
     try:
-        if args.platform == "douyin":
-            await run_douyin_crawler(args.room_id, args.output)
+        if len(args.room_id) > 1:
+            print(f"开始在同一个浏览器中抓取 {len(args.room_id)} 个直播间的弹幕...")
+            await run_rooms([(args.platform, room_id) for room_id in args.room_id], args.output)
+        elif args.platform == "douyin":
+            await run_douyin_crawler(args.room_id[0], args.output, args.direct)
         elif args.platform == "taobao":
-            await run_taobao_crawler(args.room_id, args.output)
+            await run_taobao_crawler(args.room_id[0], args.output)
     except KeyboardInterrupt:
         print("\n程序被用户中断")
     except Exception as e:
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+from collections import Counter, deque
+from typing import Awaitable, Callable, List, Optional
+
+from loguru import logger
+
+
+class FrameQueue:
+    """有界帧处理队列
+
+    WebSocket 帧先放入队列，再由固定数量的消费任务按批取出处理，
+    礼物刷屏时不会为每一帧创建一个任务，内存和延迟都有上限。
+
+    帧由 Playwright 的同步事件回调放入，生产者无法等待，因此队列满时只能丢弃：
+        - ``drop_oldest``: 丢弃队列中最早的帧
+        - ``drop_low_priority``: 优先丢弃最早的低优先级帧（如点赞、进场），没有时丢弃最早的帧
+
+    ``drop_low_priority`` 策略下低优先级帧单独排队，丢弃时不需要扫描整个队列；
+    两个队列按入队序号合并取出，处理顺序与到达顺序一致。
+    """
+
+    POLICIES = ("drop_oldest", "drop_low_priority")
+
+    def __init__(self, handler: Callable[[List], Awaitable], maxsize: int = 2000, workers: int = 2,
+                 batch_size: int = 50, policy: str = "drop_oldest",
+                 is_low_priority: Optional[Callable[[object], bool]] = None, log=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"不支持的队列溢出策略: {policy}")
+
+        self.handler = handler
+        self.maxsize = maxsize
+        self.workers = workers
+        self.batch_size = batch_size
+        self.policy = policy
+        self.is_low_priority = is_low_priority or (lambda item: False)
+        self.logger = log or logger
+
+        self.received = 0  # 收到的帧数（含被丢弃的帧）
+        self.processed = 0  # 已处理的帧数
+        self.dropped = Counter()  # 按原因统计丢弃的帧数：oldest、newest、low_priority
+
+        self._items = deque()  # (入队序号, 帧)
+        self._low = deque()  # 低优先级帧 (入队序号, 帧)，只在 drop_low_priority 策略下使用
+        self._seq = 0
+        self._not_empty: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    @property
+    def depth(self) -> int:
+        """当前队列深度"""
+        return len(self._items) + len(self._low)
+
+    @property
+    def overloaded(self) -> bool:
+        """队列深度超过八成，消费方可以据此丢弃低优先级消息"""
+        return self.depth >= self.maxsize * 0.8
+
+    def start(self):
+        """启动消费任务（需要在事件循环中调用）"""
+        if self._tasks:
+            return
+        self._stopping = False
+        self._not_empty = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def put_nowait(self, item) -> bool:
+        """放入一帧（不等待），队列满时按策略丢弃，返回该帧是否入队"""
+        self.received += 1
+        low = self.policy == "drop_low_priority" and self.is_low_priority(item)
+        if self.depth >= self.maxsize and not self._evict(low):
+            return False
+
+        self._seq += 1
+        (self._low if low else self._items).append((self._seq, item))
+        if self._not_empty is not None:
+            self._not_empty.set()
+        return True
+
+    def count_received(self, count: int = 1):
+        """计入不经过队列、由调用方直接处理的帧（如免浏览器模式），接收帧数指标保持完整"""
+        self.received += count
+
+    def _evict(self, incoming_low: bool) -> bool:
+        """按策略腾出一个位置，返回 False 表示应丢弃新到的帧"""
+        if self.policy == "drop_low_priority":
+            if self._low:
+                self._low.popleft()
+                self.dropped["low_priority"] += 1
+                return True
+            if incoming_low:
+                # 队列里都是高优先级的帧，丢弃新到的低优先级帧
+                self.dropped["low_priority"] += 1
+                return False
+
+        if self.depth:
+            self._popleft()
+            self.dropped["oldest"] += 1
+            return True
+        self.dropped["newest"] += 1
+        return False
+
+    def _popleft(self):
+        """取出最早入队的一帧"""
+        if not self._low or (self._items and self._items[0][0] < self._low[0][0]):
+            return self._items.popleft()[1]
+        return self._low.popleft()[1]
+
+    async def _worker(self):
+        """消费任务：按批取出帧交给处理函数"""
+        while True:
+            while not self.depth:
+                if self._stopping:
+                    return
+                self._not_empty.clear()
+                await self._not_empty.wait()
+
+            batch = []
+            while self.depth and len(batch) < self.batch_size:
+                batch.append(self._popleft())
+
+            try:
+                await self.handler(batch)
+            except Exception as e:
+                self.logger.error(f"处理WebSocket帧失败: {e}")
+            self.processed += len(batch)
+
+    async def stop(self, drain: bool = True):
+        """停止消费任务，``drain`` 为 True 时先处理完队列中剩余的帧"""
+        if not drain:
+            self._items.clear()
+            self._low.clear()
+        self._stopping = True
+        if self._not_empty is not None:
+            self._not_empty.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,664 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import websockets
+from loguru import logger
+from playwright.async_api import async_playwright
+
+from config import Config
+from douyin_proto import build_push_frame
+from models import CommentRecord
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource，只统计 CPU 时间
+    resource = None
+
+
+# 压测消息的用户昵称为 lt{序号}:{发送时间（毫秒）}，从输出文件中即可统计丢失和端到端延迟
+NICKNAME_PREFIX = "lt"
+
+# 抖音消息类型占比（四类都会生成弹幕）
+DOUYIN_METHODS = (
+    ("WebcastChatMessage", 0.6),
+    ("WebcastLikeMessage", 0.2),
+    ("WebcastMemberMessage", 0.15),
+    ("WebcastGiftMessage", 0.05),
+)
+
+# 各平台模拟页面的弹幕区域（与 _check_live_room_status 检查的选择器一致）和推送通道路径
+CHAT_CLASSES = {"douyin": "webcast-chatroom___list", "taobao": "chat-container"}
+PUSH_PATHS = {"douyin": "/webcast/im/push/", "taobao": "/taobao/push/"}
+
+# 抖音每个推送帧最多包含的消息数
+DOUYIN_FRAME_MESSAGES = 50
+
+_CHARS = "的一是了我不人在有这个上们来到时大为子中你说生年着就那和要出也得里后以会家可下而过天去能对小多然心学么都好看起发当没成只如事"
+
+# 模拟同意页/验证：没有该 Cookie 的首次访问先停留在验证页，之后写入 Cookie 和 localStorage 并刷新
+SESSION_COOKIE = "skycomment_session"
+
+_CHALLENGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>验证中</title></head>
+<body>
+<div>正在验证，请稍候...</div>
+<script>
+setTimeout(() => {{
+  document.cookie = "{cookie}=1; path=/; max-age=86400";
+  localStorage.setItem("{cookie}", String(Date.now()));
+  location.reload();
+}}, {challenge_ms});
+</script>
+</body>
+</html>
+"""
+
+_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{platform} {room_id}（本地压测）</title></head>
+<body>
+<div class="{chat_class}">已收到 <span id="received">0</span> 帧</div>
+<script>
+let received = 0;
+setTimeout(() => {{
+  const ws = new WebSocket("{ws_url}");
+  ws.binaryType = "arraybuffer";
+  ws.onmessage = () => {{ received++; }};
+}}, {connect_delay_ms});
+setInterval(() => {{ document.getElementById("received").textContent = received; }}, 200);
+</script>
+</body>
+</html>
+"""
+
+
+class StandInLiveServer:
+    """本地模拟直播间
+
+    HTTP 服务提供模拟直播间页面（``/douyin/{房间}`` 和 ``/taobao/live/{房间}``），页面打开后连接
+    本服务的 WebSocket 推送通道。所有直播间都连接后，按 ``rates`` 中的速率（每个直播间每秒消息数）
+    逐级推送，每级持续 ``step_seconds`` 秒：抖音为 gzip 压缩的 protobuf 推送帧，淘宝为 JSON 文本帧。
+    每个直播间的消息从 0 开始编号，各级的编号范围和实际发送数作为结果返回。
+    ``challenge_ms`` 大于 0 时，没有会话 Cookie 的访问先进入模拟的验证页，停留该时间后才进入直播间。
+    """
+
+    def __init__(self, host: str, http_port: int, ws_port: int, rates: List[int], step_seconds: float,
+                 rooms: int, connect_delay_ms: int, tick_ms: int = 20, seed: int = 0, challenge_ms: int = 0):
+        self.host = host
+        self.http_port = http_port
+        self.ws_port = ws_port
+        self.rates = rates
+        self.step_seconds = step_seconds
+        self.rooms = rooms
+        self.connect_delay_ms = connect_delay_ms
+        self.tick = tick_ms / 1000
+        self.seed = seed
+        self.challenge_ms = challenge_ms
+        self._connections: Dict[str, object] = {}
+        self._all_connected: Optional[asyncio.Event] = None
+
+    async def run(self, ready, started, start_time, results):
+        """启动服务，所有直播间连接后开始推送，结果放入 ``results`` 队列（在独立进程中运行）"""
+        self._all_connected = asyncio.Event()
+        http_server = await asyncio.start_server(self._handle_http, self.host, self.http_port)
+        ws_server = await websockets.serve(self._handle_ws, self.host, self.ws_port, max_size=None)
+        ready.set()
+
+        await self._all_connected.wait()
+        start = time.time()
+        start_time.value = start
+        started.set()
+
+        keys = list(self._connections)
+        steps = await asyncio.gather(*(self._push(key, self._connections[key], start) for key in keys))
+        results.put(dict(zip(keys, steps)))
+
+        # 保持连接，由压测进程在收尾后结束本进程
+        async with http_server, ws_server:
+            await asyncio.Future()
+
+    def _page(self, platform: str, room_id: str, cookie: str) -> str:
+        if self.challenge_ms > 0 and f"{SESSION_COOKIE}=" not in cookie:
+            return _CHALLENGE_TEMPLATE.format(cookie=SESSION_COOKIE, challenge_ms=self.challenge_ms)
+        ws_url = f"ws://{self.host}:{self.ws_port}{PUSH_PATHS[platform]}?platform={platform}&room_id={room_id}"
+        return _PAGE_TEMPLATE.format(platform=platform, room_id=room_id, chat_class=CHAT_CLASSES[platform],
+                                     ws_url=ws_url, connect_delay_ms=self.connect_delay_ms)
+
+    async def _handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            cookie = ""
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "cookie":
+                    cookie = value.strip()
+
+            parts = request_line.decode("latin-1").split()
+            path = urlsplit(parts[1]).path.strip("/").split("/") if len(parts) >= 2 else []
+            if len(path) == 2 and path[0] == "douyin":
+                body, status = self._page("douyin", path[1], cookie).encode("utf-8"), "200 OK"
+            elif len(path) == 3 and path[:2] == ["taobao", "live"]:
+                body, status = self._page("taobao", path[2], cookie).encode("utf-8"), "200 OK"
+            else:
+                body, status = b"not found\n", "404 Not Found"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/html; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"处理页面请求失败: {e}")
+        finally:
+            writer.close()
+
+    async def _handle_ws(self, websocket):
+        query = parse_qs(urlsplit(websocket.path).query)
+        key = f"{query['platform'][0]}/{query['room_id'][0]}"
+        if key in self._connections or self._all_connected.is_set():
+            # 页面重连或多余的连接不参与压测
+            await websocket.wait_closed()
+            return
+        self._connections[key] = websocket
+        logger.info(f"直播间已连接: {key}（{len(self._connections)}/{self.rooms}）")
+        if len(self._connections) >= self.rooms:
+            self._all_connected.set()
+        await websocket.wait_closed()
+
+    def _douyin_message(self, seq: int, rng: random.Random) -> Dict:
+        methods, weights = zip(*DOUYIN_METHODS)
+        method = rng.choices(methods, weights)[0]
+        return {
+            "method": method,
+            "msg_id": seq + 1,
+            "user": {"id": rng.randint(1, 10 ** 9), "nickname": f"{NICKNAME_PREFIX}{seq}:{time.time_ns() // 1_000_000}"},
+            "content": "".join(rng.choices(_CHARS, k=rng.randint(2, 30))),
+            "gift_name": "小心心",
+            "repeat_count": rng.randint(1, 10),
+            "count": rng.randint(1, 10),
+        }
+
+    def _taobao_frame(self, seq: int, rng: random.Random) -> str:
+        return json.dumps({
+            "type": "chat",
+            "id": str(seq + 1),
+            "user": {"nickname": f"{NICKNAME_PREFIX}{seq}:{time.time_ns() // 1_000_000}"},
+            "content": "".join(rng.choices(_CHARS, k=rng.randint(2, 30))),
+        }, ensure_ascii=False)
+
+    async def _push(self, key: str, websocket, start: float) -> List[Dict]:
+        """按速率阶梯向一个直播间推送消息，返回每级的发送统计"""
+        platform = key.split("/")[0]
+        rng = random.Random(f"{self.seed}/{key}")
+        seq = 0
+        steps = []
+        for index, rate in enumerate(self.rates):
+            step_start = start + index * self.step_seconds
+            step_end = step_start + self.step_seconds
+            first_seq = seq
+            sent = 0
+            try:
+                while time.time() < step_end:
+                    # 按已经过的时间计算应发送的条数，发送被阻塞后会补发积压的消息
+                    due = int(rate * (time.time() - step_start)) - sent
+                    if due > 0:
+                        if platform == "douyin":
+                            for offset in range(0, due, DOUYIN_FRAME_MESSAGES):
+                                count = min(DOUYIN_FRAME_MESSAGES, due - offset)
+                                messages = [self._douyin_message(seq + offset + i, rng) for i in range(count)]
+                                await websocket.send(build_push_frame(messages))
+                        else:
+                            for i in range(due):
+                                await websocket.send(self._taobao_frame(seq + i, rng))
+                        seq += due
+                        sent += due
+                    await asyncio.sleep(self.tick)
+            except websockets.ConnectionClosed:
+                logger.warning(f"直播间连接已断开: {key}")
+            steps.append({"rate": rate, "sent": sent, "first_seq": first_seq, "last_seq": seq - 1})
+        return steps
+
+
+def _serve(server: StandInLiveServer, ready, started, start_time, results):
+    """模拟直播间进程入口"""
+    asyncio.run(server.run(ready, started, start_time, results))
+
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _read_proc(pid: int) -> Optional[Tuple[int, float, int]]:
+    """读取进程的 (父进程ID, CPU 秒数, 常驻内存字节)，进程不存在时返回 None"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    # 进程名可能包含空格，从最后一个右括号之后解析：state ppid ... utime(第12项) stime(第13项)
+    fields = stat[stat.rindex(")") + 2:].split()
+    return int(fields[1]), (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS, rss_pages * _PAGE_SIZE
+
+
+def child_pids() -> Set[int]:
+    """本进程当前的直接子进程"""
+    if not os.path.exists("/proc/self/stat"):
+        return set()
+    pids = set()
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            info = _read_proc(int(entry))
+            if info and info[0] == os.getpid():
+                pids.add(int(entry))
+    return pids
+
+
+def sample_usage(exclude: Set[int]) -> Dict[str, float]:
+    """采样本进程（抓取器）和浏览器进程树（Playwright 驱动和 Chromium）的累计 CPU 秒数和常驻内存
+
+    ``exclude`` 中的子进程（模拟直播间服务等）及其子进程不计入。非 Linux 系统只能统计本进程，
+    常驻内存为峰值（没有 resource 模块时为 0）。
+    """
+    self_pid = os.getpid()
+    if not os.path.exists("/proc/self/stat"):
+        if resource is None:
+            return {"crawler_cpu": time.process_time(), "crawler_rss": 0, "browser_cpu": 0.0, "browser_rss": 0}
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # macOS 的 ru_maxrss 以字节为单位，其他系统以 KiB 为单位
+        peak_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+        return {"crawler_cpu": usage.ru_utime + usage.ru_stime, "crawler_rss": peak_rss,
+                "browser_cpu": 0.0, "browser_rss": 0}
+
+    processes = {}
+    children = defaultdict(list)
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            info = _read_proc(int(entry))
+            if info:
+                processes[int(entry)] = info
+                children[info[0]].append(int(entry))
+
+    browser_cpu = 0.0
+    browser_rss = 0
+    pending = [pid for pid in children[self_pid] if pid not in exclude]
+    while pending:
+        pid = pending.pop()
+        _, cpu, rss = processes[pid]
+        browser_cpu += cpu
+        browser_rss += rss
+        pending.extend(children[pid])
+
+    _, crawler_cpu, crawler_rss = processes[self_pid]
+    return {"crawler_cpu": crawler_cpu, "crawler_rss": crawler_rss, "browser_cpu": browser_cpu, "browser_rss": browser_rss}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def read_received(output_file: Path) -> Dict[int, int]:
+    """从输出文件中读取压测消息：{序号: 端到端延迟（毫秒，推送服务器发出到弹幕提取）}"""
+    received = {}
+    if not output_file.exists():
+        return received
+    with open(output_file, "r", encoding=Config.get_save_config()["encoding"]) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = CommentRecord.from_dict(json.loads(line))
+            if not record.user.startswith(NICKNAME_PREFIX):
+                continue
+            seq, sent_ms = record.user[len(NICKNAME_PREFIX):].split(":")
+            received.setdefault(int(seq), record.ts_ms - int(sent_ms))
+    return received
+
+
+def summarize(rates: List[int], sent: Dict[str, List[Dict]], received: Dict[str, Dict[int, int]],
+              samples: List[Tuple[float, Dict[str, float]]], start: float, step_seconds: float, rooms: int) -> List[Dict]:
+    """按速率级别汇总：发送、接收、丢失率、端到端延迟和每个直播间的 CPU/内存"""
+    rows = []
+    for index, rate in enumerate(rates):
+        total_sent = 0
+        total_received = 0
+        latencies = []
+        for key, steps in sent.items():
+            step = steps[index]
+            total_sent += step["sent"]
+            room_received = received.get(key, {})
+            for seq in range(step["first_seq"], step["last_seq"] + 1):
+                latency = room_received.get(seq)
+                if latency is not None:
+                    total_received += 1
+                    latencies.append(latency)
+
+        step_start = start + index * step_seconds
+        step_end = step_start + step_seconds
+        window = [(ts, usage) for ts, usage in samples if step_start <= ts <= step_end]
+        row = {
+            "rate": rate,
+            "sent_per_s": round(total_sent / rooms / step_seconds, 1),
+            "sent": total_sent,
+            "received": total_received,
+            "loss": round(1 - total_received / total_sent, 4) if total_sent else 0.0,
+            "latency_p50_ms": _percentile(latencies, 0.5),
+            "latency_p99_ms": _percentile(latencies, 0.99),
+            "latency_max_ms": max(latencies, default=0),
+        }
+        if len(window) >= 2:
+            (first_ts, first), (last_ts, last) = window[0], window[-1]
+            elapsed = last_ts - first_ts
+            row["crawler_cpu_pct"] = round((last["crawler_cpu"] - first["crawler_cpu"]) / elapsed / rooms * 100, 1)
+            row["browser_cpu_pct"] = round((last["browser_cpu"] - first["browser_cpu"]) / elapsed / rooms * 100, 1)
+            row["crawler_rss_mb"] = round(max(usage["crawler_rss"] for _, usage in window) / rooms / 1024 / 1024, 1)
+            row["browser_rss_mb"] = round(max(usage["browser_rss"] for _, usage in window) / rooms / 1024 / 1024, 1)
+        rows.append(row)
+    return rows
+
+
+def use_stand_in(platform: str, host: str, http_port: int, output_dir: str):
+    """让抓取器指向本地模拟直播间（必须在创建抓取器之前调用）"""
+    # 覆盖 base_url，推送通道的匹配规则加入本地路径
+    platform_config = Config.get_platform_config(platform)
+    platform_config["base_url"] = f"http://{host}:{http_port}/{platform}"
+    if PUSH_PATHS[platform] not in platform_config["websocket_patterns"]:
+        platform_config["websocket_patterns"] = platform_config["websocket_patterns"] + [PUSH_PATHS[platform]]
+    # 统计从输出文件读取，固定为 JSONL
+    Config.SAVE_CONFIG["file_format"] = "jsonl"
+    # 存储状态缓存放在压测目录，不覆盖真实直播间的缓存
+    Config.SESSION_CONFIG["cache_dir"] = str(Path(output_dir) / "storage_state")
+
+
+def start_server(server: StandInLiveServer):
+    """在独立进程中启动模拟直播间，返回 (进程, 就绪事件, 开始推送事件, 开始时间, 结果队列)"""
+    context = multiprocessing.get_context("spawn")
+    ready, started = context.Event(), context.Event()
+    start_time = context.Value("d", 0.0)
+    results = context.Queue()
+    process = context.Process(target=_serve, args=(server, ready, started, start_time, results), daemon=True)
+    process.start()
+    return process, ready, started, start_time, results
+
+
+async def run_load_test(platform: str, rooms: int, rates: List[int], step_seconds: float, drain_seconds: float,
+                        connect_delay_ms: int, host: str, http_port: int, ws_port: int, output_dir: str) -> Dict:
+    """启动模拟直播间和真实 Chromium 中的抓取器，逐级提高推送速率，返回每级的统计"""
+    # 延迟导入：子进程（模拟直播间）不需要加载抓取器
+    from multi_room import create_crawler
+
+    use_stand_in(platform, host, http_port, output_dir)
+    server = StandInLiveServer(host, http_port, ws_port, rates, step_seconds, rooms, connect_delay_ms)
+    server_process, ready, started, start_time, results = start_server(server)
+
+    loop = asyncio.get_running_loop()
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    crawlers = []
+    tasks = []
+    samples: List[Tuple[float, Dict[str, float]]] = []
+    try:
+        if not await loop.run_in_executor(None, ready.wait, 30):
+            raise RuntimeError("模拟直播间启动超时")
+
+        # 启动浏览器前已有的子进程（模拟直播间、multiprocessing 的资源跟踪进程）不计入浏览器
+        exclude = child_pids()
+        async with async_playwright() as p:
+            browser_config = Config.get_browser_config()
+            browser = await p.chromium.launch(headless=browser_config["headless"], args=browser_config["args"])
+            for index in range(rooms):
+                room_id = f"load{index}"
+                output_file = output / f"{platform}_{room_id}.jsonl"
+                if output_file.exists():
+                    output_file.unlink()
+                crawler = create_crawler(platform, room_id, str(output_file))
+                crawlers.append(crawler)
+                tasks.append(asyncio.create_task(crawler.run_in_browser(browser)))
+
+            startup_timeout = connect_delay_ms / 1000 + 60
+            if not await loop.run_in_executor(None, started.wait, startup_timeout):
+                raise RuntimeError("等待直播间连接推送通道超时")
+            start = start_time.value
+            logger.info(f"开始推送: {rooms} 个直播间，速率 {rates} 条/秒，每级 {step_seconds} 秒")
+
+            # 每秒采样一次 CPU 和内存，直到最后一级结束
+            end = start + len(rates) * step_seconds
+            while True:
+                samples.append((time.time(), sample_usage(exclude)))
+                if time.time() >= end:
+                    break
+                await asyncio.sleep(min(1.0, max(0.0, end - time.time())))
+
+            sent = await loop.run_in_executor(None, results.get, True, 30)
+            # 等待积压的帧处理完，再停止抓取器（停止时保存全部弹幕）
+            await asyncio.sleep(drain_seconds)
+            dropped = {f"{crawler.platform}/{crawler.room_id}": dict(crawler.frame_queue.dropped) for crawler in crawlers}
+            dropped_messages = {f"{crawler.platform}/{crawler.room_id}": crawler.dropped_messages for crawler in crawlers}
+            startup = {
+                f"{crawler.platform}/{crawler.room_id}": {
+                    "phases": {phase: round(seconds, 3) for phase, seconds in crawler.startup.phases.items()},
+                    "ready_reason": crawler.startup.ready_reason,
+                }
+                for crawler in crawlers
+            }
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await browser.close()
+    finally:
+        for task in tasks:
+            task.cancel()
+        server_process.terminate()
+
+    received = {
+        f"{crawler.platform}/{crawler.room_id}": read_received(Path(crawler.output_file))
+        for crawler in crawlers
+    }
+    return {
+        "platform": platform,
+        "rooms": rooms,
+        "step_seconds": step_seconds,
+        "steps": summarize(rates, sent, received, samples, start, step_seconds, rooms),
+        "dropped_frames": dropped,
+        "dropped_messages": dropped_messages,
+        "startup": startup,
+    }
+
+
+async def _wait_until(predicate, timeout: float, interval: float = 0.05) -> bool:
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() >= deadline:
+            return False
+        await asyncio.sleep(interval)
+    return True
+
+
+async def run_startup_comparison(platform: str, runs: int, challenge_ms: int, host: str, http_port: int,
+                                 ws_port: int, output_dir: str) -> Dict:
+    """冷启动与热启动对比
+
+    模拟直播间对没有会话 Cookie 的访问先返回验证页（停留 ``challenge_ms`` 毫秒）。冷启动每次先删除存储状态缓存，
+    热启动复用上一次保存的缓存，各依次启动 ``runs`` 个直播间，记录每个直播间从启动到就绪的各阶段耗时。
+    """
+    from multi_room import create_crawler
+    from session_cache import get_storage_state_cache
+
+    use_stand_in(platform, host, http_port, output_dir)
+    Config.SESSION_CONFIG["enabled"] = True
+    cache = get_storage_state_cache()
+    # 每次冷启动都要重新保存缓存
+    cache.refresh_interval = 0
+
+    # 只需要页面，不推送消息
+    server = StandInLiveServer(host, http_port, ws_port, [], 0, 1, 0, challenge_ms=challenge_ms)
+    # 不用的同步对象也要保持引用，否则信号量在子进程反序列化前就被释放
+    server_process, ready, started, start_time, results = start_server(server)
+    loop = asyncio.get_running_loop()
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    timeout = Config.get_network_config()["ready_timeout"] / 1000 + challenge_ms / 1000 + 30
+    runs_by_mode: Dict[str, List[Dict]] = {"cold": [], "warm": []}
+    try:
+        if not await loop.run_in_executor(None, ready.wait, 30):
+            raise RuntimeError("模拟直播间启动超时")
+
+        async with async_playwright() as p:
+            browser_config = Config.get_browser_config()
+            browser = await p.chromium.launch(headless=browser_config["headless"], args=browser_config["args"])
+            for mode in ("cold", "warm"):
+                for index in range(runs):
+                    if mode == "cold":
+                        cache.invalidate(platform)
+                    room_id = f"{mode}{index}"
+                    crawler = create_crawler(platform, room_id, str(output / f"{platform}_{room_id}.jsonl"))
+                    task = asyncio.create_task(crawler.run_in_browser(browser))
+                    # 冷启动还要等缓存保存完，下一次热启动才能使用
+                    entered = await _wait_until(
+                        lambda: "ready" in crawler.startup.phases and (mode == "warm" or cache.load(platform) is not None),
+                        timeout,
+                    )
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    runs_by_mode[mode].append({
+                        "room": room_id,
+                        "entered": entered,
+                        "warm": crawler.startup.warm,
+                        "ready_reason": crawler.startup.ready_reason,
+                        "phases": {phase: round(seconds, 3) for phase, seconds in crawler.startup.phases.items()},
+                    })
+            await browser.close()
+    finally:
+        server_process.terminate()
+
+    summary = {}
+    for mode, mode_runs in runs_by_mode.items():
+        summary[mode] = {
+            phase: _percentile([run["phases"][phase] for run in mode_runs if phase in run["phases"]], 0.5)
+            for phase in ("page", "handlers", "domcontentloaded", "ready")
+        }
+    return {"platform": platform, "runs": runs, "challenge_ms": challenge_ms, "median": summary, "details": runs_by_mode}
+
+
+def print_startup_report(report: Dict):
+    print(f"\n{report['platform']}：冷启动与热启动对比（各 {report['runs']} 次，模拟验证页 {report['challenge_ms']}ms，"
+          f"中位数，单位秒）")
+    print(f"{'阶段':>18} {'冷启动':>8} {'热启动':>8}")
+    cold, warm = report["median"]["cold"], report["median"]["warm"]
+    for phase in cold:
+        print(f"{phase:>18} {cold[phase]:>8.2f} {warm[phase]:>8.2f}")
+    for mode, mode_runs in report["details"].items():
+        failed = [run["room"] for run in mode_runs if not run["entered"]]
+        not_warm = [run["room"] for run in mode_runs if mode == "warm" and not run["warm"]]
+        if failed:
+            print(f"{mode} 超时未就绪: {failed}")
+        if not_warm:
+            print(f"未使用缓存的热启动: {not_warm}")
+
+
+def max_sustainable_rate(steps: List[Dict], max_loss: float, max_p99_ms: float) -> int:
+    """丢失率和 p99 延迟都在限制内的最高速率（从低到高，遇到第一个不满足的级别为止）"""
+    sustainable = 0
+    for step in steps:
+        if step["loss"] > max_loss or step["latency_p99_ms"] > max_p99_ms:
+            break
+        sustainable = step["rate"]
+    return sustainable
+
+
+def print_report(report: Dict, max_loss: float, max_p99_ms: float):
+    print(f"\n{report['platform']}：{report['rooms']} 个直播间，每级 {report['step_seconds']} 秒（CPU和内存为每个直播间的平均值）")
+    print(f"{'目标速率':>8} {'实际发送':>8} {'丢失率':>8} {'p50(ms)':>8} {'p99(ms)':>8} {'最大(ms)':>8} "
+          f"{'抓取CPU%':>9} {'浏览器CPU%':>10} {'抓取内存MB':>10} {'浏览器内存MB':>12}")
+    for step in report["steps"]:
+        print(f"{step['rate']:>8} {step['sent_per_s']:>8} {step['loss']:>8.2%} {step['latency_p50_ms']:>8} "
+              f"{step['latency_p99_ms']:>8} {step['latency_max_ms']:>8} {step.get('crawler_cpu_pct', '-'):>9} "
+              f"{step.get('browser_cpu_pct', '-'):>10} {step.get('crawler_rss_mb', '-'):>10} {step.get('browser_rss_mb', '-'):>12}")
+    for room, startup in report["startup"].items():
+        phases = "，".join(f"{phase} {seconds:.2f}s" for phase, seconds in startup["phases"].items())
+        print(f"启动耗时 {room}（{startup['ready_reason']}）: {phases}")
+    dropped = {room: counts for room, counts in report["dropped_frames"].items() if counts}
+    if dropped:
+        print(f"帧队列丢弃: {dropped}")
+    dropped_messages = {room: count for room, count in report["dropped_messages"].items() if count}
+    if dropped_messages:
+        print(f"积压时丢弃的低优先级消息: {dropped_messages}")
+    print(f"最大可持续速率（丢失率 ≤ {max_loss:.2%}，p99 ≤ {max_p99_ms}ms）: "
+          f"{max_sustainable_rate(report['steps'], max_loss, max_p99_ms)} 条/秒/直播间")
+
+
+def parse_rates(value: str) -> List[int]:
+    """速率阶梯，如 100,200,500,1000"""
+    rates = [int(rate) for rate in value.split(",") if rate.strip()]
+    if not rates or any(rate <= 0 for rate in rates):
+        raise argparse.ArgumentTypeError("速率必须是逗号分隔的正整数")
+    return rates
+
+
+async def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="端到端压测：本地模拟直播间 + 真实 Chromium 中的抓取器，逐级提高推送速率")
+    parser.add_argument("--platform", nargs="+", choices=["douyin", "taobao"], default=["douyin", "taobao"], help="压测的平台")
+    parser.add_argument("--rooms", type=int, default=1, help="每个平台同时压测的直播间数（共享一个浏览器）")
+    parser.add_argument("--rates", type=parse_rates, default=[50, 100, 200, 500, 1000, 2000],
+                        help="每个直播间每秒推送的消息数，逗号分隔，逐级提高")
+    parser.add_argument("--step_seconds", type=float, default=15, help="每级速率持续的秒数")
+    parser.add_argument("--drain_seconds", type=float, default=5, help="推送结束后等待抓取器处理积压的秒数")
+    parser.add_argument("--connect_delay_ms", type=int, default=0,
+                        help="模拟页面打开后延迟连接推送通道的毫秒数，用于模拟推送通道建立较慢的直播间")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--http_port", type=int, default=8766, help="模拟直播间页面端口")
+    parser.add_argument("--ws_port", type=int, default=8765, help="模拟推送通道端口")
+    parser.add_argument("--output_dir", default="output/loadtest", help="压测期间抓取的弹幕输出目录")
+    parser.add_argument("--max_loss", type=float, default=0.001, help="可持续速率允许的最大丢失率")
+    parser.add_argument("--max_p99_ms", type=float, default=1000, help="可持续速率允许的最大 p99 端到端延迟（毫秒）")
+    parser.add_argument("--startup_runs", type=int, default=0,
+                        help="大于0时不做压测，改为对比冷启动和热启动（使用存储状态缓存），各启动该数量的直播间")
+    parser.add_argument("--challenge_ms", type=int, default=3000, help="冷启动对比时模拟验证页的停留毫秒数")
+    parser.add_argument("--json", help="把结果另存为 JSON 文件")
+
+    args = parser.parse_args()
+    Path("logs").mkdir(exist_ok=True)
+
+    reports = []
+    for platform in args.platform:
+        if args.startup_runs > 0:
+            report = await run_startup_comparison(platform, args.startup_runs, args.challenge_ms, args.host,
+                                                  args.http_port, args.ws_port, args.output_dir)
+            print_startup_report(report)
+        else:
+            report = await run_load_test(platform, args.rooms, args.rates, args.step_seconds, args.drain_seconds,
+                                         args.connect_delay_ms, args.host, args.http_port, args.ws_port, args.output_dir)
+            print_report(report, args.max_loss, args.max_p99_ms)
+        reports.append(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.json}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
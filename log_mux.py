@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Tuple
+
+from loguru import logger
+
+from config import Config
+
+
+class RoomLogSink:
+    """按直播间分发日志的 loguru sink
+
+    整个进程只注册一个 sink（``enqueue=True``，由 loguru 的后台线程写文件，不阻塞事件循环），
+    根据日志记录上绑定的 ``room`` 写入 ``logs/{platform}_{room_id}.log``。
+    文件在第一次写入时打开，按天轮转，收到关闭标记后关闭。所有文件操作都在 sink 线程中完成。
+    """
+
+    def __init__(self, log_dir: Path, retention_days: int = 7):
+        self.log_dir = Path(log_dir)
+        self.retention_days = retention_days
+        self._files: Dict[str, Tuple[object, date]] = {}
+
+    def __call__(self, message):
+        record = message.record
+        room = record["extra"]["room"]
+
+        if record["extra"].get("close_room_log"):
+            self._close(room)
+            return
+
+        day = record["time"].date()
+        entry = self._files.get(room)
+        if entry is None or entry[1] != day:
+            entry = self._open(room, day)
+        entry[0].write(message)
+
+    def _open(self, room: str, day: date):
+        """打开（必要时先轮转）直播间日志文件"""
+        self._close(room)
+        path = self.log_dir / f"{room}.log"
+        if path.exists():
+            last_day = datetime.fromtimestamp(path.stat().st_mtime).date()
+            if last_day < day:
+                path.rename(self.log_dir / f"{room}.{last_day.isoformat()}.log")
+                self._purge(room, day)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = (open(path, "a", encoding="utf-8", buffering=1), day)
+        self._files[room] = entry
+        return entry
+
+    def _purge(self, room: str, day: date):
+        """删除超过保留天数的轮转文件"""
+        oldest = day - timedelta(days=self.retention_days)
+        for path in self.log_dir.glob(f"{room}.*.log"):
+            try:
+                if date.fromisoformat(path.suffixes[-2].lstrip(".")) < oldest:
+                    path.unlink()
+            except (ValueError, IndexError, OSError):
+                continue
+
+    def _close(self, room: str):
+        entry = self._files.pop(room, None)
+        if entry is not None:
+            entry[0].close()
+
+
+class CommentLogLimiter:
+    """逐条弹幕日志限流
+
+    每秒最多输出 ``rate`` 条弹幕日志，超出部分只计数，下一秒输出一条汇总，
+    高峰期日志量不再随弹幕量线性增长。
+    """
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self.suppressed_total = 0
+        self._window_start = time.monotonic()
+        self._count = 0
+        self._suppressed = 0
+
+    def __call__(self, room_logger, user: str, content: str):
+        now = time.monotonic()
+        if now - self._window_start >= 1:
+            if self._suppressed:
+                room_logger.info(f"弹幕过多，上一秒省略了 {self._suppressed} 条弹幕日志")
+            self._window_start = now
+            self._count = 0
+            self._suppressed = 0
+
+        if self._count < self.rate:
+            self._count += 1
+            room_logger.info(f"弹幕: {user}: {content}")
+        else:
+            self._suppressed += 1
+            self.suppressed_total += 1
+
+
+_sink_lock = threading.Lock()
+_sink_id = None
+
+
+def _parse_days(value: str) -> int:
+    """解析 "7 days" 形式的保留时间"""
+    try:
+        return int(str(value).split()[0])
+    except (ValueError, IndexError):
+        return 7
+
+
+def _ensure_sink():
+    """注册进程内唯一的直播间日志 sink，并把默认的控制台输出也改为队列异步写入"""
+    global _sink_id
+    with _sink_lock:
+        if _sink_id is not None:
+            return
+
+        log_config = Config.get_log_config()
+        try:
+            logger.remove(0)
+            logger.add(
+                sys.stderr,
+                level=log_config["level"],
+                filter=lambda record: not record["extra"].get("close_room_log"),
+                enqueue=True
+            )
+        except ValueError:
+            # 默认输出已被调用方替换，保持不变
+            pass
+
+        sink = RoomLogSink(Path("logs"), _parse_days(log_config["retention"]))
+        _sink_id = logger.add(
+            sink,
+            level=log_config["level"],
+            format=log_config["format"],
+            filter=lambda record: "room" in record["extra"],
+            enqueue=True
+        )
+
+
+def get_room_logger(platform: str, room_id: str):
+    """获取绑定了直播间的 logger，其日志会写入该直播间的日志文件"""
+    _ensure_sink()
+    return logger.bind(room=f"{platform}_{room_id}")
+
+
+def close_room_log(platform: str, room_id: str):
+    """关闭直播间日志文件（关闭标记经同一队列传递，之前的日志会先写完）"""
+    logger.bind(room=f"{platform}_{room_id}", close_room_log=True).log(Config.get_log_config()["level"], "")
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from config import Config
+from room_metrics import Histogram
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource，不导出峰值常驻内存
+    resource = None
+
+try:
+    import psutil
+except ImportError:  # 可选依赖，只在没有 /proc 时用于读取当前常驻内存
+    psutil = None
+
+
+class MetricsServer:
+    """本机 Prometheus 指标端点
+
+    在抓取进程的事件循环中运行一个只监听本机地址的 HTTP 服务，``GET /metrics`` 返回 Prometheus 文本格式。
+    热路径上只有整数加法和直方图记录，指标在抓取（scrape）时才从各直播间的计数器汇总，
+    页面内存也只在抓取时查询。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9464, lag_interval: float = 0.5):
+        self.host = host
+        self.port = port
+        self.lag_interval = lag_interval
+        self.crawlers: Dict[str, object] = {}  # 直播间 -> 抓取器
+        self.loop_lag = Histogram()  # 事件循环延迟（秒）
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._lag_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """启动 HTTP 服务和事件循环延迟监测"""
+        if self._server is not None:
+            return
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self._lag_task = asyncio.create_task(self._monitor_loop_lag())
+        logger.info(f"指标端点已启动: http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._lag_task:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def register(self, crawler):
+        self.crawlers[f"{crawler.platform}/{crawler.room_id}"] = crawler
+
+    def unregister(self, crawler):
+        key = f"{crawler.platform}/{crawler.room_id}"
+        if self.crawlers.get(key) is crawler:
+            del self.crawlers[key]
+
+    async def _monitor_loop_lag(self):
+        """定时休眠，实际唤醒时间与预期之差即事件循环被阻塞的时间"""
+        while True:
+            expected = time.perf_counter() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag.observe(max(0.0, time.perf_counter() - expected))
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # 读完请求头
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                body = (await self.render()).encode("utf-8")
+                status = "200 OK"
+            else:
+                body = b"not found\n"
+                status = "404 Not Found"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"处理指标请求失败: {e}")
+        finally:
+            writer.close()
+
+    async def render(self) -> str:
+        """生成 Prometheus 文本格式的指标"""
+        lines: List[str] = []
+
+        def family(name: str, metric_type: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        def sample(name: str, value, **labels):
+            label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        def histogram(name: str, hist: Histogram, **labels):
+            cumulative = 0
+            for bound, count in zip(hist.bounds, hist.counts):
+                cumulative += count
+                sample(f"{name}_bucket", cumulative, **labels, le=repr(bound))
+            sample(f"{name}_bucket", hist.count, **labels, le="+Inf")
+            sample(f"{name}_sum", hist.sum, **labels)
+            sample(f"{name}_count", hist.count, **labels)
+
+        crawlers = list(self.crawlers.items())
+
+        family("skycomment_frames_received_total", "counter", "WebSocket frames received")
+        for room, crawler in crawlers:
+            sample("skycomment_frames_received_total", crawler.frame_queue.received, room=room)
+
+        family("skycomment_frames_dropped_total", "counter", "WebSocket frames dropped by the ingest queue")
+        for room, crawler in crawlers:
+            for reason, count in crawler.frame_queue.dropped.items():
+                sample("skycomment_frames_dropped_total", count, room=room, reason=reason)
+
+        family("skycomment_messages_dropped_total", "counter",
+               "Decoded low-priority messages dropped while the ingest queue was overloaded")
+        for room, crawler in crawlers:
+            sample("skycomment_messages_dropped_total", crawler.dropped_messages, room=room)
+
+        family("skycomment_frame_queue_depth", "gauge", "Frames waiting in the ingest queue")
+        for room, crawler in crawlers:
+            sample("skycomment_frame_queue_depth", crawler.frame_queue.depth, room=room)
+
+        family("skycomment_comments_total", "counter", "Comments extracted after deduplication")
+        for room, crawler in crawlers:
+            for comment_type, count in crawler.metrics.types.items():
+                sample("skycomment_comments_total", count, room=room, type=comment_type)
+
+        family("skycomment_duplicates_total", "counter", "Duplicate messages dropped")
+        for room, crawler in crawlers:
+            for source, count in crawler.dedup.duplicates.items():
+                sample("skycomment_duplicates_total", count, room=room, source=source)
+
+        family("skycomment_dedup_early_rotations_total", "counter",
+               "Dedup generations rotated before the time window because max_keys was reached")
+        for room, crawler in crawlers:
+            sample("skycomment_dedup_early_rotations_total", crawler.dedup.early_rotations, room=room)
+
+        family("skycomment_pending_comments", "gauge", "Comments buffered but not yet persisted")
+        for room, crawler in crawlers:
+            sample("skycomment_pending_comments", crawler.persister.pending_count, room=room)
+
+        family("skycomment_comments_spilled_total", "counter", "Comments moved to the persister overflow list because the buffer was full")
+        for room, crawler in crawlers:
+            sample("skycomment_comments_spilled_total", crawler.persister.spilled_count, room=room)
+
+        family("skycomment_comments_dropped_total", "counter", "Comments dropped because the persister buffer was full (drop policy only)")
+        for room, crawler in crawlers:
+            sample("skycomment_comments_dropped_total", crawler.persister.dropped_count, room=room)
+
+        family("skycomment_flush_duration_seconds", "histogram", "Duration of persister batch commits")
+        for room, crawler in crawlers:
+            histogram("skycomment_flush_duration_seconds", crawler.persister.flush_durations, room=room)
+
+        family("skycomment_stage_duration_seconds", "histogram",
+               "Time spent in each hot-path stage (intercept, decode, extract, append)")
+        for room, crawler in crawlers:
+            for stage, hist in crawler.stage_timings.items():
+                histogram("skycomment_stage_duration_seconds", hist, room=room, stage=stage)
+
+        family("skycomment_startup_seconds", "gauge",
+               "Seconds from room start to each startup phase (page, handlers, domcontentloaded, first_frame, "
+               "ready, first_comment); start is warm when the storage-state cache was used")
+        for room, crawler in crawlers:
+            start = "warm" if crawler.startup.warm else "cold"
+            for phase, seconds in crawler.startup.phases.items():
+                sample("skycomment_startup_seconds", round(seconds, 6), room=room, phase=phase, start=start)
+
+        family("skycomment_startup_ready", "gauge", "What made the room ready: selector, frame or timeout")
+        for room, crawler in crawlers:
+            if crawler.startup.ready_reason:
+                sample("skycomment_startup_ready", 1, room=room, reason=crawler.startup.ready_reason)
+
+        family("skycomment_page_js_heap_bytes", "gauge",
+               "JS heap of the room page (performance.memory); stands in for per-page renderer RSS, "
+               "which CDP does not report per target")
+        for room, crawler in crawlers:
+            heap = await _page_heap(crawler)
+            if heap:
+                sample("skycomment_page_js_heap_bytes", heap["used"], room=room, kind="used")
+                sample("skycomment_page_js_heap_bytes", heap["total"], room=room, kind="total")
+
+        family("skycomment_event_loop_lag_seconds", "histogram", "Event loop scheduling delay")
+        histogram("skycomment_event_loop_lag_seconds", self.loop_lag)
+
+        family("process_resident_memory_bytes", "gauge", "Current resident memory of the crawler process (0 if unavailable)")
+        sample("process_resident_memory_bytes", _process_rss())
+
+        peak_rss = _process_peak_rss()
+        if peak_rss is not None:
+            family("process_max_resident_memory_bytes", "gauge", "Peak resident memory of the crawler process")
+            sample("process_max_resident_memory_bytes", peak_rss)
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+async def _page_heap(crawler) -> Optional[Dict[str, int]]:
+    """查询页面 JS 堆大小（Chromium 的 performance.memory），页面不可用时返回 None
+
+    CDP 的 ``SystemInfo.getProcessInfo`` 只列出进程 ID 和 CPU 时间，无法对应到具体页面，
+    因此以页面 JS 堆代替每个直播间的渲染进程常驻内存；DOM 和图片等 JS 堆以外的内存不在其中。
+    """
+    page = getattr(crawler, "page", None)
+    if page is None or crawler.page_crashed or page.is_closed():
+        return None
+    try:
+        return await asyncio.wait_for(
+            page.evaluate("({used: performance.memory.usedJSHeapSize, total: performance.memory.totalJSHeapSize})"),
+            timeout=1
+        )
+    except Exception:
+        return None
+
+
+def _process_rss() -> int:
+    """当前进程的常驻内存（字节），无法读取时返回 0"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    # 非 Linux：安装了 psutil 时用它读取当前值
+    if psutil is not None:
+        try:
+            return psutil.Process().memory_info().rss
+        except Exception:
+            pass
+    return 0
+
+
+def _process_peak_rss() -> Optional[int]:
+    """当前进程的峰值常驻内存（字节），没有 resource 模块时返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 的 ru_maxrss 以字节为单位，Linux 等以 KiB 为单位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+_server: Optional[MetricsServer] = None
+
+
+async def register_crawler(crawler):
+    """登记直播间；配置开启时在当前事件循环中启动进程内唯一的指标端点"""
+    global _server
+    server_config = Config.get_metrics_server_config()
+    if not server_config["enabled"]:
+        return
+    if _server is None:
+        _server = MetricsServer(server_config["host"], server_config["port"])
+        try:
+            await _server.start()
+        except OSError as e:
+            logger.error(f"启动指标端点失败: {e}")
+    _server.register(crawler)
+
+
+def unregister_crawler(crawler):
+    """移除直播间的指标"""
+    if _server is not None:
+        _server.unregister(crawler)
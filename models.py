@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Optional
+
+
+# 弹幕类型
+COMMENT_TYPE_CHAT = sys.intern("chat")
+COMMENT_TYPE_GIFT = sys.intern("gift")
+COMMENT_TYPE_LIKE = sys.intern("like")
+COMMENT_TYPE_MEMBER = sys.intern("member")
+
+
+# 回放抓包时固定的当前时间（毫秒），为 None 时使用系统时间
+_replay_now_ms: ContextVar[Optional[int]] = ContextVar("replay_now_ms", default=None)
+
+
+def now_ms() -> int:
+    """当前时间（毫秒级 Unix 时间戳），回放抓包时为该帧的接收时间"""
+    replayed = _replay_now_ms.get()
+    if replayed is not None:
+        return replayed
+    return time.time_ns() // 1_000_000
+
+
+@contextmanager
+def replay_clock(ts_ms: int):
+    """在当前任务中把 now_ms() 固定为给定时间，回放时生成的弹幕和去重使用帧的原始接收时间"""
+    token = _replay_now_ms.set(ts_ms)
+    try:
+        yield
+    finally:
+        _replay_now_ms.reset(token)
+
+
+class CommentRecord:
+    """弹幕记录
+
+    使用 ``__slots__`` 存储，时间戳为整数毫秒，类型、平台和直播间ID使用驻留字符串，
+    所有记录共享同一份对象。只在写出时通过 ``to_dict()`` 转换为原有的 JSON 结构。
+    """
+
+    __slots__ = ("ts_ms", "user", "content", "type", "platform", "room_id")
+
+    def __init__(self, user: str, content: str, comment_type: str = COMMENT_TYPE_CHAT,
+                 platform: str = "", room_id: str = "", ts_ms: int = None):
+        self.ts_ms = now_ms() if ts_ms is None else ts_ms
+        self.user = user
+        self.content = content
+        self.type = sys.intern(comment_type)
+        self.platform = sys.intern(platform)
+        self.room_id = sys.intern(room_id)
+
+    def __repr__(self) -> str:
+        return f"CommentRecord({self.platform}/{self.room_id} {self.user}: {self.content})"
+
+    @property
+    def timestamp(self) -> str:
+        """ISO 格式时间戳（与旧版 ``datetime.now().isoformat()`` 一致）"""
+        return datetime.fromtimestamp(self.ts_ms / 1000).isoformat()
+
+    def to_dict(self) -> Dict:
+        """转换为输出文件中的 JSON 结构"""
+        return {
+            "timestamp": self.timestamp,
+            "user": self.user,
+            "content": self.content,
+            "type": self.type,
+            "platform": self.platform,
+            "room_id": self.room_id
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CommentRecord":
+        """从 JSON 结构还原弹幕记录"""
+        timestamp = data.get("timestamp")
+        ts_ms = round(datetime.fromisoformat(timestamp).timestamp() * 1000) if timestamp else None
+        return cls(
+            data.get("user", ""),
+            data.get("content", ""),
+            data.get("type", COMMENT_TYPE_CHAT),
+            data.get("platform", ""),
+            str(data.get("room_id", "")),
+            ts_ms
+        )
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from playwright.async_api import async_playwright, Browser, Playwright
+from loguru import logger
+
+from config import Config
+from douyin_crawler import DouyinCrawler
+from taobao_crawler import TaobaoCrawler
+
+
+# 平台 -> 抓取器类
+CRAWLER_CLASSES = {
+    "douyin": DouyinCrawler,
+    "taobao": TaobaoCrawler,
+}
+
+
+def create_crawler(platform: str, room_id: str, output_file: str = None):
+    """创建指定平台的抓取器"""
+    if platform not in CRAWLER_CLASSES:
+        raise ValueError(f"不支持的平台: {platform}")
+    return CRAWLER_CLASSES[platform](room_id, output_file)
+
+
+class MultiRoomRunner:
+    """多直播间运行器
+
+    每个进程只启动一个 Chromium，每个直播间使用独立的浏览器上下文和页面，
+    所有直播间的处理函数都运行在同一个事件循环中。单个直播间出错或页面崩溃
+    只影响该直播间，不会影响其他直播间。
+    """
+
+    def __init__(self, max_rooms: int = None, max_restarts: int = None):
+        multi_room_config = Config.get_multi_room_config()
+        self.max_rooms = max_rooms or multi_room_config["max_rooms"]
+        self.max_restarts = multi_room_config["max_restarts"] if max_restarts is None else max_restarts
+
+        self.browser: Optional[Browser] = None
+        self.crawlers: Dict[Tuple[str, str], object] = {}
+        self._tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._playwright: Optional[Playwright] = None
+
+    async def start(self):
+        """启动共享的浏览器"""
+        browser_config = Config.get_browser_config()
+        self._playwright = await async_playwright().start()
+        self.browser = await self._playwright.chromium.launch(
+            headless=browser_config["headless"],
+            args=browser_config["args"]
+        )
+        logger.info("共享浏览器已启动")
+
+    async def add_room(self, platform: str, room_id: str, output_file: str = None):
+        """运行时添加直播间"""
+        key = (platform, room_id)
+        if key in self._tasks:
+            logger.warning(f"直播间已在运行: {platform}/{room_id}")
+            return self.crawlers[key]
+        if len(self._tasks) >= self.max_rooms:
+            raise RuntimeError(f"已达到单进程直播间上限: {self.max_rooms}")
+        if self.browser is None:
+            await self.start()
+
+        crawler = create_crawler(platform, room_id, output_file)
+        self.crawlers[key] = crawler
+        self._tasks[key] = asyncio.create_task(self._run_room(key, crawler), name=f"room-{platform}-{room_id}")
+        logger.info(f"已添加直播间: {platform}/{room_id}（当前 {len(self._tasks)} 个）")
+        return crawler
+
+    async def remove_room(self, platform: str, room_id: str):
+        """运行时移除直播间，等待其保存数据并释放页面"""
+        key = (platform, room_id)
+        task = self._tasks.get(key)
+        if task is None:
+            logger.warning(f"直播间未在运行: {platform}/{room_id}")
+            return
+
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        logger.info(f"已移除直播间: {platform}/{room_id}")
+
+    async def _run_room(self, key: Tuple[str, str], crawler):
+        """运行单个直播间，异常和页面崩溃都在这里隔离"""
+        platform, room_id = key
+        restarts = 0
+        try:
+            while True:
+                try:
+                    await crawler.run_in_browser(self.browser)
+                except Exception as e:
+                    logger.error(f"直播间 {platform}/{room_id} 运行失败: {e}")
+                    return
+
+                if not crawler.page_crashed or restarts >= self.max_restarts:
+                    return
+
+                # 页面崩溃后在新的上下文中重启，继续写入同一个输出文件（各格式的写入器都在原文件末尾追加）
+                restarts += 1
+                logger.warning(f"直播间 {platform}/{room_id} 页面崩溃，第 {restarts} 次重启")
+                crawler = create_crawler(platform, room_id, crawler.output_file)
+                self.crawlers[key] = crawler
+        finally:
+            self._tasks.pop(key, None)
+            self.crawlers.pop(key, None)
+
+    def metrics(self) -> Dict[str, Dict]:
+        """各直播间的实时指标快照"""
+        return {f"{platform}/{room_id}": crawler.metrics.snapshot() for (platform, room_id), crawler in self.crawlers.items()}
+
+    async def wait(self):
+        """等待所有直播间结束"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+    async def stop(self):
+        """停止所有直播间并关闭浏览器"""
+        for platform, room_id in list(self._tasks):
+            await self.remove_room(platform, room_id)
+
+        if self.browser:
+            await self.browser.close()
+            self.browser = None
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+        logger.info("共享浏览器已关闭")
+
+
+def parse_room(value: str) -> Tuple[str, str]:
+    """解析 ``平台:直播间ID`` 格式的参数"""
+    platform, sep, room_id = value.partition(":")
+    if not sep or not room_id:
+        raise argparse.ArgumentTypeError(f"直播间格式应为 平台:直播间ID，实际为: {value}")
+    return platform, room_id
+
+
+async def run_rooms(rooms: List[Tuple[str, str]], output_dir: str = None):
+    """在同一个浏览器中抓取多个直播间"""
+    runner = MultiRoomRunner()
+    try:
+        await runner.start()
+        for platform, room_id in rooms:
+            output_file = None
+            if output_dir:
+                output_file = str(Path(output_dir) / f"{platform}_{room_id}.{Config.get_save_config()['file_format']}")
+            await runner.add_room(platform, room_id, output_file)
+        await runner.wait()
+    finally:
+        await runner.stop()
+
+
+async def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="多直播间弹幕抓取工具（共享一个浏览器）")
+    parser.add_argument("--room", type=parse_room, action="append", required=True,
+                        help="直播间，格式为 平台:直播间ID，可重复指定，例如 --room douyin:123 --room taobao:456")
+    parser.add_argument("--output_dir", help="输出目录")
+
+    args = parser.parse_args()
+
+    # 创建日志目录
+    Path("logs").mkdir(exist_ok=True)
+
+    await run_rooms(args.room, args.output_dir)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
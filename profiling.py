@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import signal
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Optional
+
+from loguru import logger
+
+from config import Config
+from room_metrics import Histogram
+
+
+# 热路径各阶段：
+#   intercept - 拦截弹幕API请求到交还页面
+#   decode    - WebSocket帧和API响应的解码（JSON/protobuf）
+#   extract   - _extract_comments_* 一次调用（包含其中的 append）
+#   append    - 单条弹幕的去重、写入内存缓冲区、提交写入线程和实时指标
+# 持久化阶段的耗时由写入线程记录在 CommentPersister.flush_durations 中
+STAGES = ("intercept", "decode", "extract", "append")
+
+
+def new_stage_timings() -> Dict[str, Histogram]:
+    """为一个直播间创建各阶段的耗时直方图（秒）"""
+    return {stage: Histogram() for stage in STAGES}
+
+
+class SignalProfiler:
+    """信号触发的在线性能分析
+
+    向进程发送 SIGUSR1 时采集 ``duration`` 秒的 cProfile，发送 SIGUSR2 时采集同样时长的
+    tracemalloc 内存分配，结束后把结果写入 ``output_dir``，抓取不中断::
+
+        kill -USR1 <pid>   # logs/cprofile_<pid>_<时间>.prof 和 .txt
+        kill -USR2 <pid>   # logs/tracemalloc_<pid>_<时间>.txt
+
+    cProfile 只记录事件循环所在线程（写入线程和解码线程不在其中）；同一时间只运行一个采集。
+    """
+
+    def __init__(self, output_dir: str = "logs", duration: float = 30, top: int = 50,
+                 tracemalloc_frames: int = 10):
+        self.output_dir = Path(output_dir)
+        self.duration = duration
+        self.top = top
+        self.tracemalloc_frames = tracemalloc_frames
+        self.active: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def install(self, loop: asyncio.AbstractEventLoop) -> bool:
+        """在事件循环中注册信号处理，平台不支持时返回 False"""
+        if not hasattr(signal, "SIGUSR1"):
+            return False
+        try:
+            loop.add_signal_handler(signal.SIGUSR1, self.trigger, "cprofile")
+            loop.add_signal_handler(signal.SIGUSR2, self.trigger, "tracemalloc")
+        except (NotImplementedError, RuntimeError, ValueError) as e:
+            logger.warning(f"注册性能分析信号失败: {e}")
+            return False
+        logger.info(f"性能分析信号已注册: kill -USR1 {os.getpid()} (cProfile) / kill -USR2 {os.getpid()} (tracemalloc)")
+        return True
+
+    def trigger(self, mode: str):
+        """开始一次限时采集（在事件循环中调用）"""
+        if self.active:
+            logger.warning(f"正在进行 {self.active} 采集，忽略本次信号")
+            return
+        self.active = mode
+        capture = self._capture_cprofile if mode == "cprofile" else self._capture_tracemalloc
+        self._task = asyncio.get_running_loop().create_task(capture())
+
+    def _output_path(self, mode: str, suffix: str) -> Path:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        return self.output_dir / f"{mode}_{os.getpid()}_{time.strftime('%Y%m%d_%H%M%S')}{suffix}"
+
+    async def _capture_cprofile(self):
+        profiler = cProfile.Profile()
+        try:
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # 已有其他分析器（例如调试器）在运行
+                logger.error(f"启动cProfile失败: {e}")
+                return
+            logger.info(f"开始cProfile采集，持续 {self.duration} 秒")
+            try:
+                await asyncio.sleep(self.duration)
+            finally:
+                profiler.disable()
+
+            path = self._output_path("cprofile", ".prof")
+            profiler.dump_stats(str(path))
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(self.top)
+            path.with_suffix(".txt").write_text(report.getvalue(), encoding="utf-8")
+            logger.info(f"cProfile结果已保存: {path}（可用 python -m pstats 或 snakeviz 查看）")
+        except Exception as e:
+            logger.error(f"cProfile采集失败: {e}")
+        finally:
+            self.active = None
+
+    async def _capture_tracemalloc(self):
+        # 之前已在跟踪（例如 python -X tracemalloc 启动）时保留跟踪状态
+        was_tracing = tracemalloc.is_tracing()
+        try:
+            if not was_tracing:
+                tracemalloc.start(self.tracemalloc_frames)
+            loop = asyncio.get_running_loop()
+            before = await loop.run_in_executor(None, tracemalloc.take_snapshot)
+            logger.info(f"开始tracemalloc采集，持续 {self.duration} 秒")
+            await asyncio.sleep(self.duration)
+            after = await loop.run_in_executor(None, tracemalloc.take_snapshot)
+            path = self._output_path("tracemalloc", ".txt")
+            # 快照统计可能耗时数秒，放在线程池中进行
+            await loop.run_in_executor(None, self._write_tracemalloc_report, path, before, after)
+            logger.info(f"tracemalloc结果已保存: {path}")
+        except Exception as e:
+            logger.error(f"tracemalloc采集失败: {e}")
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+            self.active = None
+
+    def _write_tracemalloc_report(self, path: Path, before: tracemalloc.Snapshot, after: tracemalloc.Snapshot):
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"采集时长: {self.duration} 秒",
+            f"当前跟踪内存: {current / 1024 / 1024:.1f} MB，峰值: {peak / 1024 / 1024:.1f} MB",
+            "",
+            f"== 采集期间增长最多的分配位置（前 {self.top} 条） ==",
+        ]
+        lines.extend(str(stat) for stat in after.compare_to(before, "lineno")[:self.top])
+        lines.append("")
+        lines.append(f"== 当前占用最多的分配位置（前 {self.top} 条） ==")
+        lines.extend(str(stat) for stat in after.statistics("lineno")[:self.top])
+        lines.append("")
+        lines.append("== 当前占用最多的调用栈（前 10 条） ==")
+        for stat in after.statistics("traceback")[:10]:
+            lines.append(f"{stat.count} 个对象, {stat.size / 1024:.1f} KiB")
+            lines.extend(f"    {line}" for line in stat.traceback.format())
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+_profiler: Optional[SignalProfiler] = None
+
+
+def install_signal_profiler() -> Optional[SignalProfiler]:
+    """在当前事件循环中注册进程内唯一的信号分析器，配置关闭或平台不支持时返回 None"""
+    global _profiler
+    profile_config = Config.get_profile_config()
+    if not profile_config["signals"]:
+        return None
+    if _profiler is None:
+        profiler = SignalProfiler(
+            profile_config["output_dir"],
+            profile_config["duration"],
+            profile_config["top"],
+            profile_config["tracemalloc_frames"],
+        )
+        if not profiler.install(asyncio.get_running_loop()):
+            return None
+        _profiler = profiler
+    return _profiler
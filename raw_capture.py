@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import asyncio
+import json
+import os
+import struct
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Union
+
+from loguru import logger
+
+from config import Config
+from models import replay_clock
+from storage import CommentPersister
+from utils import parse_time_ms
+
+
+# 记录类型
+KIND_META = 0  # 文件头：平台、直播间等（JSON）
+KIND_HTTP = 1  # 弹幕API响应体
+KIND_WS_TEXT = 2  # WebSocket 文本帧
+KIND_WS_BINARY = 3  # WebSocket 二进制帧
+KIND_NAMES = {KIND_META: "meta", KIND_HTTP: "http", KIND_WS_TEXT: "ws_text", KIND_WS_BINARY: "ws_binary"}
+
+# 类型字节的最高位表示负载经过 zlib 压缩
+FLAG_COMPRESSED = 0x80
+
+MAGIC = b"SKYCAP1\n"
+
+# 记录头：类型（1字节）、接收时间（微秒级 Unix 时间戳，8字节）、负载长度（4字节）
+_HEADER = struct.Struct("<BqI")
+
+CaptureRecord = Tuple[int, int, Union[str, bytes]]
+
+
+class RawCaptureWriter:
+    """原始流量抓包文件写入器
+
+    文件以 ``MAGIC`` 开头，之后是连续的记录：13 字节的记录头加负载，第一条记录是 JSON 格式的文件头。
+    负载保存原始字节，不做 base64 或 JSON 转义；超过 ``compress_min`` 字节且压缩后更小的负载单独用 zlib 压缩，
+    因此文件只追加、可以逐条读取。异常退出时末尾可能有一条残缺的记录，读取时会被忽略。
+
+    接口与弹幕写入器相同（``write``/``fsync``/``close``），由 ``CommentPersister`` 在后台线程中调用。
+    """
+
+    def __init__(self, output_file: str, platform: str, room_id: str, compress_min: int = 256):
+        self.output_file = output_file
+        self.platform = platform
+        self.room_id = room_id
+        self.compress_min = compress_min
+        self.persisted_count = 0  # 已写入的记录数（不含文件头）
+        self.bytes_written = 0
+        self._file = None
+
+    def _open(self):
+        """第一次写入时才创建文件，没有流量时不留下空文件"""
+        Path(self.output_file).parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.output_file, "wb")
+        meta = json.dumps({
+            "version": 1,
+            "platform": self.platform,
+            "room_id": self.room_id,
+            "started": time.time_ns() // 1000,
+        }, ensure_ascii=False).encode("utf-8")
+        self._file.write(MAGIC + _HEADER.pack(KIND_META, time.time_ns() // 1000, len(meta)) + meta)
+
+    def write(self, batch: List[CaptureRecord]) -> int:
+        """追加一批记录 (类型, 接收时间（微秒）, 负载)，返回写入的记录数"""
+        if not batch:
+            return 0
+        if self._file is None:
+            self._open()
+
+        buffer = bytearray()
+        for kind, ts_us, payload in batch:
+            if isinstance(payload, str):
+                payload = payload.encode("utf-8")
+            if len(payload) >= self.compress_min:
+                compressed = zlib.compress(payload, 1)
+                if len(compressed) < len(payload):
+                    kind |= FLAG_COMPRESSED
+                    payload = compressed
+            buffer += _HEADER.pack(kind, ts_us, len(payload))
+            buffer += payload
+
+        self._file.write(buffer)
+        self._file.flush()
+        self.persisted_count += len(batch)
+        self.bytes_written += len(buffer)
+        return len(batch)
+
+    def fsync(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class RawCaptureRecorder:
+    """抓包记录器
+
+    事件循环线程只记录接收时间并把原始负载追加到缓冲区，编码、压缩和写盘都在后台线程中进行。
+    """
+
+    def __init__(self, output_file: str, platform: str, room_id: str, log=None):
+        save_config = Config.get_save_config()
+        capture_config = Config.get_capture_config()
+        self.writer = RawCaptureWriter(output_file, platform, room_id, capture_config["raw_compress_min"])
+        self.persister = CommentPersister(
+            self.writer,
+            flush_records=capture_config["raw_flush_records"],
+            flush_interval_ms=save_config["flush_interval_ms"],
+            capacity=save_config["buffer_capacity"],
+            overflow_policy=save_config["buffer_overflow"],
+            log=log,
+            name=f"{platform}-{room_id}-capture",
+        )
+
+    @property
+    def output_file(self) -> str:
+        return self.writer.output_file
+
+    def start(self):
+        self.persister.start()
+
+    def record_http(self, body: bytes):
+        """记录一个弹幕API响应体"""
+        self.persister.submit((KIND_HTTP, time.time_ns() // 1000, body))
+
+    def record_frame(self, payload: Union[str, bytes]):
+        """记录一个WebSocket帧"""
+        kind = KIND_WS_BINARY if isinstance(payload, bytes) else KIND_WS_TEXT
+        self.persister.submit((kind, time.time_ns() // 1000, payload))
+
+    def close(self):
+        """写完剩余记录并关闭文件（会阻塞，应在线程池中调用）"""
+        self.persister.close()
+
+
+class RawCaptureReader:
+    """抓包文件读取器"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"不是抓包文件: {path}")
+            kind, _, length = _HEADER.unpack(f.read(_HEADER.size))
+            if kind != KIND_META:
+                raise ValueError(f"抓包文件缺少文件头: {path}")
+            self.meta: Dict = json.loads(f.read(length))
+        self.platform: str = self.meta["platform"]
+        self.room_id: str = self.meta["room_id"]
+
+    def records(self, since_ms: int = None, until_ms: int = None) -> Iterator[CaptureRecord]:
+        """按写入顺序返回 (类型, 接收时间（微秒）, 负载)，文本帧为 str，其余为 bytes"""
+        with open(self.path, "rb") as f:
+            f.read(len(MAGIC))
+            while True:
+                header = f.read(_HEADER.size)
+                if not header:
+                    return
+                if len(header) < _HEADER.size:
+                    logger.warning(f"抓包文件末尾有残缺的记录，已忽略: {self.path}")
+                    return
+                kind, ts_us, length = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length:
+                    logger.warning(f"抓包文件末尾有残缺的记录，已忽略: {self.path}")
+                    return
+
+                if kind & FLAG_COMPRESSED:
+                    kind &= ~FLAG_COMPRESSED
+                    payload = zlib.decompress(payload)
+                if kind == KIND_META:
+                    continue
+                if since_ms is not None and ts_us < since_ms * 1000:
+                    continue
+                if until_ms is not None and ts_us >= until_ms * 1000:
+                    continue
+                yield kind, ts_us, payload.decode("utf-8") if kind == KIND_WS_TEXT else payload
+
+
+async def replay_capture(crawler, records: Iterator[CaptureRecord], speed: float = 1.0) -> Counter:
+    """把抓包记录送回抓取器的处理流程，返回各类型的记录数
+
+    API响应体交给 ``_handle_response_body``，WebSocket帧交给 ``_process_frames``，与线上的解码、提取、
+    去重和保存逻辑完全相同。弹幕时间使用记录的接收时间，回放结果可以直接用于补录。
+    ``speed`` 为回放倍速（1 为原速），小于等于 0 时不等待，以最快速度回放。
+    """
+    loop = asyncio.get_running_loop()
+    counts = Counter()
+    first_ts_us = None
+    started = loop.time()
+
+    for replayed, (kind, ts_us, payload) in enumerate(records):
+        if speed > 0:
+            if first_ts_us is None:
+                first_ts_us = ts_us
+            delay = started + (ts_us - first_ts_us) / 1_000_000 / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif replayed % 1000 == 0:
+            # 最快速度回放时定期让出事件循环
+            await asyncio.sleep(0)
+
+        with replay_clock(ts_us // 1000):
+            if kind == KIND_HTTP:
+                await crawler._handle_response_body(payload)
+            else:
+                await crawler._process_frames([payload])
+        counts[KIND_NAMES[kind]] += 1
+
+    return counts
+
+
+async def replay_file(path: str, output_file: str = None, speed: float = 1.0,
+                      since_ms: int = None, until_ms: int = None) -> Counter:
+    """用抓包文件记录的平台和直播间创建抓取器（不启动浏览器），回放后保存弹幕"""
+    # 抓取器依赖本模块记录抓包，在函数内导入避免循环导入
+    from douyin_crawler import DouyinCrawler
+    from taobao_crawler import TaobaoCrawler
+
+    reader = RawCaptureReader(path)
+    crawler_classes = {"douyin": DouyinCrawler, "taobao": TaobaoCrawler}
+    if reader.platform not in crawler_classes:
+        raise ValueError(f"不支持的平台: {reader.platform}")
+
+    if output_file is None:
+        output_file = str(reader.path.with_suffix(f".replay.{Config.get_save_config()['file_format']}"))
+    crawler = crawler_classes[reader.platform](reader.room_id, output_file)
+    # 回放时不再抓包
+    crawler.raw_recorder = None
+    crawler.persister.start()
+
+    started = time.perf_counter()
+    try:
+        counts = await replay_capture(crawler, reader.records(since_ms, until_ms), speed)
+    finally:
+        await crawler._cleanup()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"回放完成: {dict(counts)}，提取 {crawler.metrics.total} 条弹幕到 {output_file}，耗时 {elapsed:.1f} 秒")
+    return counts
+
+
+def parse_speed(value: str) -> float:
+    """回放速度：max 表示最快速度，其余为倍速（如 1、10）"""
+    if value == "max":
+        return 0.0
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("回放倍速必须大于0")
+    return speed
+
+
+def main():
+    """主函数：回放抓包文件，重新提取并保存弹幕"""
+    parser = argparse.ArgumentParser(description="回放原始流量抓包，用修复后的解析逻辑重新提取弹幕或复现线上负载")
+    parser.add_argument("capture", help="抓包文件（.cap）")
+    parser.add_argument("--output", help="弹幕输出文件，默认为 {抓包文件名}.replay.{格式}")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="回放倍速：1 为原速，10 为十倍速，max 为最快速度")
+    parser.add_argument("--since", type=parse_time_ms, help="只回放该时间之后接收的流量（包含），如 2024-01-01T12:00:00")
+    parser.add_argument("--until", type=parse_time_ms, help="只回放该时间之前接收的流量（不包含）")
+
+    args = parser.parse_args()
+    Path("logs").mkdir(exist_ok=True)
+    asyncio.run(replay_file(args.capture, args.output, args.speed, args.since, args.until))
+
+
+if __name__ == "__main__":
+    main()
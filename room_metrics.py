@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import heapq
+import math
+import time
+from collections import Counter
+from typing import Dict, Hashable, List, Tuple
+
+from models import CommentRecord
+from text_index import to_bigram_text
+
+
+class WindowCounter:
+    """滑动窗口计数器
+
+    窗口分为固定数量的桶，每个桶记录所属的时间段编号，过期的桶在复用时清零。
+    内存固定为桶数，计数和查询都是 O(桶数) 以内。
+    """
+
+    def __init__(self, window_seconds: float, buckets: int):
+        self.window = window_seconds
+        self.width = window_seconds / buckets
+        self._counts = [0] * buckets
+        self._ids = [-1] * buckets
+
+    def add(self, now: float, count: int = 1):
+        bucket = int(now // self.width)
+        index = bucket % len(self._counts)
+        if self._ids[index] != bucket:
+            self._ids[index] = bucket
+            self._counts[index] = 0
+        self._counts[index] += count
+
+    def total(self, now: float) -> int:
+        """窗口内（含当前桶）的计数"""
+        oldest = int(now // self.width) - len(self._counts)
+        return sum(count for count, bucket in zip(self._counts, self._ids) if bucket > oldest)
+
+    def rate(self, now: float) -> float:
+        """窗口内的平均每秒计数"""
+        return self.total(now) / self.window
+
+
+class HyperLogLog:
+    """HyperLogLog 基数估计
+
+    ``2 ** precision`` 个寄存器（默认 4096 字节），标准误差约 ``1.04 / sqrt(2 ** precision)``（默认约 1.6%）。
+    使用 Python 内置 hash，估计值只在当前进程内有效。
+    """
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self._m = 1 << precision
+        self._registers = bytearray(self._m)
+        self._rest_bits = 64 - precision
+        self._rest_mask = (1 << self._rest_bits) - 1
+        self._alpha = 0.7213 / (1 + 1.079 / self._m)
+
+    def add(self, value: Hashable):
+        h = hash(value) & 0xFFFFFFFFFFFFFFFF
+        index = h >> self._rest_bits
+        rank = self._rest_bits - (h & self._rest_mask).bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def count(self) -> int:
+        registers = self._registers
+        estimate = self._alpha * self._m * self._m / sum(2.0 ** -rank for rank in registers)
+        if estimate <= 2.5 * self._m:
+            zeros = registers.count(0)
+            if zeros:
+                # 小基数时使用线性计数修正
+                estimate = self._m * math.log(self._m / zeros)
+        return round(estimate)
+
+
+class SpaceSaving:
+    """Space-Saving 高频项估计
+
+    最多跟踪 ``capacity`` 个项，表满时新项替换计数最小的项并继承其计数。
+    出现次数超过 ``总数 / capacity`` 的项一定在表中，计数最多高估被替换项的计数（记录在 error 中）。
+    命中已有项只更新字典；堆中的计数允许过期，查找最小项时才修正，因此均摊开销为 O(log capacity)。
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self._counts: Dict[Hashable, int] = {}
+        self._errors: Dict[Hashable, int] = {}
+        self._heap: List[Tuple[int, Hashable]] = []
+
+    def add(self, item: Hashable):
+        counts = self._counts
+        count = counts.get(item)
+        if count is not None:
+            counts[item] = count + 1
+            return
+
+        if len(counts) < self.capacity:
+            counts[item] = 1
+            self._errors[item] = 0
+            heapq.heappush(self._heap, (1, item))
+            return
+
+        # 找到当前计数最小的项（跳过计数已变化的过期堆项）
+        heap = self._heap
+        while True:
+            min_count, min_item = heap[0]
+            current = counts.get(min_item)
+            if current == min_count:
+                break
+            heapq.heapreplace(heap, (current, min_item))
+
+        heapq.heappop(heap)
+        del counts[min_item]
+        del self._errors[min_item]
+        counts[item] = min_count + 1
+        self._errors[item] = min_count
+        heapq.heappush(heap, (min_count + 1, item))
+
+    def top(self, k: int) -> List[Tuple[Hashable, int]]:
+        """计数最高的 k 项：[(项, 估计计数)]"""
+        return heapq.nlargest(k, self._counts.items(), key=lambda entry: entry[1])
+
+    def error(self, item: Hashable) -> int:
+        """该项估计计数的最大高估量"""
+        return self._errors.get(item, 0)
+
+
+class Histogram:
+    """固定分桶的直方图（Prometheus 风格）
+
+    记录一次只做一次二分查找和两次加法，适合放在热路径上。
+    每个直方图只应由一个线程写入；读取方可能看到略微滞后的计数。
+    """
+
+    # 默认分桶上界（秒），覆盖 0.1 毫秒到 10 秒
+    DEFAULT_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                      0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, bounds: Tuple[float, ...] = DEFAULT_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最后一个桶为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """按分桶估计分位数（返回所在桶的上界）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+
+class RoomMetrics:
+    """直播间实时指标
+
+    在弹幕入库时增量更新：10秒、1分钟、5分钟窗口的弹幕速率，HyperLogLog 估计的独立发言用户数，
+    Space-Saving 估计的高频用户和关键词。所有结构的内存都是固定的，与运行时长无关。
+    """
+
+    WINDOWS = (("10s", 10, 10), ("1m", 60, 60), ("5m", 300, 60))  # (名称, 窗口秒数, 桶数)
+
+    def __init__(self, top_k: int = 10, sketch_capacity: int = 100, hll_precision: int = 12,
+                 track_keywords: bool = True):
+        self.top_k = top_k
+        self.track_keywords = track_keywords
+        self.total = 0
+        self.types = Counter()  # 类型种类固定，计数器大小不随时间增长
+        self.started = time.time()
+        self._windows = {name: WindowCounter(seconds, buckets) for name, seconds, buckets in self.WINDOWS}
+        self._users = HyperLogLog(hll_precision)
+        self._top_users = SpaceSaving(sketch_capacity)
+        self._top_keywords = SpaceSaving(sketch_capacity)
+
+    def record(self, comment: CommentRecord, now: float = None):
+        """统计一条弹幕"""
+        now = time.time() if now is None else now
+        self.total += 1
+        self.types[comment.type] += 1
+        for window in self._windows.values():
+            window.add(now)
+        self._users.add(comment.user)
+        self._top_users.add(comment.user)
+        if self.track_keywords and comment.content:
+            # 每条弹幕中的同一个词只计一次
+            for keyword in set(to_bigram_text(comment.content).lower().split()):
+                self._top_keywords.add(keyword)
+
+    def rates(self, now: float = None) -> Dict[str, float]:
+        """各窗口的每秒弹幕数"""
+        now = time.time() if now is None else now
+        return {name: round(window.rate(now), 2) for name, window in self._windows.items()}
+
+    def snapshot(self, now: float = None) -> Dict:
+        """当前指标快照"""
+        return {
+            "total": self.total,
+            "types": dict(self.types),
+            "rates": self.rates(now),
+            "unique_users": self._users.count(),
+            "top_users": self._top_users.top(self.top_k),
+            "top_keywords": self._top_keywords.top(self.top_k) if self.track_keywords else [],
+            "uptime": round(time.time() - self.started, 1)
+        }
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from loguru import logger
+
+from storage import SqliteCommentWriter, connect_comment_db
+from text_index import to_index_text, to_match_query
+from utils import parse_time_ms
+
+
+def search_comments(conn: sqlite3.Connection, query: str, platform: str = None, room_id: str = None,
+                    user: str = None, since_ms: int = None, until_ms: int = None, limit: int = 50) -> List[Dict]:
+    """全文检索弹幕，按相关度（bm25）排序，相关度相同时较新的在前"""
+    sql = [
+        "SELECT c.ts, c.platform, c.room_id, c.user, c.content, c.type",
+        "FROM comments_fts JOIN comments c ON c.id = comments_fts.rowid",
+        "WHERE comments_fts MATCH ?",
+    ]
+    params: List = [to_match_query(query)]
+    for column, value in (("c.platform", platform), ("c.room_id", room_id), ("c.user", user)):
+        if value is not None:
+            sql.append(f"AND {column} = ?")
+            params.append(value)
+    if since_ms is not None:
+        sql.append("AND c.ts >= ?")
+        params.append(since_ms)
+    if until_ms is not None:
+        sql.append("AND c.ts < ?")
+        params.append(until_ms)
+    sql.append("ORDER BY comments_fts.rank, c.ts DESC LIMIT ?")
+    params.append(limit)
+
+    return [
+        {
+            "timestamp": datetime.fromtimestamp(ts / 1000).isoformat(),
+            "platform": row_platform,
+            "room_id": row_room_id,
+            "user": row_user,
+            "content": content,
+            "type": comment_type
+        }
+        for ts, row_platform, row_room_id, row_user, content, comment_type in conn.execute(" ".join(sql), params)
+    ]
+
+
+def rebuild_search_index(conn: sqlite3.Connection, batch_size: int = 10000) -> int:
+    """重建全文索引（用于关闭 sqlite_fts 时写入的数据库，或索引切分方式变化后），返回索引的弹幕条数"""
+    conn.executescript(SqliteCommentWriter.FTS_SCHEMA)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("INSERT INTO comments_fts (comments_fts) VALUES ('delete-all')")
+        total = 0
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, content FROM comments WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            conn.executemany(SqliteCommentWriter.INSERT_FTS_SQL, [(row_id, to_index_text(content)) for row_id, content in rows])
+            total += len(rows)
+            last_id = rows[-1][0]
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return total
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="弹幕全文检索工具（检索 sqlite 格式保存的弹幕）")
+    parser.add_argument("query", nargs="?", help="检索内容，空格分隔的多个词需同时出现")
+    parser.add_argument("--db", required=True, help="弹幕数据库文件")
+    parser.add_argument("--platform", help="平台，如 douyin、taobao")
+    parser.add_argument("--room_id", help="直播间ID")
+    parser.add_argument("--user", help="用户名")
+    parser.add_argument("--since", type=parse_time_ms, help="起始时间（包含），如 2024-01-01T12:00:00")
+    parser.add_argument("--until", type=parse_time_ms, help="结束时间（不包含）")
+    parser.add_argument("--limit", type=int, default=50, help="最多返回的条数")
+    parser.add_argument("--rebuild", action="store_true", help="重建全文索引")
+
+    args = parser.parse_args()
+    if not args.query and not args.rebuild:
+        parser.error("需要指定检索内容或 --rebuild")
+
+    try:
+        if args.rebuild:
+            started = time.perf_counter()
+            conn = connect_comment_db(args.db)
+            total = rebuild_search_index(conn)
+            conn.close()
+            logger.info(f"已重建全文索引: {total} 条弹幕，耗时 {time.perf_counter() - started:.1f} 秒")
+            if not args.query:
+                return
+
+        conn = connect_comment_db(args.db, readonly=True)
+        started = time.perf_counter()
+        results = search_comments(
+            conn, args.query, args.platform, args.room_id, args.user, args.since, args.until, args.limit
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        conn.close()
+    except (sqlite3.Error, ValueError) as e:
+        logger.error(f"检索失败: {e}")
+        return
+
+    for result in results:
+        print(f"{result['timestamp']} [{result['platform']}/{result['room_id']}] {result['user']}: {result['content']}")
+    print(f"共 {len(results)} 条结果，耗时 {elapsed_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from loguru import logger
+from playwright.async_api import BrowserContext
+
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只使用进程内的锁
+    fcntl = None
+
+
+class StorageStateCache:
+    """按平台缓存的浏览器存储状态（Cookie 和 localStorage）
+
+    每个平台一个文件 ``{平台}.json``，内容为 Playwright 的 storage_state 和保存时间。成功进入直播间后保存，
+    创建新的浏览器上下文时读取，超过 ``ttl`` 秒视为过期（冷启动后重新保存）。
+
+    多个直播间可以同时使用同一个缓存：写入时先写临时文件再原子替换，读取方总是看到完整的文件；
+    同一进程内按平台加锁，进程之间使用文件锁，拿不到锁说明其他直播间正在保存，直接跳过。
+    """
+
+    def __init__(self, cache_dir: str, ttl: float, refresh_interval: float = 0):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def path(self, platform: str) -> Path:
+        return self.cache_dir / f"{platform}.json"
+
+    def _read(self, platform: str) -> Optional[Dict]:
+        try:
+            with open(self.path(platform), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取存储状态缓存失败: {e}")
+            return None
+
+    def age(self, platform: str) -> Optional[float]:
+        """缓存已保存的秒数，没有缓存时返回 None"""
+        data = self._read(platform)
+        if data is None:
+            return None
+        return time.time() - data.get("saved_at", 0)
+
+    def load(self, platform: str) -> Optional[Dict]:
+        """读取未过期的存储状态（可直接传给 ``new_context(storage_state=...)``），没有或已过期时返回 None"""
+        data = self._read(platform)
+        if data is None:
+            return None
+        if not 0 <= time.time() - data.get("saved_at", 0) < self.ttl:
+            return None
+        return data.get("state")
+
+    async def save(self, platform: str, context: BrowserContext) -> bool:
+        """保存浏览器上下文的存储状态，返回是否写入
+
+        缓存在 ``refresh_interval`` 秒内刚保存过，或其他直播间正在保存时跳过。
+        """
+        lock = self._locks.setdefault(platform, asyncio.Lock())
+        if lock.locked():
+            return False
+        async with lock:
+            loop = asyncio.get_running_loop()
+            age = await loop.run_in_executor(None, self.age, platform)
+            if age is not None and 0 <= age < self.refresh_interval:
+                return False
+            state = await context.storage_state()
+            return await loop.run_in_executor(None, self._write, platform, state)
+
+    def _write(self, platform: str, state: Dict) -> bool:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path(platform)
+        with open(path.with_suffix(".lock"), "a") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+
+            # 文件包含登录状态，只允许当前用户读写
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"saved_at": time.time(), "platform": platform, "state": state}, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        return True
+
+    def invalidate(self, platform: str):
+        """删除缓存，下次启动时冷启动"""
+        try:
+            self.path(platform).unlink()
+        except FileNotFoundError:
+            pass
+
+
+_cache: Optional[StorageStateCache] = None
+
+
+def get_storage_state_cache() -> Optional[StorageStateCache]:
+    """进程内共享的存储状态缓存，配置关闭时返回 None"""
+    global _cache
+    session_config = Config.get_session_config()
+    if not session_config["enabled"]:
+        return None
+    if _cache is None:
+        _cache = StorageStateCache(session_config["cache_dir"], session_config["ttl"], session_config["refresh_interval"])
+    return _cache
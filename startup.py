@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+from typing import Dict, Optional
+
+from playwright.async_api import Page
+
+
+# 启动阶段（按通常的先后顺序）
+STARTUP_PHASES = ("page", "handlers", "domcontentloaded", "first_frame", "ready", "first_comment")
+
+
+class StartupTimer:
+    """直播间启动耗时
+
+    记录各阶段距离开始启动的秒数：page（浏览器上下文和页面创建完成）、handlers（弹幕API拦截和
+    WebSocket监听注册完成）、domcontentloaded（页面文档解析完成）、first_frame（收到第一个弹幕API响应
+    或WebSocket帧）、ready（弹幕区域出现或收到第一帧，以先到者为准）、first_comment（提取出第一条弹幕）。
+    每个阶段只记录第一次，由指标端点输出，用于比较不同版本的冷启动耗时，以及冷启动和使用存储状态缓存的热启动。
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.ready_reason: Optional[str] = None  # selector、frame 或 timeout
+        self.warm = False  # 是否使用了存储状态缓存
+        self.first_frame = asyncio.Event()
+
+    def begin(self):
+        """开始计时（进入直播间前调用）"""
+        self.started = time.perf_counter()
+        self.phases.clear()
+        self.ready_reason = None
+        self.warm = False
+        self.first_frame.clear()
+
+    def mark(self, phase: str) -> float:
+        """记录阶段完成的时间，返回距离开始的秒数"""
+        if phase not in self.phases:
+            self.phases[phase] = time.perf_counter() - self.started
+        return self.phases[phase]
+
+    def frame_received(self):
+        """收到弹幕流量（热路径，只在第一次时记录）"""
+        if not self.first_frame.is_set():
+            self.mark("first_frame")
+            self.first_frame.set()
+
+    async def wait_ready(self, page: Page, chat_selector: Optional[str], timeout: float) -> str:
+        """等待弹幕区域出现或收到第一帧弹幕，返回就绪原因
+
+        两者都没有在 ``timeout`` 秒内发生时返回 timeout，由调用方决定是否继续。
+        """
+        waiters = {asyncio.ensure_future(self.first_frame.wait()): "frame"}
+        if chat_selector:
+            waiters[asyncio.ensure_future(
+                page.wait_for_selector(chat_selector, state="attached", timeout=timeout * 1000)
+            )] = "selector"
+
+        reason = "timeout"
+        pending = set(waiters)
+        deadline = asyncio.get_running_loop().time() + timeout
+        try:
+            while pending and reason == "timeout":
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    # 等待选择器超时或页面关闭时抛出异常，继续等待第一帧
+                    if not task.cancelled() and task.exception() is None:
+                        reason = waiters[task]
+                        break
+        finally:
+            for task in waiters:
+                task.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+
+        self.ready_reason = reason
+        self.mark("ready")
+        return reason
+
+    def summary(self) -> str:
+        """已记录阶段的耗时，用于日志"""
+        phases = "，".join(f"{phase} {self.phases[phase]:.2f}s" for phase in STARTUP_PHASES if phase in self.phases)
+        return f"{'热启动' if self.warm else '冷启动'}：{phases}"
@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sqlite3
+import textwrap
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from loguru import logger
+
+from archive import SegmentArchiveWriter
+from models import CommentRecord
+from room_metrics import Histogram
+from text_index import to_index_text
+
+
+class JsonlCommentWriter:
+    """JSONL 追加写入器
+
+    每条弹幕占一行，只追加水位线之后尚未持久化的记录，单次写入开销与新增弹幕数成正比。
+    进程中途退出最多留下一行残缺记录，重新打开时会被截掉，文件始终可以逐行读取。
+    """
+
+    def __init__(self, output_file: str, encoding: str = "utf-8"):
+        self.output_file = output_file
+        self.encoding = encoding
+        self.persisted_count = 0  # 已持久化的弹幕条数（水位线）
+        self._file = None
+
+    def _open(self):
+        """打开输出文件（追加模式）"""
+        Path(self.output_file).parent.mkdir(parents=True, exist_ok=True)
+        self._recover()
+        self._file = open(self.output_file, "ab")
+
+    def _recover(self):
+        """截掉上次异常退出时残留的半行记录"""
+        if not os.path.exists(self.output_file):
+            return
+
+        with open(self.output_file, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+
+            # 从文件末尾向前查找最后一个换行符
+            pos = size
+            while pos > 0:
+                step = min(4096, pos)
+                pos -= step
+                f.seek(pos)
+                chunk = f.read(step)
+                index = chunk.rfind(b"\n")
+                if index != -1:
+                    end = pos + index + 1
+                    if end != size:
+                        f.truncate(end)
+                    return
+            f.truncate(0)
+
+    def write(self, records: List[CommentRecord]) -> int:
+        """追加写入一批弹幕，返回写入条数"""
+        if not records:
+            return 0
+        if self._file is None:
+            self._open()
+
+        # 一次写入完整的若干行，避免多次小写入
+        data = "".join(json.dumps(record.to_dict(), ensure_ascii=False) + "\n" for record in records)
+        self._file.write(data.encode(self.encoding))
+        self._file.flush()
+
+        self.persisted_count += len(records)
+        return len(records)
+
+    def fsync(self):
+        """将已写入的数据同步到磁盘"""
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """关闭输出文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class JsonArrayCommentWriter:
+    """JSON 数组增量写入器
+
+    输出与旧版 ``json.dump(comments, f, ensure_ascii=False, indent=2)`` 格式一致，
+    但每次只在结尾的 ``]`` 之前追加新记录，不再整文件重写。
+    打开已有的输出文件（如页面崩溃后重启）时在原数组末尾继续追加；写入过程中异常退出
+    会导致缺少结尾的 ``]``，重新打开时截掉残缺记录并补回结尾。
+    """
+
+    _TAIL = b"\n]\n"
+    _RECORD_END = b"\n  }"  # 数组中每条记录的结尾（缩进两格的右括号）
+
+    def __init__(self, output_file: str, encoding: str = "utf-8"):
+        self.output_file = output_file
+        self.encoding = encoding
+        self.persisted_count = 0  # 已持久化的弹幕条数（水位线）
+        self._file = None
+        self._has_records = False  # 文件中的数组是否已有记录
+
+    def _open(self):
+        """打开输出文件：已有记录时在数组末尾继续追加，否则写入空数组"""
+        Path(self.output_file).parent.mkdir(parents=True, exist_ok=True)
+        exists = os.path.exists(self.output_file)
+        self._file = open(self.output_file, "rb+" if exists else "wb+")
+        self._has_records = exists and self._recover()
+        if not self._has_records:
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.write(b"[]\n")
+        self._file.flush()
+
+    def _recover(self) -> bool:
+        """保留到最后一条完整记录为止并补回结尾，返回文件中是否有记录"""
+        f = self._file
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        # 从文件末尾向前查找最后一条完整记录的结尾
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data[:len(self._RECORD_END) - 1]
+            index = data.rfind(self._RECORD_END)
+            if index != -1:
+                f.seek(pos + index + len(self._RECORD_END))
+                f.truncate()
+                f.write(self._TAIL)
+                return True
+        return False
+
+    def write(self, records: List[CommentRecord]) -> int:
+        """在数组末尾追加一批弹幕，返回写入条数"""
+        if not records:
+            return 0
+        if self._file is None:
+            self._open()
+
+        body = ",\n".join(
+            textwrap.indent(json.dumps(record.to_dict(), ensure_ascii=False, indent=2), "  ")
+            for record in records
+        ).encode(self.encoding)
+
+        if not self._has_records:
+            # 覆盖空数组 "[]\n"
+            self._file.seek(0)
+            self._file.write(b"[\n" + body + self._TAIL)
+            self._has_records = True
+        else:
+            # 覆盖结尾的 "\n]\n" 后继续追加
+            self._file.seek(-len(self._TAIL), os.SEEK_END)
+            self._file.write(b",\n" + body + self._TAIL)
+        self._file.flush()
+
+        self.persisted_count += len(records)
+        return len(records)
+
+    def fsync(self):
+        """将已写入的数据同步到磁盘"""
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """关闭输出文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SqliteCommentWriter:
+    """SQLite 写入器
+
+    数据库使用 WAL 模式，每批弹幕在一个事务中通过 ``executemany`` 插入，
+    写入时其他进程仍可并发读取（可用 ``connect_comment_db(path, readonly=True)`` 打开）。
+    ``ts`` 为毫秒级 Unix 时间戳，按 (platform, room_id, ts) 和 user 建有索引。
+    多个直播间可以写入同一个数据库文件，写事务由 SQLite 串行化。
+
+    ``fts`` 为 True 时，在同一事务中把弹幕内容写入 FTS5 全文索引 ``comments_fts``
+    （只存索引不存原文，rowid 与 comments.id 一致），中文按二元组切分，见 ``text_index``。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS comments (
+            id INTEGER PRIMARY KEY,
+            ts INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            room_id TEXT NOT NULL,
+            user TEXT NOT NULL,
+            content TEXT NOT NULL,
+            type TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_comments_room_ts ON comments (platform, room_id, ts);
+        CREATE INDEX IF NOT EXISTS idx_comments_user ON comments (user);
+    """
+
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5 (
+            content, content='', tokenize='unicode61'
+        );
+    """
+
+    INSERT_SQL = "INSERT INTO comments (id, ts, platform, room_id, user, content, type) VALUES (?, ?, ?, ?, ?, ?, ?)"
+    INSERT_FTS_SQL = "INSERT INTO comments_fts (rowid, content) VALUES (?, ?)"
+
+    def __init__(self, output_file: str, encoding: str = "utf-8", fts: bool = True):
+        self.output_file = output_file
+        self.encoding = encoding  # SQLite 固定使用 UTF-8，保留参数以与其他写入器一致
+        self.fts = fts
+        self.persisted_count = 0  # 已持久化的弹幕条数（水位线）
+        self._conn = None
+
+    def _open(self):
+        """打开数据库并建表"""
+        Path(self.output_file).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = connect_comment_db(self.output_file)
+        self._conn.executescript(self.SCHEMA)
+        if self.fts:
+            self._conn.executescript(self.FTS_SCHEMA)
+
+    def write(self, records: List[CommentRecord]) -> int:
+        """在一个事务中插入一批弹幕，返回写入条数"""
+        if not records:
+            return 0
+        if self._conn is None:
+            self._open()
+
+        # IMMEDIATE 事务开始时即持有写锁，其他写入进程不会分配到相同的ID
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            first_id = self._conn.execute("SELECT IFNULL(MAX(id), 0) + 1 FROM comments").fetchone()[0]
+            rows = [
+                (first_id + i, record.ts_ms, record.platform, record.room_id, record.user, record.content, record.type)
+                for i, record in enumerate(records)
+            ]
+            self._conn.executemany(self.INSERT_SQL, rows)
+            if self.fts:
+                self._conn.executemany(self.INSERT_FTS_SQL, [(row[0], to_index_text(row[5])) for row in rows])
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+        self.persisted_count += len(records)
+        return len(records)
+
+    def fsync(self):
+        """将 WAL 中已提交的数据检查点写回数据库文件并同步到磁盘"""
+        if self._conn is not None:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        """关闭数据库连接"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def connect_comment_db(path: str, readonly: bool = False) -> sqlite3.Connection:
+    """打开弹幕数据库（WAL 模式，只读连接可与写入进程并发使用）"""
+    if readonly:
+        conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        # 连接可能由写入线程和调用 close 的线程先后使用（同一时间只有一个线程写入）；事务由写入器显式控制
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 不会损坏数据库，断电时最多丢失最近的事务
+        conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+def create_comment_writer(output_file: str, file_format: str = "jsonl", encoding: str = "utf-8", fts: bool = True):
+    """根据文件格式创建弹幕写入器（``fts`` 仅对 sqlite 格式有效）"""
+    if file_format == "jsonl":
+        return JsonlCommentWriter(output_file, encoding)
+    elif file_format == "json":
+        return JsonArrayCommentWriter(output_file, encoding)
+    elif file_format == "sqlite":
+        return SqliteCommentWriter(output_file, encoding, fts)
+    elif file_format == "segments":
+        return SegmentArchiveWriter(output_file, encoding)
+    else:
+        raise ValueError(f"不支持的文件格式: {file_format}")
+
+
+class CommentPersister:
+    """后台持久化线程
+
+    事件循环线程只把弹幕追加到前台缓冲区，写入线程通过双缓冲交换取走整批数据后再写盘，
+    事件循环本身不做任何磁盘 I/O。满 ``flush_records`` 条或最早一条等待超过
+    ``flush_interval_ms`` 毫秒时（以先到者为准）触发一次批量提交。
+
+    写入器自身还缓冲数据时（如分段归档尚未写出的压缩块）可以提供 ``block_deadline()`` 和 ``flush()``：
+    写入线程在到期时刻醒来调用 ``flush()``，调用方请求 ``flush`` 时也会一并写出。
+
+    前台缓冲区只保存尚未持久化的弹幕，正常情况下最多 ``capacity`` 条，因此内存占用与直播时长无关。
+    写入线程跟不上或写入持续失败导致缓冲区写满时，按 ``overflow_policy`` 处理新提交的弹幕：
+
+        - ``spill``: 追加到不设上限的溢出列表并计入 ``spilled_count``，由写入线程随下一批一起写出，不丢弃任何弹幕
+        - ``drop``: 丢弃并计入 ``dropped_count``，以丢数据换取内存上限（需显式开启）
+
+    提交方线程从不等待写盘。只有写入线程（未启动时为调用 ``close`` 的线程）执行写入和重试等待。
+
+    fsync 策略：
+        - ``none``: 只写入操作系统缓存，由系统决定何时落盘
+        - ``batch``: 每次批量提交后执行 fsync
+        - ``close``: 仅在关闭时执行一次 fsync
+    """
+
+    FSYNC_POLICIES = ("none", "batch", "close")
+    OVERFLOW_POLICIES = ("spill", "drop")
+
+    def __init__(self, writer, flush_records: int = 10, flush_interval_ms: int = 1000,
+                 fsync_policy: str = "none", capacity: int = 10000, overflow_policy: str = "spill",
+                 log=None, name: str = "comment-persister"):
+        if fsync_policy not in self.FSYNC_POLICIES:
+            raise ValueError(f"不支持的fsync策略: {fsync_policy}")
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"不支持的缓冲区溢出策略: {overflow_policy}")
+
+        self.writer = writer
+        self.logger = log or logger
+        self.flush_records = max(1, flush_records)
+        self.flush_interval = flush_interval_ms / 1000
+        self.fsync_policy = fsync_policy
+        self.capacity = max(self.flush_records, capacity)
+        self.overflow_policy = overflow_policy
+
+        self.flush_count = 0  # 已完成的批量提交次数
+        self.last_flush_duration = 0.0  # 最近一次批量提交耗时（秒）
+        self.flush_durations = Histogram()  # 批量提交耗时分布（秒），由写入线程记录
+        self.spilled_count = 0  # 缓冲区已满时转入溢出列表的弹幕数
+        self.dropped_count = 0  # 缓冲区已满时丢弃的弹幕数（仅 drop 策略）
+
+        self._front: List[CommentRecord] = []  # 事件循环线程写入的前台缓冲区
+        self._spill: List[CommentRecord] = []  # 前台缓冲区写满后的溢出列表，不设上限
+        self._front_since = 0.0  # 前台缓冲区中最早一条弹幕的入队时间
+        self._flush_requested = False
+        self._closed = False
+        self._overflowing = False  # 缓冲区已满且尚未被写入线程取走（只在开始溢出时记录一次日志）
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        """启动写入线程"""
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    @property
+    def pending_count(self) -> int:
+        """尚未持久化的弹幕条数"""
+        with self._cond:
+            return len(self._front) + len(self._spill)
+
+    def submit(self, record: CommentRecord):
+        """提交一条弹幕（只在内存中追加，从不等待写盘；缓冲区已满时按溢出策略处理）"""
+        with self._cond:
+            if len(self._front) < self.capacity:
+                if not self._front:
+                    self._front_since = time.monotonic()
+                    self._cond.notify()
+                self._front.append(record)
+                if len(self._front) >= self.flush_records:
+                    self._cond.notify()
+                return
+
+            # 前台缓冲区非空且已达到提交条数，写入线程已被唤醒，这里不必再通知
+            if self.overflow_policy == "drop":
+                self.dropped_count += 1
+            else:
+                self._spill.append(record)
+                self.spilled_count += 1
+            first_overflow = not self._overflowing
+            self._overflowing = True
+
+        if first_overflow:
+            action = "开始丢弃新弹幕" if self.overflow_policy == "drop" else "新弹幕暂存到溢出列表"
+            self.logger.warning(f"写入线程跟不上，缓冲区已满（{self.capacity} 条），{action}: {self.writer.output_file}")
+
+    def flush(self):
+        """请求写入线程立即提交当前缓冲区（不等待完成）"""
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify()
+
+    def close(self, timeout: float = None):
+        """停止写入线程，提交剩余弹幕并关闭输出文件（会阻塞，应在线程池中调用）"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        else:
+            # 写入线程未启动（或已退出）时在当前线程完成最后一次提交
+            self._commit(self._swap())
+
+        if self.fsync_policy != "none":
+            self.writer.fsync()
+        self.writer.close()
+
+    def _swap(self) -> List[CommentRecord]:
+        """交换前后台缓冲区，返回待写入的一批弹幕"""
+        with self._cond:
+            batch, self._front = self._front, []
+            if self._spill:
+                # 溢出列表中的弹幕都晚于前台缓冲区，接在后面保持提交顺序
+                batch.extend(self._spill)
+                self._spill = []
+            self._flush_requested = False
+            self._overflowing = False
+            return batch
+
+    def _writer_deadline(self) -> Optional[float]:
+        """写入器内部缓冲到期的时刻，写入器没有内部缓冲时返回 None（只在写入线程中调用）"""
+        block_deadline = getattr(self.writer, "block_deadline", None)
+        return block_deadline() if block_deadline else None
+
+    def _ready(self) -> bool:
+        """判断是否应当提交前台缓冲区"""
+        if self._closed or self._flush_requested:
+            return True
+        writer_deadline = self._writer_deadline()
+        if writer_deadline is not None and time.monotonic() >= writer_deadline:
+            return True
+        if not self._front:
+            return False
+        if len(self._front) >= self.flush_records:
+            return True
+        return time.monotonic() - self._front_since >= self.flush_interval
+
+    def _run(self):
+        """写入线程主循环"""
+        while True:
+            with self._cond:
+                while not self._ready():
+                    deadlines = [self._writer_deadline()]
+                    if self._front:
+                        deadlines.append(self._front_since + self.flush_interval)
+                    deadlines = [deadline for deadline in deadlines if deadline is not None]
+                    timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                    self._cond.wait(timeout)
+                closing = self._closed
+                flush_requested = self._flush_requested
+
+            self._commit(self._swap())
+            if closing:
+                # 写入器关闭时会写出剩余的缓冲数据
+                break
+            self._flush_writer(flush_requested)
+
+    def _flush_writer(self, force: bool):
+        """写出写入器内部缓冲的数据：调用方请求 flush 时立即写出，否则只写出已到期的部分"""
+        writer_deadline = self._writer_deadline()
+        if writer_deadline is None:
+            return
+        if not force and time.monotonic() < writer_deadline:
+            return
+        try:
+            self.writer.flush()
+        except Exception as e:
+            self.logger.error(f"写出缓冲块失败: {e}")
+            time.sleep(self.flush_interval)
+
+    def _commit(self, batch: List[CommentRecord]):
+        """将一批弹幕写入输出文件"""
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        try:
+            self.writer.write(batch)
+            if self.fsync_policy == "batch":
+                self.writer.fsync()
+        except Exception as e:
+            self.logger.error(f"保存弹幕失败: {e}")
+            with self._cond:
+                if self.overflow_policy == "drop" and len(self._front) + len(batch) > self.capacity:
+                    # 显式选择了丢弃策略，缓冲区已满时丢弃本批
+                    self.dropped_count += len(batch)
+                    self.logger.error(f"缓冲区已满，丢弃 {len(batch)} 条未保存的弹幕")
+                else:
+                    # 放回前台缓冲区，等待下次提交重试（放回后超出容量时，之后提交的弹幕进入溢出列表）
+                    self._front[:0] = batch
+                    if len(self._front) == len(batch):
+                        self._front_since = time.monotonic()
+            if not self._closed:
+                time.sleep(self.flush_interval)
+            return
+
+        self.last_flush_duration = time.perf_counter() - started
+        self.flush_durations.observe(self.last_flush_duration)
+        self.flush_count += 1
+        self.logger.info(f"已追加 {len(batch)} 条弹幕到 {self.writer.output_file}，累计 {self.writer.persisted_count} 条")
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+import copy
+
+import pytest
+
+from config import Config
+
+
+@pytest.fixture
+def restore_config():
+    """测试中对 Config 的修改在测试结束后还原"""
+    saved = {
+        name: copy.deepcopy(getattr(Config, name))
+        for name in dir(Config)
+        if name.isupper() and isinstance(getattr(Config, name), dict)
+    }
+    yield Config
+    for name, value in saved.items():
+        current = getattr(Config, name)
+        current.clear()
+        current.update(value)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+
+import pytest
+
+import analytics
+from analytics import analyze
+from models import CommentRecord
+from storage import JsonlCommentWriter
+
+
+def _write_comments(path, contents):
+    writer = JsonlCommentWriter(str(path))
+    writer.write([CommentRecord(f"user{i % 2}", content, platform="douyin", room_id="1", ts_ms=1700000000000 + i * 1000)
+                  for i, content in enumerate(contents)])
+    writer.close()
+
+
+def test_summary(tmp_path):
+    path = tmp_path / "comments.jsonl"
+    _write_comments(path, ["你好", "主播好", "hello"])
+
+    rows = analyze([str(path)]).summary_rows()
+    assert rows[0]["room"] == "douyin/1"
+    assert rows[0]["comments"] == 3
+    assert rows[0]["unique_users"] == 2
+
+
+def test_keywords_report_without_keywords_counts_frequent_words(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "comments.jsonl"
+    _write_comments(path, ["主播好", "主播加油", "hello 主播"])
+
+    monkeypatch.setattr(sys, "argv", ["analytics.py", str(path), "--report", "keywords", "--top", "1"])
+    analytics.main()
+
+    output = capsys.readouterr().out
+    assert "（无数据）" not in output
+    assert "主播" in output
+
+
+def test_keywords_report_with_keywords(tmp_path):
+    path = tmp_path / "comments.jsonl"
+    _write_comments(path, ["主播好", "主播加油", "hello"])
+
+    rows = analyze([str(path)], ["主播", "hello"]).keyword_rows(10)
+    assert {row["keyword"]: row["comments"] for row in rows} == {"主播": 2, "hello": 1}
+
+
+def test_jsonl_skips_and_counts_bad_lines(tmp_path):
+    path = tmp_path / "comments.jsonl"
+    _write_comments(path, ["你好", "主播好"])
+    with open(path, "ab") as f:
+        f.write(b'{"user": null, "content": "\xff\xfe", "platform": "douyin", "room_id": "1"}\n')
+        f.write(b'{"user": null, "content": "ok", "timestamp": "2023-11-15T06:13:22", "platform": "douyin", "room_id": "1"}\n')
+        f.write(b'{"user": "half')
+
+    stats = analyze([str(path)])
+    assert stats.comments["douyin/1"] == 3
+    assert stats.users["douyin/1"][""] == 1
+    assert stats.skipped_lines == {str(path): 2}
+
+
+def test_epoch_columns_use_per_record_offset_across_dst(monkeypatch):
+    if not hasattr(time, "tzset"):
+        pytest.skip("time.tzset 不可用")
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        # 2024-03-10 01:30 EST 与一小时后的 03:30 EDT（夏令时开始）
+        columns = analytics._columns_from_epoch([1710052200000, 1710055800000], ["douyin/1"] * 2,
+                                                ["a", None], ["chat"] * 2, ["x", "y"])
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    hours = (columns.ts // 3600000 % 24).tolist()
+    assert hours == [1, 3]
+    assert columns.user.tolist() == ["a", ""]
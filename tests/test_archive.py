@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from archive import SegmentArchiveReader, SegmentArchiveWriter
+from models import CommentRecord
+from storage import CommentPersister
+
+
+BASE_MS = 1_700_000_000_000
+
+
+def _records(count: int, step_ms: int = 1000):
+    return [CommentRecord(f"user{i}", f"弹幕{i}", platform="douyin", room_id="1", ts_ms=BASE_MS + i * step_ms)
+            for i in range(count)]
+
+
+@pytest.mark.parametrize("compression", ["zlib", "gzip"])
+def test_round_trip_across_segments(tmp_path, compression):
+    writer = SegmentArchiveWriter(str(tmp_path), segment_seconds=60, compression=compression,
+                                  block_records=7, block_seconds=3600)
+    writer.write(_records(200))
+    writer.close()
+
+    reader = SegmentArchiveReader(str(tmp_path))
+    assert len(reader.segments()) >= 4
+    assert [record.content for record in reader.read()] == [f"弹幕{i}" for i in range(200)]
+
+
+def test_time_window_read(tmp_path):
+    writer = SegmentArchiveWriter(str(tmp_path), segment_seconds=60, block_records=10, block_seconds=3600)
+    writer.write(_records(300))
+    writer.close()
+
+    since, until = BASE_MS + 95_000, BASE_MS + 130_000
+    records = list(SegmentArchiveReader(str(tmp_path)).read(since, until))
+    assert [record.ts_ms for record in records] == list(range(since, until, 1000))
+
+
+def test_reopen_truncates_partial_block(tmp_path):
+    writer = SegmentArchiveWriter(str(tmp_path), segment_seconds=3600, block_records=5, block_seconds=3600)
+    writer.write(_records(10))
+    writer.close()
+
+    # 模拟写到一半退出：分段末尾多出半个块
+    segment = next(tmp_path.glob("*.seg"))
+    with open(segment, "ab") as f:
+        f.write(b"\x78\x9c partial")
+
+    writer = SegmentArchiveWriter(str(tmp_path), segment_seconds=3600, block_records=5, block_seconds=3600)
+    writer.write([CommentRecord("late", "续写", platform="douyin", room_id="1", ts_ms=BASE_MS + 20_000)])
+    writer.close()
+
+    contents = [record.content for record in SegmentArchiveReader(str(tmp_path)).read()]
+    assert contents == [f"弹幕{i}" for i in range(10)] + ["续写"]
+
+
+def test_fsync_writes_pending_block(tmp_path):
+    writer = SegmentArchiveWriter(str(tmp_path), segment_seconds=3600, block_records=100, block_seconds=3600)
+    writer.write(_records(3))
+    writer.fsync()
+
+    assert writer.persisted_count == 3
+    assert [record.content for record in SegmentArchiveReader(str(tmp_path)).read()] == ["弹幕0", "弹幕1", "弹幕2"]
+    writer.close()
+
+
+def test_persister_writes_aged_block_without_new_comments(tmp_path):
+    writer = SegmentArchiveWriter(str(tmp_path), segment_seconds=3600, block_records=100, block_seconds=0.05)
+    persister = CommentPersister(writer, flush_records=1, flush_interval_ms=10)
+    persister.start()
+    for record in _records(2):
+        persister.submit(record)
+
+    # 之后没有新弹幕，块到期后由写入线程写出
+    deadline = time.monotonic() + 2
+    while writer.persisted_count < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.persisted_count == 2
+    persister.close()
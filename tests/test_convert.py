@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+
+from convert import convert_file, iter_json_array, room_from_filename
+from search import search_comments
+from storage import connect_comment_db
+
+
+LEGACY = [
+    {"timestamp": "2024-01-01T12:00:00", "user": "小明", "content": "你好", "type": "chat"},
+    {"timestamp": "2024-01-01T12:00:01", "user": "小红", "content": "主播好", "type": "chat"},
+    {"timestamp": "2024-01-01T12:00:02", "user": "a", "content": "hello", "type": "chat"},
+]
+
+
+def test_iter_json_array_reads_across_small_chunks():
+    text = json.dumps(LEGACY, ensure_ascii=False, indent=2)
+    assert list(iter_json_array(io.StringIO(text), chunk_size=7)) == LEGACY
+
+
+def test_iter_json_array_returns_complete_items_of_truncated_file():
+    text = json.dumps(LEGACY, ensure_ascii=False, indent=2)
+    truncated = text[:text.rindex("{") + 10]
+    assert list(iter_json_array(io.StringIO(truncated), chunk_size=16)) == LEGACY[:2]
+
+
+def test_room_from_legacy_filename(tmp_path):
+    assert room_from_filename(tmp_path / "douyin_123456_20240101_120000.json") == ("douyin", "123456")
+    assert room_from_filename(tmp_path / "comments.json") == ("", "")
+
+
+def test_convert_to_jsonl_fills_room_from_filename(tmp_path):
+    source = tmp_path / "taobao_987_20240101_120000.json"
+    source.write_text(json.dumps(LEGACY, ensure_ascii=False, indent=2), encoding="utf-8")
+    output = tmp_path / "out" / "taobao_987.jsonl"
+
+    assert convert_file(str(source), str(output), "jsonl", batch_size=2) == 3
+    rows = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [row["content"] for row in rows] == ["你好", "主播好", "hello"]
+    assert {(row["platform"], row["room_id"]) for row in rows} == {("taobao", "987")}
+    assert not output.with_name(output.name + ".part").exists()
+
+
+def test_convert_to_sqlite_is_searchable(tmp_path):
+    source = tmp_path / "douyin_1_20240101_120000.json"
+    source.write_text(json.dumps(LEGACY, ensure_ascii=False), encoding="utf-8")
+    output = tmp_path / "douyin_1.sqlite"
+
+    convert_file(str(source), str(output), "sqlite")
+    conn = connect_comment_db(str(output), readonly=True)
+    try:
+        assert [row["content"] for row in search_comments(conn, "主播")] == ["主播好"]
+    finally:
+        conn.close()
+
+
+def test_convert_empty_array(tmp_path):
+    source = tmp_path / "douyin_1_20240101_120000.json"
+    source.write_text("[]", encoding="utf-8")
+    output = tmp_path / "douyin_1.jsonl"
+
+    assert convert_file(str(source), str(output), "jsonl") == 0
+    assert output.exists()
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+
+from models import CommentRecord
+from multi_room import create_crawler
+
+
+class _BrokenPage:
+    """关闭时抛出异常的页面"""
+
+    async def close(self):
+        raise RuntimeError("Target closed")
+
+
+def test_cleanup_saves_comments_when_page_close_fails(tmp_path):
+    output = tmp_path / "taobao_1.json"
+
+    async def run():
+        crawler = create_crawler("taobao", "cleanup1", str(output))
+        crawler.persister.start()
+        crawler.frame_queue.start()
+        crawler._store_comment(CommentRecord("user", "你好", platform="taobao", room_id="cleanup1"), "websocket", "m1")
+        crawler.page = _BrokenPage()
+        await crawler._cleanup()
+        return crawler
+
+    crawler = asyncio.run(run())
+
+    assert not crawler.persister._thread.is_alive()
+    assert not crawler.frame_queue._tasks
+    assert [item["content"] for item in json.loads(output.read_text(encoding="utf-8"))] == ["你好"]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import socket
+import time
+
+import pytest
+from playwright.async_api import async_playwright
+
+from config import Config
+from loadtest import StandInLiveServer, start_server, use_stand_in
+from multi_room import create_crawler
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _start_room(platform: str, output_dir: str):
+    """在模拟直播间中启动抓取器，等待就绪后停止，返回抓取器"""
+    async with async_playwright() as p:
+        browser_config = Config.get_browser_config()
+        try:
+            browser = await p.chromium.launch(headless=True, args=browser_config["args"])
+        except Exception as e:
+            pytest.skip(f"无法启动 Chromium: {e}")
+        try:
+            crawler = create_crawler(platform, "startup0", f"{output_dir}/{platform}_startup0.jsonl")
+            task = asyncio.create_task(crawler.run_in_browser(browser))
+            deadline = time.perf_counter() + 30
+            while "ready" not in crawler.startup.phases and not task.done() and time.perf_counter() < deadline:
+                await asyncio.sleep(0.05)
+            if task.done():
+                # 启动过程中的异常直接抛出
+                task.result()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return crawler
+        finally:
+            await browser.close()
+
+
+@pytest.mark.parametrize("platform", ["douyin", "taobao"])
+def test_crawler_enters_stand_in_room(platform, tmp_path, restore_config):
+    http_port, ws_port = _free_port(), _free_port()
+    use_stand_in(platform, "127.0.0.1", http_port, str(tmp_path))
+    server = StandInLiveServer("127.0.0.1", http_port, ws_port, [], 0, 1, 0)
+    # 同步对象要保持引用直到子进程启动，否则信号量在子进程反序列化前就被释放
+    process, ready, started, start_time, results = start_server(server)
+    try:
+        assert ready.wait(30), "模拟直播间启动超时"
+        crawler = asyncio.run(_start_room(platform, str(tmp_path)))
+    finally:
+        process.terminate()
+
+    assert "ready" in crawler.startup.phases
+    assert crawler.startup.ready_reason in ("selector", "frame")
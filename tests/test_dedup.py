@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from dedup import MessageDeduplicator
+
+
+def test_duplicate_message_id_is_dropped_across_sources():
+    dedup = MessageDeduplicator()
+    assert not dedup.is_duplicate("http", 1)
+    assert dedup.is_duplicate("websocket", 1)
+    assert not dedup.is_duplicate("websocket", 2)
+    assert dedup.duplicates == {"websocket": 1}
+
+
+def test_fallback_key_uses_user_content_and_adjacent_bucket():
+    dedup = MessageDeduplicator(fallback_bucket_seconds=10)
+    assert not dedup.is_duplicate("http", None, "user", "你好", 1_000_000)
+    # 相邻时间段内的相同内容视为重复
+    assert dedup.is_duplicate("websocket", None, "user", "你好", 1_009_999)
+    assert not dedup.is_duplicate("websocket", None, "other", "你好", 1_000_000)
+    assert not dedup.is_duplicate("websocket", None, "user", "你好", 1_030_000)
+
+
+def test_time_window_rotation_forgets_keys_after_two_windows():
+    dedup = MessageDeduplicator(window_seconds=0)
+    assert not dedup.is_duplicate("http", 1)
+    # 每次调用都会轮换：键先进入上一代，再被丢弃
+    assert dedup.is_duplicate("http", 1)
+    assert not dedup.is_duplicate("http", 2)
+    assert not dedup.is_duplicate("http", 3)
+    assert not dedup.is_duplicate("http", 1)
+    assert dedup.early_rotations == 0
+
+
+def test_max_keys_rotation_is_counted_and_bounds_memory():
+    dedup = MessageDeduplicator(window_seconds=3600, max_keys=3)
+    for msg_id in range(10):
+        assert not dedup.is_duplicate("websocket", msg_id)
+
+    assert len(dedup) <= 6
+    assert dedup.early_rotations == 3
+    # 最近 max_keys 条消息仍然可以识别
+    assert all(dedup.is_duplicate("websocket", msg_id) for msg_id in range(7, 10))
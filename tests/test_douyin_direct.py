@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+
+import websockets
+
+from config import Config
+from douyin_crawler import DouyinCrawler
+from douyin_proto import build_push_frame
+
+
+def _chat(msg_id: int, content: str) -> dict:
+    return {"method": "WebcastChatMessage", "msg_id": msg_id, "content": content,
+            "user": {"id": msg_id, "nickname": f"user{msg_id}"}}
+
+
+async def _run_direct(output: str) -> DouyinCrawler:
+    """本地推送服务器：第一次连接推送正常帧和残缺帧后断开，第二次连接再推送一条，之后直接断开"""
+    connections = []
+
+    async def handler(ws, path=None):
+        connections.append(ws)
+        if len(connections) == 1:
+            await ws.send(build_push_frame([_chat(1, "二进制帧")]))
+            await ws.send("{not json")
+            await ws.send(json.dumps(_chat(2, "文本帧"), ensure_ascii=False))
+        elif len(connections) == 2:
+            await ws.send(build_push_frame([_chat(3, "重连后")]))
+
+    async with websockets.serve(handler, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        crawler = DouyinCrawler("direct1", output)
+        await crawler.start_direct(f"ws://127.0.0.1:{port}/webcast/im/push/")
+    assert len(connections) == 2 + Config.get_network_config()["retry_times"]
+    return crawler
+
+
+def test_direct_mode_survives_malformed_frame_and_reconnects(tmp_path, restore_config):
+    Config.NETWORK_CONFIG["retry_times"] = 2
+    Config.NETWORK_CONFIG["retry_delay"] = 0.01
+    Config.SAVE_CONFIG["file_format"] = "jsonl"
+    output = tmp_path / "douyin_direct1.jsonl"
+
+    crawler = asyncio.run(_run_direct(str(output)))
+
+    contents = [json.loads(line)["content"] for line in output.read_text(encoding="utf-8").splitlines()]
+    assert contents == ["二进制帧", "文本帧", "重连后"]
+    assert crawler.frame_queue.received == 4
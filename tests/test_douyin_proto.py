@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from douyin_proto import (build_ack_frame, build_heartbeat_frame, build_push_frame, decode_push, encode_message,
+                          iter_fields, parse_push_frame)
+
+
+MESSAGES = [
+    {"method": "WebcastChatMessage", "msg_id": 1, "content": "你好", "user": {"id": 11, "nickname": "小明"}},
+    {"method": "WebcastGiftMessage", "msg_id": 2, "gift_id": 5, "repeat_count": 3, "gift_name": "玫瑰",
+     "user": {"id": 12, "nickname": "小红"}},
+    {"method": "WebcastLikeMessage", "msg_id": 3, "count": 8, "total": 100, "user": {"id": 13, "nickname": "a"}},
+    {"method": "WebcastMemberMessage", "msg_id": 4, "member_count": 42, "user": {"id": 14, "nickname": "b"}},
+]
+
+
+def test_push_frame_round_trip():
+    decoded = decode_push(build_push_frame(MESSAGES, log_id=7, need_ack=True, internal_ext="ext"))
+
+    assert decoded.frame.log_id == 7
+    assert decoded.frame.payload_type == "msg"
+    assert decoded.need_ack is True
+    assert decoded.internal_ext == "ext"
+    assert [message["method"] for message in decoded.messages] == [message["method"] for message in MESSAGES]
+
+    chat, gift, like, member = decoded.messages
+    assert chat["content"] == "你好" and chat["user"] == {"id": 11, "nickname": "小明"} and chat["msg_id"] == 1
+    assert gift["gift_name"] == "玫瑰" and gift["repeat_count"] == 3
+    assert like["count"] == 8 and like["total"] == 100
+    assert member["member_count"] == 42
+
+
+def test_unknown_methods_are_skipped():
+    frame = build_push_frame([{"method": "WebcastRoomStatsMessage", "msg_id": 9}, MESSAGES[0]])
+    assert [message["method"] for message in decode_push(frame).messages] == ["WebcastChatMessage"]
+
+
+def test_heartbeat_and_ack_frames():
+    heartbeat = decode_push(build_heartbeat_frame())
+    assert heartbeat.frame.payload_type == "hb"
+    assert heartbeat.messages == []
+
+    ack = parse_push_frame(build_ack_frame(7, "ext"))
+    assert (ack.payload_type, ack.log_id, ack.payload) == ("ack", 7, b"ext")
+
+
+def test_iter_fields_rejects_truncated_bytes_field():
+    data = encode_message(MESSAGES[0])
+    with pytest.raises(ValueError):
+        list(iter_fields(data[:-3]))
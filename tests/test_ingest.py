@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+
+from ingest import FrameQueue
+
+
+async def _noop(batch):
+    pass
+
+
+def _is_low(item) -> bool:
+    return item.startswith("like")
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        FrameQueue(_noop, policy="block")
+
+
+def test_drop_oldest_keeps_newest_frames():
+    queue = FrameQueue(_noop, maxsize=3, policy="drop_oldest")
+    for index in range(5):
+        queue.put_nowait(f"chat{index}")
+
+    assert queue.depth == 3
+    assert queue.received == 5
+    assert queue.dropped["oldest"] == 2
+    assert [queue._popleft() for _ in range(3)] == ["chat2", "chat3", "chat4"]
+
+
+def test_drop_low_priority_evicts_oldest_low_priority_frame():
+    queue = FrameQueue(_noop, maxsize=3, policy="drop_low_priority", is_low_priority=_is_low)
+    for item in ("chat0", "like0", "like1", "chat1", "chat2"):
+        queue.put_nowait(item)
+
+    assert queue.dropped["low_priority"] == 2
+    assert [queue._popleft() for _ in range(queue.depth)] == ["chat0", "chat1", "chat2"]
+
+
+def test_drop_low_priority_rejects_incoming_low_priority_when_full_of_chat():
+    queue = FrameQueue(_noop, maxsize=2, policy="drop_low_priority", is_low_priority=_is_low)
+    queue.put_nowait("chat0")
+    queue.put_nowait("chat1")
+
+    assert queue.put_nowait("like0") is False
+    assert queue.put_nowait("chat2") is True
+    assert queue.dropped == {"low_priority": 1, "oldest": 1}
+    assert [queue._popleft() for _ in range(queue.depth)] == ["chat1", "chat2"]
+
+
+def test_workers_process_frames_in_arrival_order():
+    processed = []
+
+    async def handler(batch):
+        processed.extend(batch)
+
+    async def run():
+        queue = FrameQueue(handler, maxsize=100, workers=1, batch_size=4, policy="drop_low_priority",
+                           is_low_priority=_is_low)
+        queue.start()
+        items = [f"like{i}" if i % 3 == 0 else f"chat{i}" for i in range(10)]
+        for item in items:
+            queue.put_nowait(item)
+        await queue.stop()
+        return queue, items
+
+    queue, items = asyncio.run(run())
+    assert processed == items
+    assert queue.processed == 10
+    assert queue.depth == 0
+
+
+def test_handler_errors_do_not_stop_worker():
+    processed = []
+
+    async def handler(batch):
+        if "bad" in batch:
+            raise RuntimeError("boom")
+        processed.extend(batch)
+
+    async def run():
+        queue = FrameQueue(handler, workers=1, batch_size=1)
+        queue.start()
+        for item in ("a", "bad", "b"):
+            queue.put_nowait(item)
+        await queue.stop()
+
+    asyncio.run(run())
+    assert processed == ["a", "b"]
+
+
+def test_count_received_counts_frames_handled_outside_queue():
+    queue = FrameQueue(_noop)
+    queue.put_nowait("chat0")
+    queue.count_received()
+    queue.count_received(3)
+
+    assert queue.received == 5
+    assert queue.depth == 1
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+from models import CommentRecord
+from room_metrics import Histogram, HyperLogLog, RoomMetrics, SpaceSaving, WindowCounter
+
+
+def test_window_counter_expires_old_buckets():
+    counter = WindowCounter(10, 10)
+    counter.add(100.0, 5)
+    counter.add(105.5, 3)
+
+    assert counter.total(105.9) == 8
+    assert counter.total(110.5) == 3
+    assert counter.total(120.0) == 0
+    assert counter.rate(105.9) == 0.8
+
+
+def test_hyperloglog_estimate_is_close():
+    hll = HyperLogLog(12)
+    for index in range(20000):
+        hll.add(f"user{index}")
+        hll.add(f"user{index}")  # 重复的值不影响估计
+
+    assert abs(hll.count() - 20000) / 20000 < 0.06
+
+
+def test_hyperloglog_small_cardinality_is_exact_enough():
+    hll = HyperLogLog(12)
+    for index in range(50):
+        hll.add(f"user{index}")
+    assert 48 <= hll.count() <= 52
+
+
+def test_space_saving_keeps_heavy_hitters():
+    sketch = SpaceSaving(capacity=10)
+    rng = random.Random(0)
+    stream = ["hot"] * 500 + ["warm"] * 200 + [f"cold{rng.randrange(1000)}" for _ in range(800)]
+    rng.shuffle(stream)
+    for item in stream:
+        sketch.add(item)
+
+    top = dict(sketch.top(2))
+    assert list(top) == ["hot", "warm"]
+    # 估计计数不低于真实计数，且高估量不超过记录的误差
+    assert 500 <= top["hot"] <= 500 + sketch.error("hot")
+    assert 200 <= top["warm"] <= 200 + sketch.error("warm")
+
+
+def test_histogram_quantile_returns_bucket_bound():
+    histogram = Histogram((0.001, 0.01, 0.1))
+    for value in (0.0005,) * 90 + (0.05,) * 9 + (1.0,):
+        histogram.observe(value)
+
+    assert histogram.count == 100
+    assert histogram.quantile(0.5) == 0.001
+    assert histogram.quantile(0.95) == 0.1
+    assert histogram.quantile(1.0) == float("inf")
+    assert Histogram().quantile(0.5) == 0.0
+
+
+def test_room_metrics_snapshot():
+    metrics = RoomMetrics(top_k=2)
+    now = 1000.0
+    for index, (user, content) in enumerate([("a", "主播好"), ("b", "主播加油"), ("a", "hello")]):
+        metrics.record(CommentRecord(user, content, platform="douyin", room_id="1"), now + index)
+
+    snapshot = metrics.snapshot(now + 3)
+    assert snapshot["total"] == 3
+    assert snapshot["types"] == {"chat": 3}
+    assert snapshot["unique_users"] == 2
+    assert snapshot["top_users"][0] == ("a", 2)
+    assert snapshot["top_keywords"][0] == ("主播", 2)
+    assert snapshot["rates"]["10s"] == 0.3
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from multi_room import create_crawler
+
+
+class _FakeCache:
+    """记录保存和删除调用的存储状态缓存"""
+
+    def __init__(self):
+        self.saved = 0
+        self.invalidated = 0
+
+    async def save(self, platform, context):
+        self.saved += 1
+        return True
+
+    def invalidate(self, platform):
+        self.invalidated += 1
+
+
+class _FakePage:
+    """按给定地址和元素应答的页面"""
+
+    def __init__(self, url: str, selectors=(), goto_error: Exception = None):
+        self.url = url
+        self.selectors = set(selectors)
+        self.goto_error = goto_error
+
+    async def goto(self, url, wait_until=None):
+        if self.goto_error:
+            raise self.goto_error
+
+    async def query_selector(self, selector):
+        return object() if selector in self.selectors else None
+
+
+def _navigate(tmp_path, page: _FakePage, ready_reason: str = "selector") -> _FakeCache:
+    """热启动访问直播间，返回缓存的调用记录"""
+    crawler = create_crawler("douyin", "session1", str(tmp_path / "douyin_session1.jsonl"))
+    cache = _FakeCache()
+    crawler.storage_cache = cache
+    crawler.startup.warm = True
+    crawler.page = page
+
+    async def ready():
+        crawler.startup.ready_reason = ready_reason
+
+    crawler._wait_until_ready = ready
+
+    async def run():
+        try:
+            await crawler._navigate_to_live_room()
+        except Exception:
+            pass
+        crawler.persister.close()
+
+    asyncio.run(run())
+    return cache
+
+
+def test_entered_room_saves_storage_state(tmp_path):
+    cache = _navigate(tmp_path, _FakePage("https://live.douyin.com/session1", {".webcast-chatroom___list"}))
+    assert (cache.saved, cache.invalidated) == (1, 0)
+
+
+def test_ended_room_or_ready_timeout_keeps_cache(tmp_path):
+    cache = _navigate(tmp_path, _FakePage("https://live.douyin.com/session1", {"text=直播已结束"}))
+    assert (cache.saved, cache.invalidated) == (0, 0)
+
+    cache = _navigate(tmp_path, _FakePage("https://live.douyin.com/session1"), ready_reason="timeout")
+    assert (cache.saved, cache.invalidated) == (0, 0)
+
+
+def test_challenge_login_or_navigation_error_invalidates_cache(tmp_path):
+    cache = _navigate(tmp_path, _FakePage("https://live.douyin.com/session1", {"#captcha_container"}))
+    assert (cache.saved, cache.invalidated) == (0, 1)
+
+    cache = _navigate(tmp_path, _FakePage("https://passport.douyin.com/login"))
+    assert (cache.saved, cache.invalidated) == (0, 1)
+
+    cache = _navigate(tmp_path, _FakePage("", goto_error=RuntimeError("net::ERR_TOO_MANY_REDIRECTS")))
+    assert (cache.saved, cache.invalidated) == (0, 1)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+
+from models import CommentRecord
+from storage import CommentPersister, JsonArrayCommentWriter, JsonlCommentWriter
+
+
+def _records(start: int, count: int):
+    return [CommentRecord(f"user{i}", f"弹幕{i}", platform="douyin", room_id="1", ts_ms=1700000000000 + i)
+            for i in range(start, start + count)]
+
+
+def _contents(path) -> list:
+    return [item["content"] for item in json.loads(path.read_text(encoding="utf-8"))]
+
+
+def test_json_array_writer_appends_to_existing_file(tmp_path):
+    output = tmp_path / "comments.json"
+    writer = JsonArrayCommentWriter(str(output))
+    writer.write(_records(0, 2))
+    writer.write(_records(2, 1))
+    writer.close()
+
+    # 页面崩溃重启后用同一个文件名重新打开，不能清空已有弹幕
+    writer = JsonArrayCommentWriter(str(output))
+    writer.write(_records(3, 2))
+    writer.close()
+
+    assert _contents(output) == [f"弹幕{i}" for i in range(5)]
+
+
+def test_json_array_writer_repairs_truncated_file(tmp_path):
+    output = tmp_path / "comments.json"
+    writer = JsonArrayCommentWriter(str(output))
+    writer.write(_records(0, 3))
+    writer.close()
+
+    # 模拟写到一半退出：缺少结尾的 "]"，最后一条记录不完整
+    data = output.read_bytes()
+    output.write_bytes(data[:-20])
+
+    writer = JsonArrayCommentWriter(str(output))
+    writer.write(_records(3, 1))
+    writer.close()
+
+    assert _contents(output) == ["弹幕0", "弹幕1", "弹幕3"]
+
+
+def test_json_array_writer_reopens_empty_array(tmp_path):
+    output = tmp_path / "comments.json"
+    output.write_text("[]\n")
+
+    writer = JsonArrayCommentWriter(str(output))
+    writer.write(_records(0, 1))
+    writer.close()
+
+    assert _contents(output) == ["弹幕0"]
+
+
+def test_jsonl_writer_drops_partial_line(tmp_path):
+    output = tmp_path / "comments.jsonl"
+    writer = JsonlCommentWriter(str(output))
+    writer.write(_records(0, 2))
+    writer.close()
+    output.write_bytes(output.read_bytes() + b'{"user": "half')
+
+    writer = JsonlCommentWriter(str(output))
+    writer.write(_records(2, 1))
+    writer.close()
+
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["content"] for line in lines] == ["弹幕0", "弹幕1", "弹幕2"]
+
+
+class _BlockingWriter:
+    """写入时等待放行的写入器，模拟磁盘很慢或写入一直失败"""
+
+    def __init__(self, fail: bool = False):
+        self.output_file = "blocking"
+        self.persisted_count = 0
+        self.release = threading.Event()
+        self.fail = fail
+        self.batches = []
+
+    def write(self, records):
+        self.release.wait(5)
+        if self.fail:
+            raise OSError("disk full")
+        self.batches.append(list(records))
+        self.persisted_count += len(records)
+        return len(records)
+
+    def fsync(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_persister_close_writes_everything(tmp_path):
+    output = tmp_path / "comments.jsonl"
+    persister = CommentPersister(JsonlCommentWriter(str(output)), flush_records=3, flush_interval_ms=50)
+    persister.start()
+    for record in _records(0, 10):
+        persister.submit(record)
+    persister.close()
+
+    assert len(output.read_text(encoding="utf-8").splitlines()) == 10
+    assert persister.pending_count == 0
+    assert persister.flush_durations.count == persister.flush_count > 0
+
+
+def test_persister_submit_never_waits_for_slow_writer():
+    writer = _BlockingWriter()
+    persister = CommentPersister(writer, flush_records=1, flush_interval_ms=10, capacity=5)
+    persister.start()
+    persister.submit(_records(0, 1)[0])
+    time.sleep(0.05)  # 写入线程取走第一条后阻塞在写入中
+
+    started = time.perf_counter()
+    for record in _records(1, 20):
+        persister.submit(record)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.5
+    assert persister.pending_count == 20
+    assert persister.spilled_count == 15
+    assert persister.dropped_count == 0
+
+    # 写入恢复后溢出列表随下一批写出，一条都不丢
+    writer.release.set()
+    persister.close()
+    assert writer.persisted_count == 21
+    assert persister.dropped_count == 0
+
+
+def test_persister_drop_policy_is_opt_in():
+    writer = _BlockingWriter()
+    persister = CommentPersister(writer, flush_records=1, flush_interval_ms=10, capacity=5, overflow_policy="drop")
+    persister.start()
+    persister.submit(_records(0, 1)[0])
+    time.sleep(0.05)
+
+    for record in _records(1, 20):
+        persister.submit(record)
+
+    assert persister.pending_count == 5
+    assert persister.dropped_count == 15
+
+    writer.release.set()
+    persister.close()
+    assert writer.persisted_count == 6
+
+
+def test_persister_submit_does_not_sleep_when_writes_fail():
+    writer = _BlockingWriter(fail=True)
+    writer.release.set()
+    persister = CommentPersister(writer, flush_records=1, flush_interval_ms=1000, capacity=2)
+    persister.start()
+
+    started = time.perf_counter()
+    for record in _records(0, 50):
+        persister.submit(record)
+    elapsed = time.perf_counter() - started
+
+    # 写入失败后的重试等待只发生在写入线程中
+    assert elapsed < 0.5
+    # 写入失败的批次放回缓冲区重试，不丢弃
+    assert persister.dropped_count == 0
+    persister.close(timeout=5)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from models import CommentRecord
+from search import search_comments
+from storage import SqliteCommentWriter, connect_comment_db
+from text_index import to_bigram_text, to_index_text, to_match_query
+
+
+@pytest.fixture
+def conn(tmp_path):
+    path = tmp_path / "comments.db"
+    writer = SqliteCommentWriter(str(path))
+    contents = ["你好世界", "hello世界abc", "主播好", "今天天气不错", "买了x你"]
+    writer.write([CommentRecord(f"user{i}", content, platform="douyin", room_id="1", ts_ms=1700000000000 + i)
+                  for i, content in enumerate(contents)])
+    writer.close()
+    conn = connect_comment_db(str(path), readonly=True)
+    yield conn
+    conn.close()
+
+
+def _search(conn, query):
+    return sorted(row["content"] for row in search_comments(conn, query))
+
+
+def test_index_text_adds_last_character_of_each_run():
+    assert to_index_text("你好世界").split() == ["你好", "好世", "世界", "界"]
+    assert to_index_text("ab你c").split() == ["ab", "你", "c"]
+    assert to_bigram_text("你好世界").split() == ["你好", "好世", "世界"]
+
+
+@pytest.mark.parametrize("query", ["你", "世", "界"])
+def test_single_character_matches_start_middle_and_end_of_run(conn, query):
+    assert "你好世界" in _search(conn, query)
+
+
+def test_phrase_queries(conn):
+    assert _search(conn, "世界") == ["hello世界abc", "你好世界"]
+    assert _search(conn, "好世界") == ["你好世界"]
+    assert _search(conn, "世界abc") == ["hello世界abc"]
+    assert _search(conn, "天气 不错") == ["今天天气不错"]
+    assert _search(conn, "好") == ["主播好", "你好世界"]
+    assert _search(conn, "x你") == ["买了x你"]
+    assert _search(conn, "世界 主播") == []
+
+
+def test_empty_query_is_rejected():
+    with pytest.raises(ValueError):
+        to_match_query("   ")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import operator
+import re
+
+
+# 中日韩文字连续片段（FTS5 自带的 unicode61 分词器会把整段中文当作一个词）
+_CJK_RUN = re.compile("[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]+")
+# 位于末尾的中文片段
+_CJK_TAIL = re.compile(_CJK_RUN.pattern + "$")
+
+
+def _bigrams(match) -> str:
+    """把一段中文拆成重叠的二元组：你好世界 -> 你好 好世 世界"""
+    run = match.group()
+    if len(run) == 1:
+        return f" {run} "
+    return " " + " ".join(map(operator.add, run, run[1:])) + " "
+
+
+def _bigrams_with_last(match) -> str:
+    """二元组之后再补上最后一个字：你好世界 -> 你好 好世 世界 界"""
+    run = match.group()
+    if len(run) == 1:
+        return f" {run} "
+    return _bigrams(match) + f"{run[-1]} "
+
+
+def to_bigram_text(text: str) -> str:
+    """中文按字符二元组切分，英文和数字保持原样（用于关键词统计）"""
+    return _CJK_RUN.sub(_bigrams, text)
+
+
+def to_index_text(text: str) -> str:
+    """转换为写入全文索引的文本
+
+    中文按字符二元组切分，英文和数字仍由 unicode61 分词器按单词切分，
+    因此任意长度不少于两个字的中文片段都能以短语方式命中。
+    每段中文的最后一个字另外作为单字写入，片段末尾的单个汉字也能以前缀查询命中。
+    """
+    return _CJK_RUN.sub(_bigrams_with_last, text)
+
+
+def to_match_query(query: str) -> str:
+    """把用户输入的查询转换为 FTS5 MATCH 表达式
+
+    空格分隔的每个词都必须出现（AND），每个词按短语匹配。
+    词以单个汉字结尾时按前缀查询，匹配以该字开头的二元组或片段末尾的单字。
+    词末尾的中文片段不带补上的单字，词出现在文本中一段中文的中间时也能命中。
+    """
+    terms = []
+    for term in query.split():
+        tail = _CJK_TAIL.search(term)
+        prefix = tail is not None and len(tail.group()) == 1
+        if tail is not None and not prefix:
+            text = to_index_text(term[:tail.start()]) + to_bigram_text(tail.group())
+        else:
+            text = to_index_text(term)
+        text = " ".join(text.split()).replace('"', '""')
+        if text:
+            terms.append(f'"{text}"*' if prefix else f'"{text}"')
+
+    if not terms:
+        raise ValueError(f"无效的查询: {query}")
+    return " ".join(terms)
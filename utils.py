@@ -4,7 +4,7 @@
 import re
 import requests
 from urllib.parse import urlparse, parse_qs
-from typing import Optional, Tuple
+from typing import List, Optional, Pattern, Tuple
 
 
 def extract_room_id_from_url(url: str, platform: str) -> Optional[str]:
@@ -147,6 +147,11 @@ def parse_live_url(url: str) -> Tuple[Optional[str], Optional[str]]:
         return None, None
 
 
+def compile_url_patterns(patterns: List[str]) -> Pattern:
+    """将URL关键字列表编译为一个正则，用于 ``page.route`` 在浏览器侧过滤请求"""
+    return re.compile("|".join(re.escape(pattern) for pattern in patterns))
+
+
 def format_output_filename(platform: str, room_id: str, extension: str = "json") -> str:
     """格式化输出文件名"""
     from datetime import datetime
@@ -154,6 +159,12 @@ def format_output_filename(platform: str, room_id: str, extension: str = "json")
     return f"{platform}_{room_id}_{timestamp}.{extension}"
 
 
+def parse_time_ms(value: str) -> int:
+    """解析 ISO 格式时间（如 2024-01-01 或 2024-01-01T12:00:00），返回毫秒级时间戳"""
+    from datetime import datetime
+    return round(datetime.fromisoformat(value).timestamp() * 1000)
+
+
 if __name__ == "__main__":
     # 测试函数
     test_urls = [
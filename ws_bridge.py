@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import base64
+import json
+from typing import Callable, List
+
+from playwright.async_api import Page
+
+
+# 注入页面的脚本：替换 window.WebSocket，在浏览器内过滤并缓存弹幕连接的帧，
+# 每隔 flushMs 毫秒（或缓存达到 maxBatch 帧时）通过一次绑定调用整批交给 Python。
+# 文本帧原样传递，二进制帧转为 base64。
+_BRIDGE_SCRIPT = """
+(() => {
+    const config = %s;
+    const NativeWebSocket = window.WebSocket;
+    if (!NativeWebSocket || NativeWebSocket.__skyCommentHooked) {
+        return;
+    }
+
+    let buffer = [];
+
+    function toBase64(arrayBuffer) {
+        const bytes = new Uint8Array(arrayBuffer);
+        let binary = '';
+        for (let i = 0; i < bytes.length; i += 0x8000) {
+            binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+        }
+        return btoa(binary);
+    }
+
+    function flush() {
+        if (!buffer.length) {
+            return;
+        }
+        const batch = buffer;
+        buffer = [];
+        window[config.binding](batch).catch(() => {});
+    }
+
+    function push(frame) {
+        buffer.push(frame);
+        if (buffer.length >= config.maxBatch) {
+            flush();
+        }
+    }
+
+    function matches(url) {
+        return !config.patterns.length || config.patterns.some((pattern) => url.includes(pattern));
+    }
+
+    class HookedWebSocket extends NativeWebSocket {
+        constructor(url, protocols) {
+            super(url, protocols);
+            if (!matches(String(url))) {
+                return;
+            }
+            this.addEventListener('message', (event) => {
+                const data = event.data;
+                if (typeof data === 'string') {
+                    push(data);
+                } else if (data instanceof ArrayBuffer) {
+                    push({b64: toBase64(data)});
+                } else if (data instanceof Blob) {
+                    data.arrayBuffer().then((arrayBuffer) => push({b64: toBase64(arrayBuffer)}));
+                }
+            });
+        }
+    }
+    HookedWebSocket.__skyCommentHooked = true;
+
+    window.WebSocket = HookedWebSocket;
+    setInterval(flush, config.flushMs);
+})();
+"""
+
+
+class WebSocketBridge:
+    """页面内 WebSocket 批量转发
+
+    默认方式下每一帧都作为一个 ``framereceived`` 事件单独经过 Playwright 协议并触发一次回调；
+    桥接方式在页面内缓存帧，每批只产生一次跨进程调用。收到的帧与默认方式完全相同
+    （文本为 str，二进制为 bytes），交给同一个帧处理流程。
+    """
+
+    BINDING_NAME = "__skyCommentBridge"
+
+    def __init__(self, on_frame: Callable, url_patterns: List[str], flush_ms: int = 100, max_batch: int = 500):
+        self.on_frame = on_frame
+        self.url_patterns = url_patterns
+        self.flush_ms = flush_ms
+        self.max_batch = max_batch
+
+        self.batches = 0  # 收到的批次数
+        self.frames = 0  # 收到的帧数
+
+    async def install(self, page: Page):
+        """在页面加载前注入脚本并暴露绑定（需要在访问直播间之前调用）"""
+        await page.expose_binding(self.BINDING_NAME, self._handle_batch)
+        await page.add_init_script(script=_BRIDGE_SCRIPT % json.dumps({
+            "binding": self.BINDING_NAME,
+            "patterns": self.url_patterns,
+            "flushMs": self.flush_ms,
+            "maxBatch": self.max_batch
+        }))
+
+    def _handle_batch(self, source, batch: List):
+        """接收页面转发的一批帧"""
+        self.batches += 1
+        self.frames += len(batch)
+        for frame in batch:
+            if isinstance(frame, str):
+                self.on_frame(frame)
+            else:
+                self.on_frame(base64.b64decode(frame["b64"]))